@@ -0,0 +1 @@
+"""pytee benchmarks (run them from the source tree root as python -m benchmarks.<name>)."""
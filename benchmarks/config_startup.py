@@ -0,0 +1,136 @@
+"""
+Measures Config startup time with a big positions database and compares
+it with the work which the startup did before expiry of positions had been
+moved to the writer thread: deletion of all expired positions and VACUUM.
+
+Every run gets a fresh copy of the database in a temporary home
+directory. The database is in the page cache, so the disk latency isn't
+measured.
+
+Usage: python -m benchmarks.config_startup [POSITIONS [EXPIRED_RATIO]]
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from pycl import constants
+
+import pytee.constants
+from pytee.config import Config
+
+
+POSITIONS = 20000
+"""Default number of positions in the database."""
+
+EXPIRED_RATIO = 0.25
+"""Default ratio of expired positions."""
+
+RUNS = 10
+"""Number of the measured startups."""
+
+LAST_POS_LIFETIME = 4 * constants.WEEK_SECONDS
+"""Time after which Config forgets a movie's last position."""
+
+
+def create_database(home_dir, positions, expired_ratio):
+    """Creates a database with the positions and returns its path."""
+
+    os.environ["HOME"] = home_dir
+    Config(None, False).close()
+
+    db_path = os.path.join(home_dir, "." + pytee.constants.APP_UNIX_NAME, "config.sqlite")
+    db = sqlite3.connect(db_path)
+
+    try:
+        cur_time = int(time.time())
+        expired = int(positions * expired_ratio)
+
+        db.executemany("""
+            INSERT INTO last_pos
+                (file_path, file_name, position, last_update, content_id)
+            VALUES
+                (?, ?, ?, ?, ?)
+        """, (
+            ( "/movies/movie-{0}.avi".format(movie_id), "movie-{0}.avi".format(movie_id), 60000,
+                cur_time - (constants.MINUTE_SECONDS if movie_id >= expired else LAST_POS_LIFETIME * 2), None )
+            for movie_id in xrange(positions)
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+    return db_path
+
+
+def old_startup(db_path):
+    """Does the work which Config startup did before."""
+
+    db = sqlite3.connect(db_path)
+
+    try:
+        db.execute("DELETE FROM last_pos WHERE last_update <= ?", ( int(time.time()) - LAST_POS_LIFETIME, ))
+        db.execute("VACUUM")
+        db.commit()
+    finally:
+        db.close()
+
+
+def new_startup(db_path):
+    """Opens Config as it's opened now."""
+
+    start_time = time.time()
+    config = Config(None, False)
+    startup_time = time.time() - start_time
+
+    # Waiting for the writer thread, so it doesn't affect the next run
+    config.close()
+
+    return startup_time
+
+
+def measure(function, template_path, db_path):
+    """Returns average time in milliseconds of the function runs on fresh database copies."""
+
+    total_time = 0
+
+    for run_id in xrange(RUNS):
+        for suffix in ( "-wal", "-shm" ):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+
+        shutil.copy(template_path, db_path)
+
+        start_time = time.time()
+        run_time = function(db_path)
+        total_time += time.time() - start_time if run_time is None else run_time
+
+    return total_time * 1000 / RUNS
+
+
+def main():
+    positions = int(sys.argv[1]) if len(sys.argv) > 1 else POSITIONS
+    expired_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else EXPIRED_RATIO
+
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        db_path = create_database(temp_dir, positions, expired_ratio)
+        template_path = os.path.join(temp_dir, "template.sqlite")
+        shutil.copy(db_path, template_path)
+
+        print "{0} positions ({1:.0f}% expired), {2} KB database:".format(
+            positions, expired_ratio * 100, os.path.getsize(template_path) // 1024)
+        print "  expiry and VACUUM at startup (before): {0:.1f} ms".format(
+            measure(old_startup, template_path, db_path))
+        print "  Config startup (now): {0:.1f} ms".format(
+            measure(new_startup, template_path, db_path))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measures listing of a directory with 10k entries by list_files(): the time
+of the listing and the number of stat() calls it makes (every stat() is a
+round trip on network file systems; calls inside of the scandir module
+aren't counted). Files are listed as RelatedFilesFinder lists them and
+with subdirectories as Library lists them. If the scandir module is
+installed, both the scandir and the listdir() implementations are
+measured.
+
+The directory is created in a temporary directory (or in the specified
+one, e.g. on a network file system) and contains media files, subtitles,
+other files and subdirectories.
+
+Usage: python -m benchmarks.list_files [PARENT_DIR [ENTRIES]]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pysd.pysd
+
+import pytee.related_files
+from pytee.related_files import list_files
+
+
+ENTRIES = 10000
+"""Default number of the directory entries."""
+
+RUNS = 10
+"""Number of the measured listings."""
+
+
+def create_directory(parent_dir, entries):
+    """Creates the test directory and returns its path."""
+
+    dir_path = tempfile.mkdtemp(dir = parent_dir)
+
+    for entry_id in xrange(entries):
+        kind = entry_id % 10
+        name = "Show.S01E{0:05d}".format(entry_id)
+
+        if kind == 0:
+            os.mkdir(os.path.join(dir_path, name))
+            continue
+
+        extension = ".avi" if kind == 1 else ".srt" if kind == 2 else ".jpg"
+        open(os.path.join(dir_path, name + extension), "w").close()
+
+    return dir_path
+
+
+def measure(dir_path, extensions, subdirs):
+    """Returns (time in milliseconds, number of stat() calls) per listing."""
+
+    stat_calls = []
+    stat, lstat = os.stat, os.lstat
+
+    def counting(function):
+        def wrapper(*args, **kwargs):
+            stat_calls.append(args)
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    os.stat, os.lstat = counting(stat), counting(lstat)
+
+    try:
+        start_time = time.time()
+
+        for run_id in xrange(RUNS):
+            list_files(dir_path, extensions, [] if subdirs else None)
+
+        return (time.time() - start_time) * 1000 / RUNS, len(stat_calls) // RUNS
+    finally:
+        os.stat, os.lstat = stat, lstat
+
+
+def main():
+    parent_dir = sys.argv[1] if len(sys.argv) > 1 else None
+    entries = int(sys.argv[2]) if len(sys.argv) > 2 else ENTRIES
+
+    extensions = set(( ext[1:] for ext in pysd.pysd.MEDIA_EXTENSIONS + pysd.pysd.SUBTITLE_EXTENSIONS ))
+    dir_path = create_directory(parent_dir, entries)
+
+    try:
+        implementations = [ ( "listdir", None ) ]
+        if pytee.related_files.scandir is not None:
+            implementations.insert(0, ( "scandir", pytee.related_files.scandir ))
+
+        print "Directory with {0} entries:".format(entries)
+
+        for name, scandir in implementations:
+            pytee.related_files.scandir = scandir
+
+            for subdirs in ( False, True ):
+                list_time, stat_calls = measure(dir_path, extensions, subdirs)
+                print "  {0}, {1}: {2:.1f} ms, {3} stat() calls per listing".format(
+                    name, "files and subdirectories" if subdirs else "files", list_time, stat_calls)
+    finally:
+        shutil.rmtree(dir_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Measures the cost of the movie image redrawing for a 1080p movie on Mac OS
+X: painting of the frame scaled into the window (what
+MPlayerWidget.paintEvent() does) and calculation of the frame signature
+(what MPlayerWidget._redraw() does on every redraw timer tick to skip
+painting of unchanged frames).
+
+The frame is painted from an mmap buffer of the same format as MPlayer's
+shared memory into an offscreen image, so a display and MPlayer aren't
+needed.
+
+Usage: python -m benchmarks.paint [WINDOW_WIDTH WINDOW_HEIGHT]
+"""
+
+import mmap
+import os
+import sys
+import time
+import zlib
+
+from PySide import QtCore, QtGui
+
+from mplayer.process import FRAME_SIGNATURE_ROWS
+from mplayer.widget import DEFAULT_FPS
+
+
+WIDTH = 1920
+HEIGHT = 1080
+"""The movie image dimensions."""
+
+ITERATIONS = 200
+"""Number of the measured calls."""
+
+
+def measure(function):
+    """Returns (wall, CPU) time in milliseconds per call of the function."""
+
+    start_time = time.time()
+    start_cpu_time = time.clock()
+
+    for iteration in xrange(ITERATIONS):
+        function()
+
+    return (
+        (time.time() - start_time) * 1000 / ITERATIONS,
+        (time.clock() - start_cpu_time) * 1000 / ITERATIONS,
+    )
+
+
+def get_signature(memory, width, height):
+    """Calculates the frame signature as MPlayer.get_frame_signature() does."""
+
+    row_size = 3 * width
+    step = max(1, height // FRAME_SIGNATURE_ROWS)
+
+    signature = 0
+    for row in xrange(step // 2, height, step):
+        offset = row * row_size
+        signature = zlib.crc32(memory[offset:offset + row_size], signature)
+
+    return signature
+
+
+def paint(memory, target):
+    """Paints the frame into the target as MPlayerWidget.paintEvent() does."""
+
+    image = QtGui.QImage(memory, WIDTH, HEIGHT, 3 * WIDTH, QtGui.QImage.Format_RGB888)
+
+    painter = QtGui.QPainter(target)
+    painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+    painter.drawImage(QtCore.QRectF(0, 0, target.width(), target.height()), image)
+    painter.end()
+
+
+def main():
+    if len(sys.argv) == 3:
+        window_size = int(sys.argv[1]), int(sys.argv[2])
+    else:
+        window_size = WIDTH, HEIGHT
+
+    memory = mmap.mmap(-1, 3 * WIDTH * HEIGHT)
+    memory.write(os.urandom(3 * WIDTH * HEIGHT))
+
+    target = QtGui.QImage(window_size[0], window_size[1], QtGui.QImage.Format_RGB32)
+
+    results = (
+        ( "paint", measure(lambda: paint(memory, target)) ),
+        ( "signature", measure(lambda: get_signature(memory, WIDTH, HEIGHT)) ),
+    )
+
+    print "{0}x{1} frame painted into {2}x{3} window:".format(WIDTH, HEIGHT, *window_size)
+    for name, (wall_time, cpu_time) in results:
+        print "  {0}: {1:.2f} ms wall, {2:.2f} ms CPU per call".format(name, wall_time, cpu_time)
+
+    paint_time = results[0][1][0]
+    signature_time = results[1][1][0]
+
+    print "Redrawing at {0} fps takes per second:".format(DEFAULT_FPS)
+    print "  every frame painted: {0:.1f} ms".format(DEFAULT_FPS * paint_time)
+    print "  changed frames painted, all frames changed: {0:.1f} ms".format(
+        DEFAULT_FPS * (paint_time + signature_time))
+    print "  changed frames painted, paused or still video: {0:.1f} ms".format(DEFAULT_FPS * signature_time)
+
+
+if __name__ == "__main__":
+    main()
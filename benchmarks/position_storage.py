@@ -0,0 +1,101 @@
+"""
+Compares the sqlite and journal storages of movies' last positions: the
+time of Config opening with the stored positions (the journal is replayed
+into memory) and the time of writing of a flush with the given number of
+changed positions (sqlite commits in WAL mode with synchronous = NORMAL,
+the journal is appended and fsync()ed).
+
+The flush is measured as the time of Config closing, so it includes
+closing of the storage (sqlite checkpoints its WAL on closing of the last
+connection).
+
+Positions are written through Config's public API into a temporary home
+directory, so the storage is on the file system of the temporary
+directory.
+
+Usage: python -m benchmarks.position_storage [POSITIONS [CHANGES]]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pytee.config import Config
+
+
+POSITIONS = 10000
+"""Default number of stored positions."""
+
+CHANGES = 1
+"""Default number of positions changed between flushes."""
+
+RUNS = 20
+"""Number of the measured flushes."""
+
+WRITER_START_TIME = 0.1
+"""Time in seconds which we give to the writer thread to start its work."""
+
+
+def flush(storage, paths, position):
+    """Saves the positions and returns time in seconds of their flushing."""
+
+    config = Config(None, False, storage = storage)
+
+    try:
+        for path in paths:
+            config.save_movie_last_position(path, position)
+
+        time.sleep(WRITER_START_TIME)
+    finally:
+        # Config flushes pending changes on closing
+        start_time = time.time()
+        config.close()
+
+    return time.time() - start_time
+
+
+def measure(storage, positions, changes):
+    """Returns (fill time, open time, flush time) in milliseconds for the storage."""
+
+    paths = [ "/movies/movie-{0}.avi".format(movie_id) for movie_id in xrange(positions) ]
+    fill_time = flush(storage, paths, 60000)
+
+    open_time = 0
+
+    for run_id in xrange(RUNS):
+        start_time = time.time()
+        Config(None, False, storage = storage).close()
+        open_time += time.time() - start_time
+
+    flush_time = 0
+
+    for run_id in xrange(RUNS):
+        changed_paths = paths[run_id * changes % positions:][:changes]
+        flush_time += flush(storage, changed_paths, 60000 + (run_id + 1) * 10000)
+
+    return fill_time * 1000, open_time * 1000 / RUNS, flush_time * 1000 / RUNS
+
+
+def main():
+    positions = int(sys.argv[1]) if len(sys.argv) > 1 else POSITIONS
+    changes = int(sys.argv[2]) if len(sys.argv) > 2 else CHANGES
+
+    print "{0} positions, {1} changes per flush:".format(positions, changes)
+
+    for storage in ( "sqlite", "journal" ):
+        temp_dir = tempfile.mkdtemp()
+        os.environ["HOME"] = temp_dir
+
+        try:
+            fill_time, open_time, flush_time = measure(storage, positions, changes)
+        finally:
+            shutil.rmtree(temp_dir)
+
+        print "  {0}: {1:.1f} ms to write all positions, {2:.1f} ms to open, {3:.1f} ms to flush and close".format(
+            storage, fill_time, open_time, flush_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Measures CPU usage and memory of hidden alternative movies on Linux: their
+MPlayer processes are paused (as they were before suspending) and then
+suspended by SIGSTOP (as MPlayerWidget does now).
+
+MPlayer runs in frame reader mode, so the video is decoded as during
+normal playing, but a display isn't needed. CPU time and RSS are read
+from /proc/<pid>/stat and /proc/<pid>/status.
+
+Usage: python -m benchmarks.suspend MOVIE_PATH [PROCESSES [SECONDS]]
+"""
+
+import os
+import sys
+import time
+
+from PySide import QtCore
+
+from mplayer.process import MPlayer
+
+
+PROCESSES = 3
+"""Default number of MPlayer processes."""
+
+SECONDS = 10
+"""Default duration of each measurement in seconds."""
+
+START_TIMEOUT = 30
+"""Time in seconds during which all MPlayer processes should start."""
+
+
+def get_cpu_time(pid):
+    """Returns CPU time in seconds which the process has consumed."""
+
+    with open("/proc/{0}/stat".format(pid)) as stat_file:
+        stat = stat_file.read()
+
+    # The process name may contain spaces, so it's skipped
+    utime, stime = stat[stat.rindex(")") + 2:].split()[11:13]
+    return float(int(utime) + int(stime)) / os.sysconf("SC_CLK_TCK")
+
+
+def get_rss(pid):
+    """Returns resident set size of the process in kilobytes."""
+
+    with open("/proc/{0}/status".format(pid)) as status_file:
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+    return 0
+
+
+def measure(pids, seconds):
+    """Returns (CPU usage in percent, RSS in kilobytes) of all processes."""
+
+    cpu_time = sum(get_cpu_time(pid) for pid in pids)
+    start_time = time.time()
+
+    time.sleep(seconds)
+
+    cpu_usage = (sum(get_cpu_time(pid) for pid in pids) - cpu_time) * 100 / (time.time() - start_time)
+    return cpu_usage, sum(get_rss(pid) for pid in pids)
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit(__doc__.strip())
+
+    movie_path = sys.argv[1]
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else PROCESSES
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else SECONDS
+
+    app = QtCore.QCoreApplication(sys.argv)
+
+    players = []
+    futures = []
+    started = []
+    errors = []
+
+    try:
+        for process_id in xrange(processes):
+            player = MPlayer("mplayer", frame_reader = True)
+            player.started.connect(lambda: started.append(True))
+            player.failed.connect(errors.append)
+            players.append(player)
+            futures.append(player.run(movie_path, 0, True, None))
+
+        deadline = time.time() + START_TIMEOUT
+
+        while len(started) < processes:
+            if errors:
+                sys.exit(errors[0])
+
+            if time.time() >= deadline:
+                sys.exit("MPlayer hasn't started in time.")
+
+            app.processEvents()
+            time.sleep(0.01)
+
+        pids = [ future.result().pid for future in futures ]
+
+        for state, action in (
+            ( "paused", lambda player: None ),
+            ( "suspended", lambda player: player.suspend() ),
+        ):
+            for player in players:
+                action(player)
+
+            cpu_usage, rss = measure(pids, seconds)
+            print "{0} {1} processes: {2:.1f}% CPU, {3} KB RSS".format(processes, state, cpu_usage, rss)
+    finally:
+        for player in players:
+            player.terminate()
+
+
+if __name__ == "__main__":
+    main()
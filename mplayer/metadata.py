@@ -0,0 +1,127 @@
+"""Provides a persistent cache of movies' metadata."""
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from pycl.core import EE, Error
+
+LOG = logging.getLogger("mplayer.metadata")
+
+
+MAX_ENTRIES = 1000
+"""Maximum number of movies in the cache."""
+
+
+def file_identity(path):
+    """
+    Returns a string which identifies the file content without reading it:
+    the same file moved to another directory has the same identity.
+    """
+
+    stat = os.stat(path)
+    name = os.path.basename(path)
+    if isinstance(name, unicode):
+        name = name.encode("utf-8")
+
+    return hashlib.sha1("{0}\0{1}\0{2}".format(name, stat.st_size, int(stat.st_mtime))).hexdigest()
+
+
+class MetadataCache:
+    """
+    Stores movies' metadata (width, height, length in milliseconds, frame
+    rate and audio track IDs) in a JSON file keyed by file identity, so a
+    movie which has been opened before can be started without querying the
+    player for its properties.
+
+    The least recently used movies are forgotten when the cache has more
+    than MAX_ENTRIES movies.
+    """
+
+    __path = None
+    """Path to the cache file."""
+
+    __lock = None
+    """Lock for the cache state."""
+
+    __entries = None
+    """Cached metadata: file identity -> metadata dictionary."""
+
+
+    def __init__(self, path):
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__entries = {}
+
+        try:
+            with open(path, "rb") as cache_file:
+                entries = json.load(cache_file)
+
+            if not isinstance(entries, dict):
+                raise Error("Invalid cache file format.")
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                LOG.error(u"Unable to read movie metadata cache '%s': %s.", path, EE(e))
+        except Exception as e:
+            LOG.error(u"Unable to read movie metadata cache '%s': %s.", path, EE(e))
+        else:
+            self.__entries = entries
+
+
+    def get(self, movie_path):
+        """Returns the movie's cached metadata or None if it's unknown."""
+
+        try:
+            identity = file_identity(movie_path)
+        except EnvironmentError as e:
+            LOG.debug(u"Unable to get identity of '%s': %s.", movie_path, EE(e))
+            return None
+
+        with self.__lock:
+            metadata = self.__entries.get(identity)
+            if metadata is None:
+                return None
+
+            metadata["access_time"] = int(time.time())
+            return dict(metadata)
+
+
+    def put(self, movie_path, metadata):
+        """Stores the movie's metadata in the cache."""
+
+        try:
+            identity = file_identity(movie_path)
+        except EnvironmentError as e:
+            LOG.debug(u"Unable to get identity of '%s': %s.", movie_path, EE(e))
+            return
+
+        metadata = dict(metadata, access_time = int(time.time()))
+
+        with self.__lock:
+            self.__entries[identity] = metadata
+
+            if len(self.__entries) > MAX_ENTRIES:
+                for identity in sorted(self.__entries,
+                    key = lambda identity: self.__entries[identity]["access_time"]
+                )[:len(self.__entries) - MAX_ENTRIES]:
+                    del self.__entries[identity]
+
+            try:
+                self.__save()
+            except Exception as e:
+                LOG.error(u"Unable to save movie metadata cache '%s': %s.", self.__path, EE(e))
+
+
+    def __save(self):
+        """Atomically rewrites the cache file."""
+
+        temp_path = self.__path + ".tmp"
+
+        with open(temp_path, "wb") as cache_file:
+            json.dump(self.__entries, cache_file)
+
+        os.rename(temp_path, self.__path)
@@ -0,0 +1,670 @@
+"""
+Provides a class that represents a running mpv process controlled via its
+JSON IPC.
+"""
+
+import collections
+import errno
+import json
+import logging
+import os
+import signal
+import socket
+import tempfile
+import time
+import uuid
+
+from PySide import QtCore
+
+import pycl.main
+
+from pycl.core import EE, Error
+
+from mplayer.process import Movie, OUTPUT_BUFFER_SIZE, spawn, terminate_process
+
+LOG = logging.getLogger("mplayer.mpv")
+
+
+CONNECT_TIMEOUT = 10
+"""Time in seconds during which mpv should create its IPC socket."""
+
+CONNECT_INTERVAL = 50
+"""Interval in milliseconds with which we try to connect to mpv's IPC socket."""
+
+OBSERVED_PROPERTIES = (
+    "time-pos", "pause", "volume", "width", "height", "container-fps", "avsync", "frame-drop-count", "duration" )
+"""
+Properties which changes mpv pushes to us (mpv pushes their current values
+in this order, and we consider mpv started on duration receiving, so it's
+the last one).
+"""
+
+
+def _only_running(func):
+    """Calls the method only if mpv is running."""
+
+    def decorator(self, *args, **kwargs):
+        if self.running():
+            return func(self, *args, **kwargs)
+        else:
+            raise Error(self.tr("mpv is not running."))
+
+    return decorator
+
+
+class Mpv(QtCore.QObject):
+    """Represents a running mpv process.
+
+    Has the same interface as mplayer.process.MPlayer, but doesn't poll the
+    player: all status changes are pushed by mpv via property observing and
+    are read by the Qt main loop as soon as they are available.
+
+    Note: the current implementation doesn't allow to run mpv twice.
+    """
+
+    failed = QtCore.Signal(str)
+    """Emitted with error string when mpv failed to start."""
+
+    frame_ready = QtCore.Signal()
+    """Never emitted: mpv draws the video itself."""
+
+    started = QtCore.Signal()
+    """Emitted on mpv start."""
+
+    terminated = QtCore.Signal()
+    """Emitted on mpv termination."""
+
+
+    __state = "stopped"
+    """Current mpv status (stopped|staging|running)."""
+
+
+    __binary_path = None
+    """Path to mpv's binary."""
+
+    __process = None
+    """The mpv process."""
+
+    __socket_path = None
+    """Path to mpv's IPC socket."""
+
+    __socket = None
+    """Connection to mpv's IPC socket."""
+
+    __socket_notifier = None
+    """Notifies about data availability in mpv's IPC socket."""
+
+    __socket_data = ""
+    """Incomplete message received from mpv's IPC socket."""
+
+    __connect_timer = None
+    """Timer for connecting to mpv's IPC socket."""
+
+    __connect_deadline = None
+    """Time until which we try to connect to mpv's IPC socket."""
+
+    __movie_path = None
+    """Path to a movie which is playing at this moment."""
+
+    __movie = None
+    """A movie which is playing at this moment."""
+
+    __video = True
+    """Should mpv decode and display the video."""
+
+    __properties = None
+    """Current values of the observed properties."""
+
+    __osd_displaying = False
+    """Is OSD displaying now?"""
+
+    __muted = False
+    """Is the sound muted now?"""
+
+    __paused = False
+    """
+    Is mpv paused now? (It's tracked by us, because the pushed pause property
+    is outdated until mpv handles our command.)
+    """
+
+    __speed = 1.0
+    """Current playback speed."""
+
+    __suspended = False
+    """Is the mpv process suspended by SIGSTOP now?"""
+
+    __output = None
+    """Ring buffer with last mpv's messages that we didn't process."""
+
+    __frame_reader = False
+    """Is frame reader mode requested (not supported by mpv)?"""
+
+
+    def __init__(self, binary_path, status_line = False, frame_reader = False, metadata_cache = None, parent = None):
+        super(Mpv, self).__init__(parent)
+
+        # status_line and metadata_cache are accepted for compatibility with
+        # MPlayer: mpv always pushes status and property changes to us.
+
+        self.__binary_path = binary_path
+        self.__frame_reader = frame_reader
+        self.__properties = {}
+        self.__output = collections.deque(maxlen = OUTPUT_BUFFER_SIZE)
+
+        self.__connect_timer = QtCore.QTimer(self)
+        self.__connect_timer.timeout.connect(self._connect)
+
+
+    def __del__(self):
+        self.terminate()
+
+
+    @_only_running
+    def cur_pos(self):
+        """Returns current time position in milliseconds."""
+
+        pos = self.__properties.get("time-pos")
+        if pos is None:
+            raise Error(self.tr("Current position is not available yet."))
+
+        return int(pos * 1000)
+
+
+    def emits_frame_ready(self):
+        """Not supported by mpv backend: always returns False."""
+
+        return False
+
+
+    @_only_running
+    def get_frame_signature(self):
+        """Not supported by mpv backend: always returns None."""
+
+        return None
+
+
+    @_only_running
+    def get_movie(self):
+        """Returns a movie that is playing at this moment."""
+
+        return self.__movie
+
+
+    @_only_running
+    def get_image_size(self):
+        """Returns (width, height) of the movie image or None if it has no video."""
+
+        if not self.__video:
+            return None
+
+        return self.__movie.get_width(), self.__movie.get_height()
+
+
+    @_only_running
+    def get_movie_image(self):
+        """Returns current movie image."""
+
+        raise Error(self.tr("mpv backend doesn't support getting of the movie image."))
+
+
+    def get_output(self):
+        """Returns last mpv's messages that we didn't process."""
+
+        return list(self.__output)
+
+
+    @_only_running
+    def get_speed(self):
+        """Returns the current playback speed."""
+
+        return self.__speed
+
+
+    @_only_running
+    def get_status(self):
+        """
+        Returns the player status in the same format as
+        mplayer.process.parse_status_line() or None if it's not available.
+        """
+
+        pos = self.__properties.get("time-pos")
+        if pos is None:
+            return None
+
+        drift = self.__properties.get("avsync")
+
+        return {
+            "pos":            int(pos * 1000),
+            "av_drift":       None if drift is None else int(drift * 1000),
+            "dropped_frames": self.__properties.get("frame-drop-count")
+        }
+
+
+    @_only_running
+    def get_volume(self):
+        """Returns the current volume (0 - 100)."""
+
+        volume = self.__properties.get("volume")
+        if volume is None:
+            raise Error(self.tr("Current volume is not available yet."))
+
+        return volume
+
+
+    def has_video(self):
+        """Returns True if mpv displays the movie's video."""
+
+        return self.__video
+
+
+    @_only_running
+    def mute(self, mute):
+        """Mutes/unmutes the sound (doesn't change the paused state)."""
+
+        # Unlike MPlayer, mpv never unpauses on a command, so there is no
+        # need for pausing_keep here. MPlayerWidget's pause bookkeeping
+        # relies on mute() not changing the paused state.
+        self.__command([ "set_property", "mute", bool(mute) ])
+        self.__muted = bool(mute)
+
+
+    @_only_running
+    def muted(self):
+        """Returns True if the sound is muted."""
+
+        return self.__muted
+
+
+    @_only_running
+    def osd_displaying(self):
+        """Returns True if OSD is displaying now."""
+
+        return self.__osd_displaying
+
+
+    @_only_running
+    def osd_toggle(self):
+        """Toggles the OSD displaying."""
+
+        self.__command([ "set_property", "osd-level", 1 if self.__osd_displaying else 3 ])
+        self.__osd_displaying = not self.__osd_displaying
+
+
+    @_only_running
+    def pause(self):
+        """Pauses the movie playing."""
+
+        self.__command([ "set_property", "pause", not self.__paused ])
+        self.__paused = not self.__paused
+
+
+    @_only_running
+    def paused(self):
+        """Returns True if mpv is paused."""
+
+        return self.__paused
+
+
+    def run(self, movie_path, start_from, paused, display_widget, video = True, video_size = None):
+        """Runs mpv.
+
+        If video is False, mpv plays only the movie's audio and doesn't decode
+        the video at all.
+
+        video_size is accepted for compatibility with MPlayer: mpv draws the
+        video into the display widget itself, so it's scaled by the video
+        output.
+
+        Returns a SpawnFuture of the mpv process.
+        """
+
+        if self.__state != "stopped":
+            raise Error(self.tr("mpv is already running."))
+
+        if video and pycl.main.is_osx():
+            raise Error(self.tr("mpv backend doesn't support video output on Mac OS X."))
+
+        if video and self.__frame_reader:
+            raise Error(self.tr("mpv backend doesn't support frame reader mode."))
+
+        self.__state = "staging"
+        self.__video = video
+        self.__movie_path = movie_path
+        self.__properties = {}
+        self.__paused = paused
+        self.__socket_path = os.path.join(tempfile.gettempdir(),
+            "pytee-mpv-" + str(uuid.uuid4()).replace("-", "")[:16] + ".sock")
+
+        args = [
+            self.__binary_path,
+            "--no-config", "--no-input-default-bindings", "--really-quiet",
+            "--no-sub-auto", "--sid=no",
+            "--input-ipc-server=" + self.__socket_path,
+            "--start=" + str(start_from),
+        ]
+
+        if paused:
+            args += [ "--pause" ]
+
+        if video:
+            args += [ "--wid=" + str(display_widget.winId()) ]
+        else:
+            args += [ "--vid=no" ]
+
+        args += [ "--", movie_path ]
+
+        LOG.debug(u"Running mpv: %s", args)
+
+        # Will be closed when the process is spawned
+        devnull = open(os.devnull, "r+")
+
+        future = spawn(args, stdin = devnull, stdout = devnull, close_fds = True)
+        future.add_done_callback(lambda future: self._spawned(future, devnull))
+
+        return future
+
+
+    @_only_running
+    def resume(self):
+        """Resumes the mpv process suspended by suspend()."""
+
+        if self.__suspended:
+            LOG.debug(u"Resuming the mpv process %s...", self.__process.pid)
+            self.__signal(signal.SIGCONT)
+            self.__suspended = False
+
+
+    def running(self):
+        """
+        Checks whether mpv is running (the state when we can send commands to
+        it.
+        """
+
+        return self.__state == "running"
+
+
+    @_only_running
+    def seek(self, seconds, absolute = False, keep_paused = False):
+        """Seeks for specified number of seconds.
+
+        Unless keep_paused is True, the movie is unpaused after seeking (as
+        MPlayer does).
+        """
+
+        self.__command([ "seek", seconds, "absolute" if absolute else "relative" ])
+        if not keep_paused:
+            self.__command([ "set_property", "pause", False ])
+            self.__paused = False
+
+
+    @_only_running
+    def speed(self, value):
+        """Sets the playback speed (doesn't change the paused state).
+
+        mpv keeps the pitch of the sound when the speed is changed.
+        """
+
+        self.__command([ "set_property", "speed", value ])
+        self.__speed = value
+
+
+    @_only_running
+    def suspend(self):
+        """Suspends the mpv process.
+
+        A suspended process doesn't consume any CPU time until resume() is
+        called, so the movie should be paused before suspending.
+        """
+
+        if not self.__suspended:
+            LOG.debug(u"Suspending the mpv process %s...", self.__process.pid)
+            self.__signal(signal.SIGSTOP)
+            self.__suspended = True
+
+
+    def suspended(self):
+        """Returns True if the mpv process is suspended."""
+
+        return self.__suspended
+
+
+    def terminate(self):
+        """Terminates the mpv process."""
+
+        prev_state = self.__state
+        self.__state = "stopped"
+
+        if self.__connect_timer is not None:
+            self.__connect_timer.stop()
+
+        if self.__socket_notifier is not None:
+            self.__socket_notifier.setEnabled(False)
+            self.__socket_notifier.deleteLater()
+            self.__socket_notifier = None
+
+        if self.__socket is not None:
+            try:
+                self.__socket.close()
+            except Exception as e:
+                LOG.error(u"Unable to close mpv's IPC connection: %s.", EE(e))
+            finally:
+                self.__socket = None
+
+        self.__socket_data = ""
+
+        if self.__process is not None:
+            if self.__suspended:
+                # Otherwise it won't be able to handle SIGTERM
+                try:
+                    self.__signal(signal.SIGCONT)
+                except Exception as e:
+                    LOG.error(u"Unable to resume the mpv process: %s.", EE(e))
+
+            terminate_process(self.__process)
+            self.__process = None
+
+        self.__suspended = False
+        self.__paused = False
+        self.__muted = False
+        self.__osd_displaying = False
+        self.__speed = 1.0
+
+        if self.__socket_path is not None:
+            try:
+                os.unlink(self.__socket_path)
+            except EnvironmentError as e:
+                if e.errno != errno.ENOENT:
+                    LOG.error(u"Unable to delete mpv's IPC socket '%s': %s.", self.__socket_path, EE(e))
+            finally:
+                self.__socket_path = None
+
+        if prev_state == "running":
+            self.terminated.emit()
+
+
+    @_only_running
+    def volume(self, value, absolute = False):
+        """Increase/decrease volume (or set it if absolute is True)."""
+
+        if absolute:
+            self.__command([ "set_property", "volume", value ])
+        else:
+            self.__command([ "add", "volume", value ])
+
+
+    def _failed(self, error):
+        """Called when mpv fails to start."""
+
+        if self.__state != "staging":
+            LOG.debug(u"Ignoring 'failed' signal. We already have state %s.", self.__state)
+            return
+
+        self.terminate()
+        self.failed.emit(error)
+
+
+    def _connect(self):
+        """Called by timer to try to connect to mpv's IPC socket."""
+
+        if self.__state != "staging" or self.__socket is not None:
+            self.__connect_timer.stop()
+            return
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        try:
+            sock.connect(self.__socket_path)
+        except socket.error as e:
+            sock.close()
+
+            # mpv creates the socket a little later after its start
+            if time.time() >= self.__connect_deadline:
+                self.__connect_timer.stop()
+                LOG.error(u"Unable to connect to mpv's IPC socket: %s.", EE(e))
+                self._failed(self.tr("mpv failed to open '{0}'.").format(self.__movie_path))
+
+            return
+
+        self.__connect_timer.stop()
+        self.__socket = sock
+        self.__socket_notifier = QtCore.QSocketNotifier(sock.fileno(), QtCore.QSocketNotifier.Read, self)
+        self.__socket_notifier.activated.connect(self._socket_ready)
+
+        try:
+            for property_id, property_name in enumerate(OBSERVED_PROPERTIES):
+                self.__command([ "observe_property", property_id + 1, property_name ], suppress_debug = True)
+        except Exception as e:
+            self._failed(EE(e))
+
+
+    def _socket_ready(self):
+        """Called when mpv's IPC socket has data for reading."""
+
+        error = None
+
+        try:
+            data = self.__socket.recv(4096)
+        except socket.error as e:
+            if e.errno in (errno.EINTR, errno.EAGAIN):
+                return
+
+            data = ""
+            error = EE(e)
+
+        if not data:
+            self.__disconnected(error or self.tr("connection closed"))
+            return
+
+        lines = (self.__socket_data + data).split("\n")
+        self.__socket_data = lines.pop()
+
+        for line in lines:
+            # We may be terminated while processing the messages
+            if self.__socket is None:
+                break
+
+            if not line.strip():
+                continue
+
+            try:
+                message = json.loads(line)
+            except ValueError:
+                LOG.error(u"Got an invalid message from mpv: %s.", line)
+            else:
+                self.__handle_message(message)
+
+
+    def _spawned(self, future, devnull):
+        """Called when mpv process spawning finishes."""
+
+        try:
+            devnull.close()
+        except Exception as e:
+            LOG.error(u"Unable to close %s: %s.", os.devnull, EE(e))
+
+        try:
+            process = future.result()
+        except Exception as e:
+            error = Error(self.tr("Unable to start mpv:")).append(e)
+            LOG.error(u"%s", EE(error))
+            self._failed(EE(error))
+            return
+
+        if self.__state != "staging":
+            LOG.debug(u"mpv has been stopped while spawning. Terminating it.")
+            terminate_process(process)
+            return
+
+        self.__process = process
+        self.__connect_deadline = time.time() + CONNECT_TIMEOUT
+        self.__connect_timer.start(CONNECT_INTERVAL)
+
+
+    def __check_started(self):
+        """Checks whether we've got all info about the movie to consider mpv started."""
+
+        duration = self.__properties.get("duration")
+        width = self.__properties.get("width")
+        height = self.__properties.get("height")
+
+        if duration is None or self.__video and (width is None or height is None):
+            return
+
+        self.__movie = Movie(self.__movie_path, width, height, int(duration * 1000),
+            self.__properties.get("container-fps"))
+        self.__state = "running"
+        LOG.debug(u"We successfully started mpv for movie '%s'.", self.__movie)
+        self.started.emit()
+
+
+    def __command(self, command, suppress_debug = False):
+        """Sends a command to mpv."""
+
+        if not suppress_debug:
+            LOG.debug(u"Sending %s command to mpv...", command)
+
+        try:
+            self.__socket.sendall(json.dumps({ "command": command }) + "\n")
+        except Exception as e:
+            LOG.debug(u"Error while sending a command to mpv: %s.", EE(e))
+
+            # Assuming that mpv terminated due to movie finish.
+            self.terminate()
+            raise Error(self.tr("The movie finished."))
+
+
+    def __disconnected(self, error):
+        """Called when mpv closes its IPC connection."""
+
+        if self.__state == "staging":
+            self._failed(self.tr("mpv failed to open '{0}': {1}.").format(self.__movie_path, error))
+        elif self.__state == "running":
+            LOG.debug(u"mpv IPC connection closed: %s. Assuming that the movie finished.", error)
+            self.terminate()
+
+
+    def __handle_message(self, message):
+        """Handles a message received from mpv."""
+
+        event = message.get("event")
+
+        if event == "property-change":
+            self.__properties[message["name"]] = message.get("data")
+            if self.__state == "staging":
+                self.__check_started()
+        elif event == "end-file" and message.get("reason") == "error" and self.__state == "staging":
+            self._failed(self.tr("mpv failed to open '{0}'.").format(self.__movie_path))
+        elif message.get("error", "success") != "success":
+            LOG.debug(u"mpv returned an error: %s.", message)
+        elif event is not None:
+            self.__output.append(message)
+
+
+    def __signal(self, signum):
+        """Sends a signal to the mpv process."""
+
+        try:
+            os.kill(self.__process.pid, signum)
+        except EnvironmentError as e:
+            if e.errno != errno.ESRCH:
+                raise Error(self.tr("Unable to send a signal to the mpv process:")).append(e)
@@ -1,14 +1,26 @@
 """Provides a class that represents a running MPlayer process."""
 
+import atexit
+import collections
 import errno
+import fcntl
 import logging
 import os
+import Queue
+import re
+import select
 import signal
-import subprocess
-import sys
+import tempfile
 import threading
 import time
 import uuid
+import zlib
+
+try:
+    # subprocess32 spawns processes in C code and is thread-safe
+    import subprocess32 as subprocess
+except ImportError:
+    import subprocess
 
 from PySide import QtCore, QtGui
 
@@ -17,6 +29,8 @@ import pycl.misc
 
 from pycl.core import EE, Error
 
+from mplayer.y4m import Y4mReader
+
 if pycl.main.is_osx():
     import ctypes
     import mmap
@@ -26,6 +40,114 @@ if pycl.main.is_osx():
 LOG = logging.getLogger("mplayer.process")
 
 
+FRAME_SIGNATURE_ROWS = 32
+"""Number of movie image rows which are used for calculating frame signature."""
+
+MAX_SPAWN_WORKERS = 2
+"""Maximum number of processes that are being spawned simultaneously."""
+
+OUTPUT_BUFFER_SIZE = 100
+"""Number of MPlayer output lines that we keep in memory."""
+
+PROPERTY_TIMEOUT = 5
+"""Time in seconds during which MPlayer should respond to a property request."""
+
+TERMINATION_TIMEOUT = 1
+"""
+Time in seconds after which a player process that didn't terminate by SIGTERM
+is killed by SIGKILL.
+"""
+
+
+def spawn(args, **kwargs):
+    """Spawns a process using the shared launcher.
+
+    Accepts the same arguments as subprocess.Popen and returns a SpawnFuture.
+    """
+
+    global _launcher
+
+    if _launcher is None:
+        _launcher = _Launcher(MAX_SPAWN_WORKERS)
+
+    return _launcher.spawn(args, **kwargs)
+
+
+_STATUS_AUDIO_RE = re.compile(r"(?:^|\s)A:\s*(-?\d+\.\d+)")
+_STATUS_VIDEO_RE = re.compile(r"(?:^|\s)V:\s*(-?\d+\.\d+)")
+_STATUS_DRIFT_RE = re.compile(r"\sA-V:\s*(-?\d+\.\d+)")
+_STATUS_DROPPED_RE = re.compile(r"%\s+(\d+)\s+\d+(?:\s+\d+%)?\s*$")
+"""Regular expressions for parsing MPlayer's status line."""
+
+_VIDEO_OUTPUT_RE = re.compile(r"^VO: \[[^\]]*\] (\d+)x(\d+) =>")
+"""Matches MPlayer's video output configuration line."""
+
+_AUDIO_ID_RE = re.compile(r"^ID_AUDIO_ID=(\d+)$")
+"""Matches an audio track ID in MPlayer's -identify output."""
+
+
+def parse_status_line(line):
+    """Parses MPlayer's status line.
+
+    Returns a dictionary with current position in milliseconds, A-V drift in
+    milliseconds and number of dropped frames (None if the value is not
+    present) or None if the line is not a status line.
+    """
+
+    if not line.startswith(("A:", "V:")):
+        return None
+
+    video = _STATUS_VIDEO_RE.search(line)
+    audio = _STATUS_AUDIO_RE.search(line)
+
+    pos = video or audio
+    if pos is None:
+        return None
+
+    drift = _STATUS_DRIFT_RE.search(line)
+    dropped = _STATUS_DROPPED_RE.search(line)
+
+    return {
+        "pos":            int(float(pos.group(1)) * 1000),
+        "av_drift":       int(float(drift.group(1)) * 1000) if drift else None,
+        "dropped_frames": int(dropped.group(1)) if dropped else None
+    }
+
+
+def terminate_process(process, close_stdout = True):
+    """Terminates a player process.
+
+    Doesn't block: the process is reaped by the main loop (so it must be
+    called from the main thread).
+
+    close_stdout must be False if the process' stdout is being read by
+    another thread (e.g. by Popen.communicate()): the thread closes it by
+    itself on EOF, and the file can't be closed while it's being read. The
+    players' output is read by the main loop, so they use the default.
+    """
+
+    global _reaper
+
+    LOG.debug(u"Killing the player process %s...", process.pid)
+
+    if process.stdin is not None:
+        try:
+            process.stdin.close()
+        except Exception as e:
+            LOG.error(u"Unable to close the player process stdin: %s.", EE(e))
+
+    if close_stdout and process.stdout is not None:
+        try:
+            process.stdout.close()
+        except Exception as e:
+            LOG.error(u"Unable to close the player process stdout: %s.", EE(e))
+
+    if _reaper is None:
+        _reaper = _Reaper()
+
+    _reaper.terminate(process)
+
+
 def _only_running(func):
     """Calls the method only if MPlayer is running."""
 
@@ -38,41 +160,391 @@ def _only_running(func):
     return decorator
 
 
+class SpawnFuture(QtCore.QObject):
+    """Represents a result of asynchronous process spawning."""
+
+    finished = QtCore.Signal()
+    """Emitted when the spawning finishes."""
+
+
+    _done_signal = QtCore.Signal()
+    """Emitted by a launcher thread when the spawning finishes (for internal usage)."""
+
+
+    __lock = None
+    """Lock for the result changing."""
+
+    __callbacks = None
+    """Callbacks to call when the spawning finishes."""
+
+    __done = False
+    """Has the spawning finished?"""
+
+    __process = None
+    """The spawned process."""
+
+    __error = None
+    """Error that occurred during spawning."""
+
+
+    def __init__(self, parent = None):
+        super(SpawnFuture, self).__init__(parent)
+
+        self.__lock = threading.Lock()
+        self.__callbacks = []
+        self._done_signal.connect(self._done)
+
+
+    def add_done_callback(self, callback):
+        """
+        Calls the callback with the future as an argument in the thread which
+        created the future when the spawning finishes (or at once if it has
+        already finished).
+        """
+
+        with self.__lock:
+            if not self.__done:
+                self.__callbacks.append(callback)
+                return
+
+        callback(self)
+
+
+    def done(self):
+        """Returns True if the spawning has finished."""
+
+        return self.__done
+
+
+    def result(self):
+        """Returns the spawned process or raises the spawning error."""
+
+        if not self.__done:
+            raise Error("The process is not spawned yet.")
+
+        if self.__error is not None:
+            raise self.__error
+
+        return self.__process
+
+
+    def _done(self):
+        """Called when the spawning finishes."""
+
+        with self.__lock:
+            callbacks = self.__callbacks
+            self.__callbacks = []
+
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                LOG.exception(u"Spawn future callback failed: %s", EE(e))
+
+        self.finished.emit()
+
+
+    def _set_result(self, process = None, error = None):
+        """Sets the spawning result (may be called from any thread)."""
+
+        with self.__lock:
+            self.__process = process
+            self.__error = error
+            self.__done = True
+
+        self._done_signal.emit()
+
+
+
+class _Launcher:
+    """
+    Spawns processes in a bounded pool of threads shared between all MPlayer
+    instances.
+    """
+
+    __max_workers = None
+    """Maximum number of the worker threads."""
+
+    __workers = None
+    """Running worker threads."""
+
+    __queue = None
+    """Queue of spawning requests."""
+
+    __lock = None
+    """Lock for the launcher state changing."""
+
+    __idle_workers = 0
+    """Number of worker threads that wait for a request and have no request assigned to them."""
+
+    __unassigned = 0
+    """Number of queued requests that no worker thread has been assigned to."""
+
+    __pending = None
+    """
+    Futures of the requests which results haven't been delivered yet (a
+    SpawnFuture is deleted by PySide as soon as there are no references to
+    it, and its result would be lost with the spawned process).
+    """
+
+    __spawned = 0
+    """Number of spawned processes."""
+
+    __total_latency = 0
+    """Total time spent for spawning of all processes."""
+
+
+    def __init__(self, max_workers):
+        self.__max_workers = max_workers
+        self.__workers = []
+        self.__queue = Queue.Queue()
+        self.__lock = threading.Lock()
+        self.__pending = set()
+
+
+    def spawn(self, args, **kwargs):
+        """Queues a process for spawning and returns a SpawnFuture."""
+
+        future = SpawnFuture()
+        future.add_done_callback(self.__delivered)
+
+        with self.__lock:
+            self.__pending.add(future)
+            self.__queue.put(( future, time.time(), args, kwargs ))
+
+            # Every request gets its own worker while there are less than
+            # __max_workers of them, so simultaneous requests are never
+            # serialized on a single busy worker.
+            if self.__idle_workers:
+                self.__idle_workers -= 1
+            elif len(self.__workers) < self.__max_workers:
+                worker = threading.Thread(name = "Process launcher", target = self.__worker)
+                worker.daemon = True
+                worker.start()
+                self.__workers.append(worker)
+            else:
+                self.__unassigned += 1
+
+        return future
+
+
+    def __delivered(self, future):
+        """Called in the future's thread when its result has been delivered."""
+
+        with self.__lock:
+            self.__pending.discard(future)
+
+
+    def __worker(self):
+        """Worker thread's main function."""
+
+        while True:
+            future, queue_time, args, kwargs = self.__queue.get()
+            spawn_time = time.time()
+
+            try:
+                process = subprocess.Popen(args, **kwargs)
+            except Exception as e:
+                future._set_result(error = e)
+            else:
+                end_time = time.time()
+
+                with self.__lock:
+                    self.__spawned += 1
+                    self.__total_latency += end_time - queue_time
+                    average_latency = self.__total_latency / self.__spawned
+
+                LOG.debug(u"Process %s spawned in %.3f seconds (%.3f seconds in queue, %.3f seconds on average).",
+                    process.pid, end_time - queue_time, spawn_time - queue_time, average_latency)
+
+                future._set_result(process = process)
+
+            with self.__lock:
+                if self.__unassigned:
+                    self.__unassigned -= 1
+                else:
+                    self.__idle_workers += 1
+
+_launcher = None
+"""The shared process launcher."""
+
+
+
+class _Reaper(QtCore.QObject):
+    """
+    Reaps terminating player processes in the main loop.
+
+    SIGCHLD wakes the main loop up via a pipe which is set by
+    signal.set_wakeup_fd() and watched by a QSocketNotifier, and the processes
+    that don't terminate by SIGTERM are killed by SIGKILL on a timer, so
+    neither threads nor polling are needed. A process is signalled only while
+    it isn't reaped yet, so its PID can't be reused by another process.
+    """
+
+    __processes = None
+    """Terminating processes: PID -> subprocess.Popen."""
+
+    __wakeup_fds = None
+    """(read, write) file descriptors of the pipe to which signal arrivals are written."""
+
+    __wakeup_notifier = None
+    """Notifies about signal arrivals."""
+
+
+    def __init__(self):
+        super(_Reaper, self).__init__()
+
+        self.__processes = {}
+        self.__wakeup_fds = os.pipe()
+
+        for fd in self.__wakeup_fds:
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+            fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+        self.__wakeup_notifier = QtCore.QSocketNotifier(self.__wakeup_fds[0], QtCore.QSocketNotifier.Read, self)
+        self.__wakeup_notifier.activated.connect(self._wakeup)
+
+        # Python signal handlers are called only when the interpreter gets
+        # control, but the signal arrival is written to the wakeup file
+        # descriptor at once. SIGCHLD must not interrupt system calls of the
+        # other code.
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        signal.siginterrupt(signal.SIGCHLD, False)
+        signal.set_wakeup_fd(self.__wakeup_fds[1])
+
+        # The main loop isn't running at exit, so the processes that ignore
+        # SIGTERM are killed at once.
+        atexit.register(self.__kill_all)
+
+
+    def terminate(self, process):
+        """Sends SIGTERM to the process and reaps it when it terminates."""
+
+        self.__processes[process.pid] = process
+
+        try:
+            os.kill(process.pid, signal.SIGTERM)
+        except EnvironmentError as e:
+            if e.errno != errno.ESRCH:
+                LOG.error(u"Unable to terminate the player process %s: %s.", process.pid, EE(e))
+
+        QtCore.QTimer.singleShot(TERMINATION_TIMEOUT * 1000, lambda: self.__kill(process))
+
+        # The process may have terminated before we started to handle SIGCHLD
+        self.__reap()
+
+
+    def _wakeup(self):
+        """Called when a signal (presumably SIGCHLD) arrives."""
+
+        try:
+            while pycl.misc.syscall_wrapper(os.read, self.__wakeup_fds[0], 4096):
+                pass
+        except EnvironmentError as e:
+            if e.errno != errno.EAGAIN:
+                LOG.error(u"Unable to read the signal wakeup pipe: %s.", EE(e))
+
+        self.__reap()
+
+
+    def __kill(self, process):
+        """Kills the process by SIGKILL if it hasn't terminated yet."""
+
+        self.__reap()
+
+        if self.__processes.get(process.pid) is not process:
+            return
+
+        LOG.debug(u"Killing the player process %s by SIGKILL...", process.pid)
+
+        try:
+            os.kill(process.pid, signal.SIGKILL)
+        except EnvironmentError as e:
+            if e.errno != errno.ESRCH:
+                LOG.error(u"Unable to kill the player process %s: %s.", process.pid, EE(e))
+
+
+    def __kill_all(self):
+        """Kills all processes which haven't terminated yet by SIGKILL."""
+
+        self.__reap()
+
+        for process in self.__processes.values():
+            self.__kill(process)
+
+
+    def __reap(self):
+        """Reaps the terminated processes."""
+
+        for pid, process in self.__processes.items():
+            try:
+                reaped_pid, status = os.waitpid(pid, os.WNOHANG)
+            except EnvironmentError as e:
+                # The process has been reaped by its owner (by Popen.wait() in another thread)
+                if e.errno != errno.ECHILD:
+                    LOG.error(u"Unable to wait for the player process %s termination: %s.", pid, EE(e))
+                    continue
+            else:
+                if not reaped_pid:
+                    continue
+
+                process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
+            del self.__processes[pid]
+            LOG.debug(u"The player process %s terminated with %s exit code.", pid, process.returncode)
+
+_reaper = None
+"""The shared player process reaper."""
+
+
+
 class MPlayer(QtCore.QObject):
     """Represents a running MPlayer process.
 
+    All MPlayer's output is read by the Qt main loop as soon as it's
+    available, so we never block waiting for MPlayer except for property
+    requests which are limited by PROPERTY_TIMEOUT. The movie's properties
+    are requested on start in one batch and their answers are handled
+    asynchronously, so the start doesn't block at all.
+
+    In status line mode MPlayer's status line is parsed, so current position,
+    A-V drift and number of dropped frames are available without sending any
+    commands to MPlayer.
+
+    In frame reader mode (Linux only, requires NumPy) MPlayer writes decoded
+    frames to a yuv4mpeg FIFO from which we read them, so the movie image is
+    available via get_movie_image() as on Mac OS X.
+
+    If a metadata cache is specified, a movie which has been opened before
+    is considered started right after MPlayer spawning: its Movie object is
+    built from the cached metadata which is verified later by asynchronous
+    property requests.
+
     Note: the current implementation doesn't allow to run MPlayer twice.
     """
 
     failed = QtCore.Signal(str)
-    """Emitted with error string when MPlayer failed to start."""
-
-    started = QtCore.Signal()
-    """Emitted on MPlayer start."""
+    """
+    Emitted with error string when MPlayer failed to start (or terminated
+    before verification of the cached metadata it was started with).
+    """
 
-    pos_changed = QtCore.Signal(int)
+    frame_ready = QtCore.Signal()
     """
-    Emitted with time in milliseconds when current time position in playing
-    movie changes.
+    Emitted (possibly from another thread) when a new movie image is
+    available. Only in frame reader mode (see emits_frame_ready()).
     """
 
+    started = QtCore.Signal()
+    """Emitted on MPlayer start."""
+
     terminated = QtCore.Signal()
     """Emitted on MPlayer termination."""
 
 
-    _started_signal = QtCore.Signal(str)
-    """Emitted on MPlayer start (for internal usage)."""
-
-    _failed_signal = QtCore.Signal(str)
-    """Emitted with error string when MPlayer failed to start (for internal usage)."""
-
-
     __state = "stopped"
     """Current MPlayer status (stopped|staging|running)."""
 
-    __lock = None
-    """Lock for __state changing."""
-
 
     __binary_path = None
     """Path to MPlayer's binary."""
@@ -83,11 +555,48 @@ class MPlayer(QtCore.QObject):
     __movie = None
     """A movie which is playing at this moment."""
 
+    __video = True
+    """Should MPlayer decode and display the video."""
+
+    __video_size = None
+    """Size of the box to which MPlayer scales the video while decoding."""
+
+    __image_size = None
+    """Size of the video output image reported by MPlayer."""
+
     __osd_displaying = False
     """Is OSD displaying now?"""
 
-    __update_timer = None
-    """Timer for updating current MPlayer status."""
+    __muted = False
+    """Is the sound muted now?"""
+
+    __paused = False
+    """Is MPlayer paused now?"""
+
+    __speed = 1.0
+    """Current playback speed."""
+
+    __suspended = False
+    """Is the MPlayer process suspended by SIGSTOP now?"""
+
+
+    __status_line = False
+    """Is status line mode enabled?"""
+
+    __output_notifier = None
+    """Notifies about MPlayer's output availability."""
+
+    __output_data = ""
+    """Incomplete line of MPlayer's output."""
+
+    __answers = None
+    """Queue of MPlayer's answers to our requests."""
+
+    __status = None
+    """Last parsed MPlayer's status line (status line mode only)."""
+
+    __output = None
+    """Ring buffer with last lines of MPlayer's output."""
 
 
     __shm_name = None
@@ -97,178 +606,754 @@ class MPlayer(QtCore.QObject):
     """MPlayer's shared memory."""
 
 
-    def __init__(self, binary_path, parent = None):
+    __frame_reader = False
+    """Is frame reader mode enabled?"""
+
+    __fifo_path = None
+    """Path to the FIFO to which MPlayer writes its yuv4mpeg video output."""
+
+    __y4m_reader = None
+    """Reader of MPlayer's yuv4mpeg video output."""
+
+
+    __metadata_cache = None
+    """Persistent cache of movies' metadata (None if it's disabled)."""
+
+    __audio_tracks = None
+    """IDs of the movie's audio tracks reported by MPlayer."""
+
+    __cached_metadata = None
+    """Cached metadata of the current movie which is being verified."""
+
+
+    __movie_path = None
+    """Path to the movie which is being opened (while staging)."""
+
+    __property_requests = None
+    """Queue of (name, type) of the asynchronous property requests."""
+
+    __property_answers = None
+    """Received answers to the asynchronous property requests."""
+
+    __handshake_timer = None
+    """Limits the time MPlayer may take to answer the start property requests."""
+
+
+    def __init__(self, binary_path, status_line = False, frame_reader = False, metadata_cache = None, parent = None):
         super(MPlayer, self).__init__(parent)
 
-        self.__lock = threading.Lock()
         self.__binary_path = binary_path
+        self.__status_line = status_line
+        self.__frame_reader = frame_reader and not pycl.main.is_osx()
+        self.__metadata_cache = metadata_cache
+        self.__audio_tracks = []
+        self.__answers = collections.deque()
+        self.__property_requests = collections.deque()
+        self.__property_answers = {}
+        self.__output = collections.deque(maxlen = OUTPUT_BUFFER_SIZE)
+
+        self.__handshake_timer = QtCore.QTimer(self)
+        self.__handshake_timer.setSingleShot(True)
+        self.__handshake_timer.timeout.connect(self._handshake_timeout)
+
+
+    def __del__(self):
+        self.terminate()
+
+
+    @_only_running
+    def cur_pos(self):
+        """Returns current time position in milliseconds."""
+
+        if self.__status_line and self.__status is not None and self.__status["pos"] is not None:
+            return self.__status["pos"]
+
+        cur_pos = self.__get_property("time_pos", float, force_pausing = True, suppress_debug = True)
+        cur_pos = int(cur_pos * 1000)
+
+        if self.__status_line:
+            if self.__status is None:
+                self.__status = { "pos": cur_pos, "av_drift": None, "dropped_frames": None }
+            else:
+                self.__status["pos"] = cur_pos
+
+        return cur_pos
+
+
+    @_only_running
+    def get_movie(self):
+        """Returns a movie that is playing at this moment."""
+
+        return self.__movie
+
+
+    def emits_frame_ready(self):
+        """Returns True if frame_ready signal is emitted on every new frame."""
+
+        return self.__frame_reader and self.__video
+
 
-        self._started_signal.connect(self._started)
-        self._failed_signal.connect(self._failed)
+    @_only_running
+    def get_frame_signature(self):
+        """
+        Returns a checksum of a sampled region of the current movie image that
+        changes when the image changes or None if it's not available.
+        """
+
+        if self.__y4m_reader is not None:
+            sequence, frame = self.__y4m_reader.get_frame()
+            return sequence if frame is not None else None
+
+        if not pycl.main.is_osx() or not self.__map_shared_memory():
+            return None
+
+        width, height = self.get_image_size()
+        row_size = 3 * width
+        step = max(1, height // FRAME_SIGNATURE_ROWS)
+
+        signature = 0
+        for row in xrange(step // 2, height, step):
+            offset = row * row_size
+            signature = zlib.crc32(self.__shm_memory[offset:offset + row_size], signature)
+
+        return signature
+
+
+    @_only_running
+    def get_image_size(self):
+        """
+        Returns (width, height) of the movie image which MPlayer outputs or
+        None if it's not known yet.
+
+        It differs from the movie's dimensions when the video is scaled while
+        decoding.
+        """
+
+        if not self.__video:
+            return None
+
+        if self.__image_size is not None:
+            return self.__image_size
+
+        if self.__video_size is not None:
+            return None
+
+        return self.__movie.get_width(), self.__movie.get_height()
+
+
+    @_only_running
+    def get_movie_image(self):
+        """Returns current movie image.
+
+        The image references MPlayer's shared memory (or the frame reader's
+        buffer) without copying.
+        """
+
+        # Size of the blank image which is returned on error
+        width, height = self.get_image_size() or ( self.__movie.get_width(), self.__movie.get_height() )
+
+        try:
+            if self.__y4m_reader is not None:
+                return self.__get_y4m_image()
+
+            if not pycl.main.is_osx():
+                raise Error("Not supported.")
+
+            if not self.__map_shared_memory():
+                movie = self.get_movie()
+                return QtGui.QImage(movie.get_width(), movie.get_height(), QtGui.QImage.Format_RGB888)
+
+            width, height = self.get_image_size()
+
+            return QtGui.QImage(self.__shm_memory, width, height, 3 * width, QtGui.QImage.Format_RGB888)
+
+            # For testing purposes (very slow):
+            # -->
+            #import struct
+
+            #image_data = self.__shm_memory[:image_size]
+
+            #bmp_header_fmt = "<ccIIIIiiHHIIiiII"
+            #bmp_header_size = struct.calcsize(bmp_header_fmt)
+            #bmp_header = struct.pack(bmp_header_fmt,
+            #        "B", "M", bmp_header_size + image_size, 0, bmp_header_size,
+            #        40, movie.get_width(), -movie.get_height(), 1, 24, 0, 0, 2000, 2000, 0, 0)
+
+            #bmp_image = bmp_header
+            #for i in xrange(0, image_size / 3):
+            #    bmp_image += image_data[i * 3 + 2 : i * 3 + 3]
+            #    bmp_image += image_data[i * 3 + 1 : i * 3 + 2]
+            #    bmp_image += image_data[i * 3 : i * 3 + 1]
+
+            #image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB888)
+            #image.loadFromData(bmp_image)
+            #return image
+            # <--
+        except Exception as e:
+            LOG.error(u"Failed to get the movie image: %s", e)
+            return QtGui.QImage(width, height, QtGui.QImage.Format_RGB888)
+
+
+    def get_output(self):
+        """Returns last lines of MPlayer's output."""
+
+        return list(self.__output)
+
+
+    @_only_running
+    def get_speed(self):
+        """Returns the current playback speed."""
+
+        return self.__speed
+
+
+    @_only_running
+    def get_status(self):
+        """
+        Returns the last parsed MPlayer's status (see parse_status_line()) or
+        None if it's not available.
+        """
+
+        return None if self.__status is None else self.__status.copy()
+
+
+    @_only_running
+    def get_volume(self):
+        """Returns the current volume (0 - 100)."""
+
+        return self.__get_property("volume", float, force_pausing = True)
+
+
+    def has_video(self):
+        """Returns True if MPlayer displays the movie's video."""
+
+        return self.__video
+
+
+    @_only_running
+    def mute(self, mute):
+        """Mutes/unmutes the sound (doesn't change the paused state)."""
+
+        self.__command("pausing_keep mute {0}".format(int(mute)))
+        self.__muted = bool(mute)
+
+
+    @_only_running
+    def muted(self):
+        """Returns True if the sound is muted."""
+
+        return self.__muted
+
+
+    @_only_running
+    def osd_displaying(self):
+        """Returns True if OSD is displaying now."""
+
+        return self.__osd_displaying
+
+
+    @_only_running
+    def osd_toggle(self):
+        """Toggles the OSD displaying (doesn't change the paused state)."""
+
+        self.__command("pausing_keep osd {0}".format(1 if self.__osd_displaying else 3))
+        self.__osd_displaying = not self.__osd_displaying
+
+
+    @_only_running
+    def pause(self):
+        """Pauses the movie playing."""
+
+        self.__command("pause")
+
+
+    @_only_running
+    def paused(self):
+        """Returns True if the MPlayer is paused.
+
+        The state is tracked by the commands we send, so MPlayer isn't polled.
+        """
+
+        return self.__paused
+
+
+    def run(self, movie_path, start_from, paused, display_widget, video = True, video_size = None):
+        """Runs MPlayer.
+
+        If video is False, MPlayer plays only the movie's audio and doesn't
+        decode the video at all.
+
+        If video_size is (width, height), MPlayer scales the video to fit this
+        box while decoding (it makes sense only when we paint the movie image
+        ourselves).
+
+        Returns a SpawnFuture of the MPlayer process.
+        """
+
+        if self.__state != "stopped":
+            raise Error(self.tr("MPlayer is already running."))
+
+        self.__state = "staging"
+        self.__video = video
+        self.__video_size = video_size if video else None
+
+        if not video:
+            video_output = None
+        elif pycl.main.is_osx():
+            video_output = self.__shm_name = (
+                "mplayer-" + str(uuid.uuid4()).replace("-", "")[:16])
+        elif self.__frame_reader:
+            video_output = self.__start_frame_reader()
+        else:
+            video_output = str(display_widget.winId())
+
+        args = self.__get_args(movie_path, video_output, start_from)
+        LOG.debug(u"Running MPlayer: %s", args)
+
+        # We have to run MPlayer in another thread, because it is not going to
+        # start if our main loop is locked at this moment (X11 only).
+        future = spawn(args, stdin = subprocess.PIPE, stdout = subprocess.PIPE, close_fds = True)
+        future.add_done_callback(lambda future: self._spawned(future, movie_path, paused))
+
+        return future
+
+
+    @_only_running
+    def resume(self):
+        """Resumes the MPlayer process suspended by suspend()."""
+
+        if self.__suspended:
+            LOG.debug(u"Resuming the MPlayer process %s...", self.__process.pid)
+            self.__signal(signal.SIGCONT)
+            self.__suspended = False
+
+
+    def running(self):
+        """
+        Checks whether MPlayer is running (the state when we can send commands
+        to it.
+        """
+
+        return self.__state == "running"
+
+
+    @_only_running
+    def seek(self, seconds, absolute = False, keep_paused = False):
+        """Seeks for specified number of seconds.
+
+        If keep_paused is True, the paused movie stays paused after seeking.
+        """
+
+        self.__command("{0}seek {1} {2}".format(
+            "pausing_keep_force " if keep_paused else "", seconds, 2 if absolute else 0))
+
+        if self.__status_line:
+            # MPlayer doesn't print status line when paused
+            self.__status = None
+
+
+    @_only_running
+    def speed(self, value):
+        """Sets the playback speed (doesn't change the paused state).
+
+        Audio-only players keep the pitch of the sound when the speed is
+        changed.
+        """
+
+        self.__command("pausing_keep speed_set {0}".format(value))
+        self.__speed = value
+
+
+    @_only_running
+    def suspend(self):
+        """Suspends the MPlayer process.
+
+        A suspended process doesn't consume any CPU time and doesn't answer
+        any requests until resume() is called, so the movie should be paused
+        before suspending.
+        """
+
+        if not self.__suspended:
+            LOG.debug(u"Suspending the MPlayer process %s...", self.__process.pid)
+            self.__signal(signal.SIGSTOP)
+            self.__suspended = True
+
+
+    def suspended(self):
+        """Returns True if the MPlayer process is suspended."""
+
+        return self.__suspended
+
+
+    def terminate(self):
+        """Terminates the MPlayer process."""
+
+        if self.__stop() == "running":
+            self.terminated.emit()
+
+
+    @_only_running
+    def volume(self, value, absolute = False):
+        """
+        Increase/decrease volume (or set it if absolute is True). Doesn't
+        change the paused state.
+        """
+
+        self.__command("pausing_keep volume {0} {1}".format(value, int(absolute)))
+
+
+    def _failed(self, error):
+        """Called when MPlayer fails to start."""
+
+        if self.__state != "staging":
+            LOG.debug(u"Ignoring 'failed' signal. We already have state %s.", self.__state)
+            return
+
+        self.terminate()
+        self.failed.emit(error)
+
+
+    def _handshake_timeout(self):
+        """Called when MPlayer doesn't answer the start property requests in time."""
+
+        if self.__state != "staging":
+            return
+
+        LOG.error(u"MPlayer hasn't responded to the property requests for '%s'.", self.__movie_path)
+        self._failed(self.tr("MPlayer failed to open '{0}'.").format(self.__movie_path))
+
+
+    def _output_ready(self):
+        """Called when MPlayer's output is available for reading."""
+
+        try:
+            if self.__read_output():
+                return
+        except Exception as e:
+            LOG.debug(u"Error while reading MPlayer's output: %s.", EE(e))
+
+        if self.__state == "running":
+            LOG.debug(u"MPlayer closed its output.")
+            self.__process_finished()
+        elif self.__state == "staging":
+            LOG.error(u"MPlayer terminated before answering the property requests for '%s'.", self.__movie_path)
+            self._failed(self.tr("MPlayer failed to open '{0}'.").format(self.__movie_path))
+
+
+    def _spawned(self, future, movie_path, paused):
+        """Called when MPlayer process spawning finishes."""
+
+        process = None
+
+        try:
+            try:
+                process = future.result()
+            except Exception as e:
+                raise Error(self.tr("Unable to start MPlayer:")).append(e)
+
+            if paused:
+                try:
+                    process.stdin.write("pause\n")
+                    self.__paused = True
+                except Exception as e:
+                    raise Error(self.tr("MPlayer failed to open '{0}'."), movie_path)
+        except Exception as e:
+            LOG.error(u"%s", EE(e))
+
+            if process is not None:
+                terminate_process(process)
+
+            self._failed(EE(e))
+        else:
+            if self.__state != "staging":
+                LOG.debug(u"MPlayer has been stopped while spawning. Terminating it.")
+                terminate_process(process)
+                return
+
+            self.__process = process
+            self.__output_notifier = QtCore.QSocketNotifier(
+                process.stdout.fileno(), QtCore.QSocketNotifier.Read, self)
+            self.__output_notifier.activated.connect(self._output_ready)
+
+            self._started(movie_path)
+
+
+    def _started(self, movie_path):
+        """Called on successful MPlayer start."""
+
+        if self.__state != "staging":
+            LOG.debug(u"Ignoring 'started' signal. We already have state %s.", self.__state)
+            return
+
+        try:
+            self.__request_properties()
+        except Exception as e:
+            self.terminate()
+            LOG.error(u"%s", Error("MPlayer failed to open '{0}'.", movie_path).append(e))
+            self.failed.emit(self.tr("MPlayer failed to open '{0}'.").format(movie_path))
+            return
+
+        metadata = None if self.__metadata_cache is None else self.__metadata_cache.get(movie_path)
+
+        if metadata is None:
+            # The movie is considered started when MPlayer answers the requests
+            self.__movie_path = movie_path
+            self.__handshake_timer.start(PROPERTY_TIMEOUT * 1000)
+        else:
+            # The answers will be used for verification of the cached metadata
+            self.__cached_metadata = metadata
+            self.__movie = self.__get_movie(movie_path, metadata)
+            self.__state = "running"
+            LOG.debug(u"We started MPlayer for movie '%s' using its cached metadata.", self.__movie)
+            self.started.emit()
+
+
+    def __command(self, command, suppress_debug = False):
+        """Sends a command to the MPlayer."""
+
+        if not suppress_debug:
+            LOG.debug(u"Sending '%s' command to the MPlayer...", command)
+
+        # MPlayer unpauses on any command without pausing_* prefix
+        if command == "pause":
+            self.__paused = not self.__paused
+        elif not command.startswith("pausing"):
+            self.__paused = False
+
+        try:
+            self.__process.stdin.write(command + "\n")
+        except Exception as e:
+            LOG.debug(u"Error while sending a command to the MPlayer: %s.", EE(e))
+            self.__connection_closed()
+
+
+    def __connection_closed(self):
+        """Called when MPlayer closes stdin or stdout."""
+
+        self.__process_finished()
+        raise Error(self.tr("The movie finished."))
+
+
+    def __get_args(self, movie_path, video_output, start_from):
+        """Returns MPlayer command line arguments."""
+
+        args = [
+            self.__binary_path,
+            "-framedrop",
+            "-slave",
+            "-nosub", "-noautosub",
+            "-input", "nodefault-bindings", "-noconfig", "all",
+            "-ss", str(start_from),
+
+            movie_path
+        ]
+
+        if not self.__status_line:
+            args += [ "-quiet" ]
+
+        if self.__metadata_cache is not None:
+            args += [ "-identify" ]
+
+        if video_output is None:
+            # scaletempo keeps the pitch when the speed is changed
+            args += [ "-novideo", "-af", "scaletempo" ]
+        elif pycl.main.is_osx():
+            args += [ "-vo", "corevideo:shared_buffer:rgb_only:buffer_name=" + video_output ]
+        elif self.__frame_reader:
+            args += [ "-vo", "yuv4mpeg:file=" + video_output, "-ao", "sdl" ]
+        else:
+            args += [
+                # Forcing XV driver usage to disable VDPAU which may cause
+                # system hang-up.
+                "-vo", "xv",
+
+                # This option is needed because of some bugs in PulseAudio
+                # implementation. Lack of this option can cause problems with
+                # pausing - video will be paused but wont be able to be
+                # unpaused.
+                "-ao", "sdl",
 
-        self.__update_timer = QtCore.QTimer(self)
-        self.__update_timer.timeout.connect(self._update)
-        self.__update_timer.start(100)
+                "-wid", video_output,
+            ]
 
+        if video_output is not None and self.__video_size is not None:
+            # Fitting the video into the box keeping its aspect ratio
+            args += [ "-vf", "dsize={0}:{1}:0,scale=0:0".format(*self.__video_size) ]
 
-    def __del__(self):
-        self.terminate()
+        return args
 
 
-    @_only_running
-    def cur_pos(self):
-        """Returns current time position in milliseconds."""
+    def __get_movie(self, movie_path, metadata):
+        """Returns a Movie object for the movie's metadata."""
 
-        cur_pos = self.__get_property("time_pos", float, force_pausing = True, suppress_debug = True)
-        return int(cur_pos * 1000)
+        if self.__video:
+            width, height, fps = metadata["width"], metadata["height"], metadata["fps"]
+        else:
+            width = height = fps = None
 
+        return Movie(movie_path, width, height, metadata["length"], fps, metadata["audio_tracks"])
 
-    @_only_running
-    def get_movie(self):
-        """Returns a movie that is playing at this moment."""
 
-        return self.__movie
+    def __get_property(self, property_name, result_type = str, force_pausing = False, suppress_debug = False):
+        """Requests a MPlayer property value."""
 
+        if self.__suspended:
+            raise Error(self.tr("MPlayer is suspended."))
 
-    @_only_running
-    def get_movie_image(self):
-        """Returns current movie image."""
+        self.__command("{0}get_property {1}".format(
+            "pausing_keep_force " if force_pausing else "", property_name), suppress_debug)
 
-        try:
-            if not pycl.main.is_osx():
-                raise Error("Not supported.")
+        response_template = "ANS_{0}=".format(property_name)
+        deadline = time.time() + PROPERTY_TIMEOUT
 
-            movie = self.get_movie()
-            width = movie.get_width()
-            height = movie.get_height()
+        while True:
+            while self.__answers:
+                line = self.__answers.popleft()
 
-            if self.__shm_memory is None:
-                fd = -1
+                if line.startswith(response_template):
+                    value = line[len(response_template):]
+                    try:
+                        return result_type(value)
+                    except ValueError:
+                        LOG.error(u"Property %s has an invalid value '%s'.", property_name, value)
+                        raise Error(self.tr("Internal error."))
+                elif line.startswith("ANS_ERROR="):
+                    LOG.error(u"Invalid response for property %s received: %s.", property_name, line)
+                    raise Error(self.tr("Internal error."))
+                else:
+                    # May be a late answer to a timed out request
+                    LOG.debug(u"Skipping unexpected MPlayer response: %s.", line)
 
-                while fd < 0:
-                    fd = libc.shm_open(self.__shm_name, os.O_RDONLY)
+            timeout = deadline - time.time()
 
-                    if fd < 0 and ctypes.get_errno() != errno.EINTR:
-                        (LOG.debug if ctypes.get_errno() == errno.ENOENT else LOG.error)(
-                            u"Unable to open the MPlayer's shared memory buffer: %s.", os.strerror(ctypes.get_errno()))
-                        return QtGui.QImage(width, height, QtGui.QImage.Format_RGB888)
+            try:
+                ready = timeout > 0 and pycl.misc.syscall_wrapper(
+                    select.select, [ self.__process.stdout ], [], [], timeout)[0]
+                eof = ready and not self.__read_output()
+            except Exception as e:
+                LOG.debug(u"Error while reading a command response from the MPlayer: %s.", EE(e))
+                self.__connection_closed()
 
-                try:
-                    image_size = 3 * width * height
-                    memory_size = os.fstat(fd).st_size
+            if not ready:
+                LOG.error(u"MPlayer hasn't responded to %s property request.", property_name)
+                raise Error(self.tr("Internal error."))
 
-                    if memory_size < image_size:
-                        # But it can be bigger due to the rounding to the page size
-                        raise Error("MPlayer created shared memory of invalid size ({0} vs {1}).", memory_size, image_size)
+            if eof:
+                LOG.debug(u"Error while reading a command response from the MPlayer: unexpected end of file.")
+                self.__connection_closed()
 
-                    self.__shm_memory = mmap.mmap(fd, image_size, mmap.MAP_SHARED, mmap.PROT_READ)
-                finally:
-                    try:
-                        pycl.misc.syscall_wrapper(os.close, fd)
-                    except Exception as e:
-                        LOG.error(u"Unable to close the MPlayer's shared memory object: %s.", EE(e))
 
-            return QtGui.QImage(self.__shm_memory, width, height, 3 * width, QtGui.QImage.Format_RGB888)
+    def __get_y4m_image(self):
+        """Returns the last frame read from MPlayer's yuv4mpeg output."""
 
-            # For testing purposes (very slow):
-            # -->
-            #import struct
+        sequence, frame = self.__y4m_reader.get_frame()
 
-            #image_data = self.__shm_memory[:image_size]
+        if frame is None:
+            movie = self.get_movie()
+            return QtGui.QImage(movie.get_width(), movie.get_height(), QtGui.QImage.Format_RGB888)
 
-            #bmp_header_fmt = "<ccIIIIiiHHIIiiII"
-            #bmp_header_size = struct.calcsize(bmp_header_fmt)
-            #bmp_header = struct.pack(bmp_header_fmt,
-            #        "B", "M", bmp_header_size + image_size, 0, bmp_header_size,
-            #        40, movie.get_width(), -movie.get_height(), 1, 24, 0, 0, 2000, 2000, 0, 0)
+        height, width = frame.shape[:2]
+        return QtGui.QImage(frame.data, width, height, 3 * width, QtGui.QImage.Format_RGB888)
 
-            #bmp_image = bmp_header
-            #for i in xrange(0, image_size / 3):
-            #    bmp_image += image_data[i * 3 + 2 : i * 3 + 3]
-            #    bmp_image += image_data[i * 3 + 1 : i * 3 + 2]
-            #    bmp_image += image_data[i * 3 : i * 3 + 1]
 
-            #image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB888)
-            #image.loadFromData(bmp_image)
-            #return image
-            # <--
-        except Exception as e:
-            LOG.error(u"Failed to get the movie image: %s", e)
-            return QtGui.QImage(width, height, QtGui.QImage.Format_RGB888)
+    def __handshake_finished(self, answers):
+        """Called when all start property requests are answered."""
 
+        movie_path = self.__movie_path
+        self.__movie_path = None
+        self.__handshake_timer.stop()
 
-    @_only_running
-    def osd_toggle(self):
-        """Toggles the OSD displaying."""
+        if answers["length"] is None or self.__video and (not answers["width"] or not answers["height"]):
+            LOG.error(u"MPlayer failed to open '%s': it returned invalid properties %s.", movie_path, answers)
+            self._failed(self.tr("MPlayer failed to open '{0}'.").format(movie_path))
+            return
 
-        self.__command("osd 1" if self.__osd_displaying else "osd 3")
-        self.__osd_displaying = not self.__osd_displaying
+        metadata = {
+            "width": answers.get("width"),
+            "height": answers.get("height"),
+            "length": int(answers["length"] * 1000),
+            "fps": answers.get("fps"),
+            "audio_tracks": list(self.__audio_tracks),
+        }
 
+        self.__movie = self.__get_movie(movie_path, metadata)
+        self.__state = "running"
 
-    @_only_running
-    def pause(self):
-        """Pauses the movie playing."""
+        if self.__metadata_cache is not None and self.__video:
+            self.__metadata_cache.put(movie_path, metadata)
+        LOG.debug(u"We successfully started MPlayer for movie '%s'.", self.__movie)
+        self.started.emit()
 
-        self.__command("pause")
 
+    def __map_shared_memory(self):
+        """Maps MPlayer's shared memory if it's not mapped yet.
 
-    @_only_running
-    def paused(self):
-        """Returns True if the MPlayer is paused."""
+        Returns False if the shared memory is not available yet.
+        """
 
-        return self.__get_property("pause", force_pausing = True, suppress_debug = True) == "yes"
+        if self.__shm_memory is not None:
+            return True
 
+        dimensions = self.get_image_size()
+        if dimensions is None:
+            LOG.debug(u"MPlayer hasn't reported its video output size yet.")
+            return False
 
-    def run(self, movie_path, start_from, paused, display_widget):
-        """Runs MPlayer."""
+        fd = -1
 
-        if self.__state != "stopped":
-            raise Error(self.tr("MPlayer is already running."))
+        while fd < 0:
+            fd = libc.shm_open(self.__shm_name, os.O_RDONLY)
 
-        self.__state = "staging"
-        if pycl.main.is_osx():
-            video_output = self.__shm_name = (
-                "mplayer-" + str(uuid.uuid4()).replace("-", "")[:16])
-        else:
-            video_output = str(display_widget.winId())
+            if fd < 0 and ctypes.get_errno() != errno.EINTR:
+                (LOG.debug if ctypes.get_errno() == errno.ENOENT else LOG.error)(
+                    u"Unable to open the MPlayer's shared memory buffer: %s.", os.strerror(ctypes.get_errno()))
+                return False
 
-        # We have to run MPlayer in another thread, because it is not going to
-        # start if our main loop is locked at this moment (X11 only).
+        try:
+            image_size = 3 * dimensions[0] * dimensions[1]
+            memory_size = os.fstat(fd).st_size
 
-        thread = threading.Thread(name = "MPlayer thread",
-            target = self.__run,
-            args = (movie_path, video_output, start_from, paused))
-        thread.start()
+            if memory_size < image_size:
+                # But it can be bigger due to the rounding to the page size
+                raise Error("MPlayer created shared memory of invalid size ({0} vs {1}).", memory_size, image_size)
 
+            self.__shm_memory = mmap.mmap(fd, image_size, mmap.MAP_SHARED, mmap.PROT_READ)
+        finally:
+            try:
+                pycl.misc.syscall_wrapper(os.close, fd)
+            except Exception as e:
+                LOG.error(u"Unable to close the MPlayer's shared memory object: %s.", EE(e))
 
-    def running(self):
-        """
-        Checks whether MPlayer is running (the state when we can send commands
-        to it.
-        """
+        return True
 
-        return self.__state == "running"
 
+    def __metadata_verified(self, answers):
+        """Called when all metadata verification requests are answered."""
 
-    @_only_running
-    def seek(self, seconds, absolute = False):
-        """Seeks for specified number of seconds."""
+        cached = self.__cached_metadata
+        self.__cached_metadata = None
 
-        self.__command("seek {0} {1}".format(seconds, 2 if absolute else 0))
+        metadata = dict(cached, audio_tracks = list(self.__audio_tracks))
+        for name, value in answers.iteritems():
+            metadata[name] = value
 
+        if metadata["length"] is None or self.__video and (not metadata["width"] or not metadata["height"]):
+            LOG.error(u"Unable to verify the cached metadata of '%s': MPlayer returned invalid properties %s.",
+                self.__movie, answers)
+            return
 
-    def terminate(self):
-        """Terminates the MPlayer process."""
+        metadata["length"] = int(metadata["length"] * 1000)
 
-        with self.__lock:
-            prev_state = self.__state
-            self.__state = "stopped"
+        if metadata == cached:
+            LOG.debug(u"Cached metadata of '%s' has been verified.", self.__movie)
+            return
 
-        if self.__process is not None:
-            self.__terminate(self.__process)
-            self.__process = None
+        LOG.warning(u"Cached metadata of '%s' is outdated: %s -> %s.", self.__movie, cached, metadata)
 
-        if self.__shm_memory is not None:
+        if (
+            self.__shm_memory is not None and
+            (metadata["width"], metadata["height"]) != (cached["width"], cached["height"])
+        ):
             try:
                 self.__shm_memory.close()
             except Exception as e:
@@ -276,221 +1361,244 @@ class MPlayer(QtCore.QObject):
             finally:
                 self.__shm_memory = None
 
-        self.__shm_name = None
+        self.__movie = self.__get_movie(self.__movie.get_path(), metadata)
+        self.__metadata_cache.put(self.__movie.get_path(), metadata)
 
-        if prev_state == "running":
-            self.terminated.emit()
 
+    def __process_finished(self):
+        """Called when the MPlayer process closes its stdin or stdout."""
 
-    @_only_running
-    def volume(self, value):
-        """Increase/decrease volume."""
+        if self.__state != "running" or self.__cached_metadata is None:
+            # Assuming that MPlayer terminated due to movie finish.
+            self.terminate()
+            return
 
-        self.__command("volume {0} 0".format(value))
+        # MPlayer hasn't answered to the verification requests, so the movie
+        # probably hasn't been opened at all.
+        movie_path = self.__movie.get_path()
+        LOG.error(u"MPlayer terminated before verification of the cached metadata of '%s'.", movie_path)
+        self.__stop()
 
+        # The failure isn't reported from the current call stack which may be
+        # a call of any of our methods.
+        error = self.tr("MPlayer failed to open '{0}'.").format(movie_path)
+        QtCore.QTimer.singleShot(0, lambda: self.failed.emit(error))
 
-    def _failed(self, error):
-        """Called when MPlayer fails to start."""
 
-        if self.__state != "staging":
-            LOG.debug(u"Ignoring 'failed' signal. We already have state %s.", self.__state)
-            return
+    def __properties_received(self):
+        """Called when all asynchronous property requests are answered."""
 
-        self.terminate()
-        self.failed.emit(error)
+        answers = self.__property_answers
+        self.__property_answers = {}
 
+        if self.__state == "staging":
+            self.__handshake_finished(answers)
+        elif self.__cached_metadata is not None:
+            self.__metadata_verified(answers)
 
-    def _started(self, movie_path):
-        """Called on successful MPlayer start."""
 
-        if self.__state != "staging":
-            LOG.debug(u"Ignoring 'started' signal. We already have state %s.", self.__state)
-            return
+    def __property_answer(self, line):
+        """Handles MPlayer's answer to an asynchronous property request.
 
-        try:
-            width = self.__get_property("width", int, force_pausing = True)
-            height = self.__get_property("height", int, force_pausing = True)
-        except Exception as e:
-            self.terminate()
-            LOG.error(u"%s", Error("MPlayer failed to open '{0}'.", movie_path).append(e))
-            self.failed.emit(self.tr("MPlayer failed to open '{0}'.").format(movie_path))
-        else:
-            self.__movie = Movie(movie_path, width, height)
-            self.__state = "running"
-            LOG.debug(u"We successfully started MPlayer for movie '%s'.", self.__movie)
-            self.started.emit()
+        Returns False if the answer isn't for an asynchronous request.
+        """
 
+        if not self.__property_requests:
+            return False
 
-    def _update(self):
-        """Called by timer to update current MPlayer status."""
+        property_name, result_type = self.__property_requests[0]
+        response_template = "ANS_{0}=".format(property_name)
 
-        try:
-            if self.running():
-                self.pos_changed.emit(self.cur_pos())
-        except Exception as e:
-            if self.running():
-                LOG.exception(u"MPlayer current status update failed. %s", e)
+        if line.startswith(response_template):
+            value = line[len(response_template):]
+            try:
+                value = result_type(value)
+            except ValueError:
+                LOG.error(u"Property %s has an invalid value '%s'.", property_name, value)
+                value = None
+        elif line.startswith("ANS_ERROR="):
+            LOG.debug(u"Unable to get %s property: %s.", property_name, line)
+            value = None
+        else:
+            return False
 
+        self.__property_requests.popleft()
+        self.__property_answers[property_name] = value
 
-    def __command(self, command, suppress_debug = False):
-        """Sends a command to the MPlayer."""
+        if not self.__property_requests:
+            self.__properties_received()
 
-        if not suppress_debug:
-            LOG.debug(u"Sending '%s' command to the MPlayer...", command)
+        return True
 
-        try:
-            self.__process.stdin.write(command + "\n")
-        except Exception as e:
-            LOG.debug(u"Error while sending a command to the MPlayer: %s.", EE(e))
-            self.__connection_closed()
 
+    def __read_output(self):
+        """Reads and parses available MPlayer's output.
 
-    def __connection_closed(self):
-        """Called when MPlayer closes stdin or stdout."""
+        Returns False on end of file.
+        """
 
-        # Assuming that MPlayer terminated due to movie finish.
-        self.terminate()
-        raise Error(self.tr("The movie finished."))
+        data = pycl.misc.syscall_wrapper(os.read, self.__process.stdout.fileno(), 4096)
+        if not data:
+            return False
 
+        lines = re.split(r"[\r\n]", self.__output_data + data)
+        self.__output_data = lines.pop()
 
-    def __get_property(self, property_name, result_type = str, force_pausing = False, suppress_debug = False):
-        """Requests a MPlayer property value."""
+        for line in lines:
+            line = line.rstrip()
+            if not line:
+                continue
 
-        self.__command("{0}get_property {1}".format(
-            "pausing_keep_force " if force_pausing else "", property_name), suppress_debug)
+            if line.startswith("ANS_"):
+                if not self.__property_answer(line):
+                    self.__answers.append(line)
+                continue
 
-        while True:
-            try:
-                line = self.__process.stdout.readline()
-                if not line:
-                    raise Error("unexpected end of file")
-            except Exception as e:
-                LOG.debug(u"Error while reading a command response from the MPlayer: %s.", EE(e))
-                self.__connection_closed()
+            if line.startswith("ID_"):
+                audio_track = _AUDIO_ID_RE.search(line)
+                if audio_track is not None and int(audio_track.group(1)) not in self.__audio_tracks:
+                    self.__audio_tracks.append(int(audio_track.group(1)))
+                continue
 
-            if line.startswith("ANS_"):
-                response_template = "ANS_{0}=".format(property_name)
+            video_output = _VIDEO_OUTPUT_RE.search(line)
+            if video_output is not None:
+                self.__image_size = ( int(video_output.group(1)), int(video_output.group(2)) )
 
-                if line.startswith(response_template):
-                    value = line[len(response_template):].rstrip()
-                    try:
-                        return result_type(value)
-                    except ValueError:
-                        LOG.error(u"Property %s has an invalid value '%s'.", property_name, value)
-                        raise Error(self.tr("Internal error."))
-                else:
-                    LOG.error(u"Invalid response for property %s received: %s.", property_name, line.rstrip())
-                    raise Error(self.tr("Internal error."))
+            status = parse_status_line(line) if self.__status_line else None
+
+            if status is None:
+                self.__output.append(line)
             else:
-                try:
-                    sys.stdout.write(line)
-                except Exception as e:
-                    LOG.error(u"Unable to write MPlayer output to stdout: %s.", EE(e))
+                self.__status = status
 
+        return True
 
-    def __run(self, movie_path, video_output, start_from, paused):
-        """Runs MPlayer process."""
 
-        args = [
-            self.__binary_path,
-            "-framedrop",
-            "-slave", "-quiet",
-            "-nosub", "-noautosub",
-            "-input", "nodefault-bindings", "-noconfig", "all",
-            "-ss", str(start_from),
+    def __request_properties(self):
+        """
+        Sends asynchronous requests of the movie's properties (all of them at
+        once, so they take a single round trip).
+        """
 
-            movie_path
-        ]
+        requests = [ ( "width", int ), ( "height", int ), ( "fps", float ) ] if self.__video else []
+        requests.append(( "length", float ))
 
-        if pycl.main.is_osx():
-            args += [ "-vo", "corevideo:shared_buffer:rgb_only:buffer_name=" + video_output ]
-        else:
-            args += [
-                # Forcing XV driver usage to disable VDPAU which may cause
-                # system hang-up.
-                "-vo", "xv",
+        for property_name, result_type in requests:
+            self.__command("pausing_keep_force get_property " + property_name)
+            self.__property_requests.append(( property_name, result_type ))
 
-                # This option is needed because of some bugs in PulseAudio
-                # implementation. Lack of this option can cause problems with
-                # pausing - video will be paused but wont be able to be
-                # unpaused.
-                "-ao", "sdl",
 
-                "-wid", video_output,
-            ]
+    def __signal(self, signum):
+        """Sends a signal to the MPlayer process."""
 
-        LOG.debug(u"Running MPlayer: %s", args)
+        try:
+            os.kill(self.__process.pid, signum)
+        except EnvironmentError as e:
+            if e.errno != errno.ESRCH:
+                raise Error(self.tr("Unable to send a signal to the MPlayer process:")).append(e)
 
-        process = None
-        error = None
+
+    def __start_frame_reader(self):
+        """
+        Creates a FIFO for MPlayer's yuv4mpeg output and starts reading it.
+
+        Returns the FIFO path.
+        """
+
+        fifo_path = os.path.join(tempfile.gettempdir(),
+            "pytee-y4m-" + str(uuid.uuid4()).replace("-", "")[:16] + ".fifo")
+        y4m_reader = Y4mReader(fifo_path, self.frame_ready.emit)
 
         try:
-            try:
-                process = subprocess.Popen(args, stdin = subprocess.PIPE, stdout = subprocess.PIPE, close_fds = True)
-            except Exception as e:
-                raise Error(self.tr("Unable to start MPlayer:")).append(e)
+            os.mkfifo(fifo_path, 0600)
+        except EnvironmentError as e:
+            raise Error(self.tr("Unable to create a FIFO for MPlayer's video output:")).append(e)
 
-            if paused:
+        self.__fifo_path = fifo_path
+        self.__y4m_reader = y4m_reader
+        self.__y4m_reader.start()
+
+        return fifo_path
+
+
+    def __stop(self):
+        """Stops the MPlayer process and returns the previous state."""
+
+        prev_state = self.__state
+        self.__state = "stopped"
+
+        if self.__output_notifier is not None:
+            self.__output_notifier.setEnabled(False)
+            self.__output_notifier.deleteLater()
+            self.__output_notifier = None
+
+        if self.__process is not None:
+            if self.__suspended:
+                # Otherwise it won't be able to handle SIGTERM
                 try:
-                    process.stdin.write("pause\n")
+                    self.__signal(signal.SIGCONT)
                 except Exception as e:
-                    raise Error(self.tr("MPlayer failed to open '{0}'."), movie_path)
-        except Exception as e:
-            LOG.error(u"%s", EE(e))
+                    LOG.error(u"Unable to resume the MPlayer process: %s.", EE(e))
 
-            if process is not None:
-               self.__terminate(process)
+            terminate_process(self.__process)
+            self.__process = None
 
-            if self.__state == "staging":
-                self._failed_signal.emit(EE(e))
-        else:
-            with self.__lock:
-                if self.__state == "staging":
-                    self.__process = process
-                    self._started_signal.emit(movie_path)
-                else:
-                    self.__terminate(process)
+        self.__suspended = False
+        self.__paused = False
+        self.__muted = False
+        self.__osd_displaying = False
+        self.__speed = 1.0
+        self.__output_data = ""
+        self.__answers.clear()
+        self.__status = None
+        self.__image_size = None
+        self.__audio_tracks = []
+        self.__cached_metadata = None
+        self.__movie_path = None
+        self.__property_requests.clear()
+        self.__property_answers = {}
+
+        if self.__handshake_timer is not None:
+            self.__handshake_timer.stop()
+
+        if self.__shm_memory is not None:
+            try:
+                self.__shm_memory.close()
+            except Exception as e:
+                LOG.error(u"Unable to unmap the MPlayer's shared memory: %s.", EE(e))
+            finally:
+                self.__shm_memory = None
 
+        self.__shm_name = None
 
-    def __terminate(self, process):
-        """Terminates a MPlayer process."""
+        if self.__y4m_reader is not None:
+            self.__stop_frame_reader()
 
-        pid = process.pid
-        LOG.debug(u"Killing the MPlayer process %s...", pid)
+        return prev_state
 
-        try:
-            process.stdin.close()
-        except Exception as e:
-            LOG.error(u"Unable to close the MPlayer process stdin: %s.", EE(e))
 
-        try:
-            process.stdout.close()
-        except Exception as e:
-            LOG.error(u"Unable to close the MPlayer process stdin: %s.", EE(e))
+    def __stop_frame_reader(self):
+        """Stops reading of MPlayer's yuv4mpeg output and removes the FIFO."""
 
-        try:
-            start_time = time.time()
+        self.__y4m_reader.stop()
 
-            while time.time() - start_time < 1:
-                try:
-                    os.kill(pid, signal.SIGTERM)
-                except EnvironmentError as e:
-                    if e.errno == errno.ESRCH:
-                        break
-                    else:
-                        raise
-
-                time.sleep(0.1)
+        if not self.__y4m_reader.opened():
+            # The reader may be blocked on the FIFO opening waiting for
+            # MPlayer, so open it for writing to wake the reader up.
+            try:
+                fd = os.open(self.__fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+            except EnvironmentError:
+                pass
             else:
-                LOG.debug(u"Killing the MPlayer process %s by SIGKILL...", pid)
+                os.close(fd)
 
-                try:
-                    os.kill(pid, signal.SIGKILL)
-                except EnvironmentError as e:
-                    if e.errno != errno.ESRCH:
-                        raise
-        except Exception as e:
-            LOG.error(u"Unable to kill the MPlayer process %s: %s.", pid, EE(e))
+        try:
+            os.unlink(self.__fifo_path)
+        except EnvironmentError as e:
+            LOG.error(u"Unable to delete the FIFO '%s': %s.", self.__fifo_path, EE(e))
+
+        self.__y4m_reader = None
+        self.__fifo_path = None
 
 
 
@@ -506,11 +1614,23 @@ class Movie:
     __height = None
     """The movie height."""
 
+    __length = None
+    """The movie length in milliseconds."""
 
-    def __init__(self, path, width, height):
+    __fps = None
+    """The movie frame rate (None if it's unknown)."""
+
+    __audio_tracks = None
+    """IDs of the movie's audio tracks (None if they are unknown)."""
+
+
+    def __init__(self, path, width, height, length, fps = None, audio_tracks = None):
         self.__path = path
         self.__width = width
         self.__height = height
+        self.__length = length
+        self.__fps = fps
+        self.__audio_tracks = audio_tracks
 
 
     def get_aspect_ratio(self):
@@ -519,12 +1639,36 @@ class Movie:
         return float(self.__width) / self.__height
 
 
+    def get_audio_tracks(self):
+        """Returns a list of the movie's audio track IDs or None if they are unknown."""
+
+        return self.__audio_tracks
+
+
+    def get_fps(self):
+        """Returns the movie frame rate or None if it's unknown."""
+
+        return self.__fps
+
+
     def get_height(self):
         """Returns the movie height."""
 
         return self.__height
 
 
+    def get_length(self):
+        """Returns the movie length in milliseconds."""
+
+        return self.__length
+
+
+    def get_path(self):
+        """Returns path to the movie."""
+
+        return self.__path
+
+
     def get_width(self):
         """Returns the movie width."""
 
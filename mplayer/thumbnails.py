@@ -0,0 +1,363 @@
+"""Provides background generation of movie thumbnails for seek previews."""
+
+import ctypes
+import errno
+import logging
+import os
+import platform
+import Queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import subprocess32 as subprocess
+except ImportError:
+    import subprocess
+
+from PySide import QtCore
+
+from pycl.core import EE, Error
+
+from mplayer.metadata import file_identity
+from mplayer.process import terminate_process
+
+try:
+    libc = ctypes.CDLL("libc.so.6", use_errno = True)
+except OSError:
+    libc = None
+
+LOG = logging.getLogger("mplayer.thumbnails")
+
+
+THUMBNAIL_INTERVAL = 60
+"""Interval in seconds between movie positions for which we make thumbnails."""
+
+THUMBNAIL_WIDTH = 160
+"""Thumbnail width (the height is calculated from the movie aspect ratio)."""
+
+MAX_WORKERS = 2
+"""Maximum number of MPlayer processes which make thumbnails simultaneously."""
+
+MAX_CACHE_SIZE = 100 * 1024 * 1024
+"""Maximum size of the thumbnail cache in bytes."""
+
+IDLE_NICENESS = 19
+"""Niceness of the thumbnail making processes."""
+
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+"""ioprio_set() constants."""
+
+_IOPRIO_SET_SYSCALLS = { "x86_64": 251, "i386": 289, "i686": 289, "armv7l": 314, "aarch64": 30 }
+"""ioprio_set() system call numbers (glibc doesn't provide a wrapper for it)."""
+
+_LENGTH_RE = re.compile(r"^ID_LENGTH=(\d+(?:\.\d+)?)$", re.MULTILINE)
+"""Matches movie length in MPlayer's -identify output."""
+
+
+def _lower_priority():
+    """Lowers priority of a thumbnail making process (called after fork())."""
+
+    os.nice(IDLE_NICENESS)
+
+    # The niceness affects only CPU scheduling, but the process mostly reads
+    # the movie, so it also gets I/O time only when nobody else needs it (if
+    # the system call fails, the process just runs with the default I/O
+    # priority).
+    syscall = _IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if libc is not None and syscall is not None:
+        libc.syscall(syscall, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT)
+
+
+class ThumbnailGenerator(QtCore.QObject):
+    """
+    Makes thumbnails of a movie in background with THUMBNAIL_INTERVAL step
+    using a pool of MPlayer processes and stores them in a size-bounded
+    on-disk cache.
+    """
+
+    thumbnail_ready = QtCore.Signal(int)
+    """
+    Emitted (possibly from another thread) with a movie position in
+    milliseconds when a thumbnail for it becomes available.
+    """
+
+
+    __mplayer_path = None
+    """Path to MPlayer's binary."""
+
+    __cache_dir = None
+    """Directory with cached thumbnails."""
+
+    __lock = None
+    """Lock for the generator's state."""
+
+    __generation = 0
+    """Number of the current generation job (used for cancelling of old jobs)."""
+
+    __thumbnails = None
+    """Available thumbnails of the current movie: position -> path."""
+
+    __queue = None
+    """Queue of thumbnail making jobs."""
+
+    __workers = None
+    """Thumbnail making threads."""
+
+    __processes = None
+    """Running MPlayer processes of the current job."""
+
+
+    def __init__(self, mplayer_path, cache_dir, parent = None):
+        super(ThumbnailGenerator, self).__init__(parent)
+
+        self.__mplayer_path = mplayer_path
+        self.__cache_dir = cache_dir
+        self.__lock = threading.Lock()
+        self.__thumbnails = {}
+        self.__queue = Queue.Queue()
+        self.__workers = []
+        self.__processes = set()
+
+
+    def generate(self, movie_path):
+        """Starts making thumbnails for the movie cancelling the previous job."""
+
+        with self.__lock:
+            self.__generation += 1
+            generation = self.__generation
+            self.__thumbnails = {}
+
+        self.__terminate_processes()
+
+        planner = threading.Thread(name = "Thumbnail planner",
+            target = self.__plan, args = (generation, movie_path))
+        planner.daemon = True
+        planner.start()
+
+        while len(self.__workers) < MAX_WORKERS:
+            worker = threading.Thread(name = "Thumbnail maker", target = self.__work)
+            worker.daemon = True
+            worker.start()
+            self.__workers.append(worker)
+
+
+    def get_thumbnail(self, pos):
+        """
+        Returns path to the thumbnail which is the nearest to the position (in
+        milliseconds) or None if there is no thumbnail yet.
+        """
+
+        with self.__lock:
+            if not self.__thumbnails:
+                return None
+
+            nearest = min(self.__thumbnails, key = lambda thumbnail_pos: abs(thumbnail_pos - pos))
+            return self.__thumbnails[nearest]
+
+
+    def stop(self):
+        """Cancels the current job."""
+
+        with self.__lock:
+            self.__generation += 1
+            self.__thumbnails = {}
+
+        self.__terminate_processes()
+
+
+    def __cancelled(self, generation):
+        """Returns True if the job has been cancelled."""
+
+        return generation != self.__generation
+
+
+    def __get_length(self, generation, movie_path):
+        """Returns the movie length in seconds."""
+
+        output = self.__run_mplayer(generation, [
+            self.__mplayer_path, "-noconfig", "all", "-identify", "-frames", "0",
+            "-vo", "null", "-ao", "null", movie_path
+        ], output = True)
+
+        length = _LENGTH_RE.search(output)
+        if length is None:
+            raise Error("MPlayer doesn't report the movie length.")
+
+        return float(length.group(1))
+
+
+    def __limit_cache_size(self, current_dir):
+        """Removes the least recently used movies' thumbnails if the cache is too big."""
+
+        movies = []
+        cache_size = 0
+
+        for dir_name in os.listdir(self.__cache_dir):
+            dir_path = os.path.join(self.__cache_dir, dir_name)
+            if dir_path == current_dir:
+                continue
+
+            try:
+                dir_size = sum(os.path.getsize(os.path.join(dir_path, file_name))
+                    for file_name in os.listdir(dir_path))
+                movies.append(( os.path.getmtime(dir_path), dir_size, dir_path ))
+            except EnvironmentError as e:
+                LOG.debug(u"Unable to get size of thumbnail directory '%s': %s.", dir_path, EE(e))
+                continue
+
+            cache_size += dir_size
+
+        movies.sort()
+
+        for access_time, dir_size, dir_path in movies:
+            if cache_size <= MAX_CACHE_SIZE:
+                break
+
+            LOG.debug(u"Removing thumbnails '%s' from the cache.", dir_path)
+            shutil.rmtree(dir_path, ignore_errors = True)
+            cache_size -= dir_size
+
+
+    def __make_thumbnail(self, generation, movie_path, pos, thumbnail_path):
+        """Makes a thumbnail of the movie at the position (in seconds)."""
+
+        temp_dir = tempfile.mkdtemp(prefix = "pytee-thumbnail-")
+
+        try:
+            self.__run_mplayer(generation, [
+                self.__mplayer_path, "-noconfig", "all", "-really-quiet",
+                "-nosound", "-nosub", "-noautosub",
+                "-ss", str(pos), "-frames", "1",
+                "-vf", "scale={0}:-2".format(THUMBNAIL_WIDTH),
+                "-vo", "jpeg:quality=80:outdir=" + temp_dir,
+                movie_path
+            ])
+
+            if self.__cancelled(generation):
+                return
+
+            images = sorted(os.listdir(temp_dir))
+            if not images:
+                raise Error("MPlayer hasn't made any image.")
+
+            # The cache may be on another file system
+            shutil.copyfile(os.path.join(temp_dir, images[-1]), thumbnail_path + ".tmp")
+            os.rename(thumbnail_path + ".tmp", thumbnail_path)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors = True)
+
+
+    def __plan(self, generation, movie_path):
+        """Finds out which thumbnails need to be made and queues them."""
+
+        try:
+            movie_dir = os.path.join(self.__cache_dir, file_identity(movie_path))
+
+            try:
+                os.makedirs(movie_dir)
+            except EnvironmentError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+            # Marking the movie as recently used
+            os.utime(movie_dir, None)
+            self.__limit_cache_size(movie_dir)
+
+            length = self.__get_length(generation, movie_path)
+            start_time = time.time()
+            positions = range(THUMBNAIL_INTERVAL // 2, int(length), THUMBNAIL_INTERVAL)
+
+            for pos in positions:
+                if self.__cancelled(generation):
+                    return
+
+                thumbnail_path = os.path.join(movie_dir, "{0}.jpg".format(pos))
+
+                if os.path.exists(thumbnail_path):
+                    self.__thumbnail_made(generation, pos, thumbnail_path)
+                else:
+                    self.__queue.put(( generation, movie_path, pos, thumbnail_path, start_time ))
+        except Exception as e:
+            # The job's MPlayer processes are terminated on cancelling
+            if not self.__cancelled(generation):
+                LOG.error(u"%s", Error("Unable to make thumbnails for '{0}':", movie_path).append(e))
+
+
+    def __run_mplayer(self, generation, args, output = False):
+        """
+        Runs MPlayer for the job and waits for its termination. Returns its
+        output if output is True.
+
+        The process is terminated as soon as the job is cancelled.
+        """
+
+        with open(os.devnull, "r+") as devnull:
+            process = subprocess.Popen(args, stdin = devnull, stdout = subprocess.PIPE if output else devnull,
+                stderr = devnull, close_fds = True, preexec_fn = _lower_priority)
+
+        with self.__lock:
+            cancelled = self.__cancelled(generation)
+            if not cancelled:
+                self.__processes.add(process)
+
+        # The job has been cancelled before we registered the process
+        if cancelled:
+            process.terminate()
+
+        try:
+            return process.communicate()[0]
+        finally:
+            with self.__lock:
+                self.__processes.discard(process)
+
+
+    def __terminate_processes(self):
+        """Terminates MPlayer processes of the cancelled job."""
+
+        with self.__lock:
+            processes = list(self.__processes)
+            self.__processes.clear()
+
+        for process in processes:
+            # The process' output is being read by its job's thread
+            terminate_process(process, close_stdout = False)
+
+
+    def __thumbnail_made(self, generation, pos, thumbnail_path):
+        """Registers a made thumbnail."""
+
+        with self.__lock:
+            if self.__cancelled(generation):
+                return
+
+            self.__thumbnails[pos * 1000] = thumbnail_path
+
+        self.thumbnail_ready.emit(pos * 1000)
+
+
+    def __work(self):
+        """The thumbnail making threads' main function."""
+
+        while True:
+            generation, movie_path, pos, thumbnail_path, start_time = self.__queue.get()
+
+            if self.__cancelled(generation):
+                continue
+
+            try:
+                self.__make_thumbnail(generation, movie_path, pos, thumbnail_path)
+            except Exception as e:
+                if not self.__cancelled(generation):
+                    LOG.error(u"%s", Error("Unable to make a thumbnail for '{0}' at {1}:", movie_path, pos).append(e))
+                continue
+
+            self.__thumbnail_made(generation, pos, thumbnail_path)
+
+            if self.__queue.empty() and not self.__cancelled(generation):
+                LOG.debug(u"Thumbnails for '%s' have been made in %.1f seconds.",
+                    movie_path, time.time() - start_time)
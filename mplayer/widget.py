@@ -1,6 +1,7 @@
 """Provides MPlayer Qt widget."""
 
 import logging
+import time
 
 from PySide import QtCore, QtGui
 
@@ -9,11 +10,106 @@ from pycl.core import EE, Error
 import pycl.gui.messages
 import pycl.main
 
+from mplayer.mpv import Mpv
 from mplayer.process import MPlayer
 
 LOG = logging.getLogger("mplayer.widget")
 
 
+BACKEND_MPLAYER = "mplayer"
+"""MPlayer backend."""
+
+BACKEND_MPV = "mpv"
+"""mpv backend (controlled via JSON IPC)."""
+
+
+MAX_WARM_ALTERNATIVES = 2
+"""Maximum number of alternative movies which MPlayer instances are kept running."""
+
+PRESPAWN_DELAY = 5
+"""
+Time in seconds after the main movie start after which we start the most
+likely next alternative movie in background.
+"""
+
+
+DECODER_SCALING_DELAY = 0.5
+"""
+Time in seconds after the last resize event after which we ask MPlayer to
+scale the video to the new display size.
+"""
+
+DECODER_SCALING_TOLERANCE = 0.25
+"""
+Maximum relative difference between the display size and the size of the
+image which MPlayer outputs that doesn't require MPlayer restarting.
+"""
+
+
+DEFAULT_FPS = 24
+"""Frame rate which is assumed for movies with unknown frame rate."""
+
+MAX_REDRAW_FPS = 60
+"""Maximum frequency of movie image redrawing."""
+
+PAINT_STATS_INTERVAL = 10
+"""Interval in seconds with which we log movie painting statistics."""
+
+
+SHADOW_INTERVAL = 10
+"""
+Interval in seconds with which we pre-position one of warm alternative movies
+near the main movie's position.
+"""
+
+SHADOW_MIN_DISTANCE = 10000
+"""
+Minimum distance in milliseconds between the main movie's position and a warm
+alternative movie's position that makes us to pre-position it.
+"""
+
+SHADOW_SUSPEND_DELAY = 3
+"""
+Time in seconds which we give to an alternative movie's MPlayer to seek to
+the new position before suspending it again.
+"""
+
+
+SHARED_DECODER_LENGTH_TOLERANCE = 2000
+"""
+Maximum difference in milliseconds between lengths of the main movie and an
+alternative movie that allows to play the alternative movie in shared-decoder
+mode.
+"""
+
+SHARED_DECODER_SYNC_INTERVAL = 1
+"""
+Interval in seconds with which we check synchronization of the main movie and
+an audio-only alternative movie.
+"""
+
+SHARED_DECODER_SYNC_TOLERANCE = 40
+"""
+Drift in milliseconds between the main movie and an audio-only alternative
+movie which isn't noticeable (so it isn't corrected).
+"""
+
+SHARED_DECODER_SPEED_CORRECTION = 0.02
+"""
+Relative change of the audio-only alternative movie's playback speed which
+we use to catch up with the main movie. The pitch is preserved, so such a
+change isn't audible, and a 200 ms drift is corrected in 10 seconds.
+"""
+
+SHARED_DECODER_MAX_DRIFT = 1000
+"""
+Maximum drift in milliseconds between the main movie and an audio-only
+alternative movie which is corrected by the speed change. A bigger drift
+(it's possible only after a stall of one of the players) is corrected by
+seeking.
+"""
+
+
 PLAYER_STATE_CLOSED = "closed"
 """No movie is opened now."""
 
@@ -70,15 +166,48 @@ class MPlayerWidget(QtGui.QWidget):
     """
 
 
+    __backend = BACKEND_MPLAYER
+    """Player backend."""
+
+    __mplayer_path = None
+    """Path to the player's binary."""
+
     __movie_path = None
     """Path to the playing movie."""
 
+    __shared_decoder = False
+    """
+    Are alternative movies with the same length as the main movie played as
+    audio tracks for the main movie's video (shared-decoder mode)?
+    """
+
+    __status_line = False
+    """Run MPlayer instances in status line mode."""
+
+    __last_sync_time = 0
+    """
+    Time of the last synchronization check of the main movie and an audio-only
+    alternative movie.
+    """
+
     __state = PLAYER_STATE_CLOSED
     """Current state name."""
 
 
+    __movie_paths = None
+    """Paths to the main movie and all alternative movies."""
+
     __players = None
-    """Running MPlayer instances."""
+    """
+    MPlayer instances for each movie from __movie_paths (None for alternative
+    movies that haven't been started yet).
+    """
+
+    __warm_players = None
+    """
+    MPlayer instances of alternative movies ordered by the time of their last
+    use (most recently used first).
+    """
 
     __cur_id = None
     """Index of currently active MPlayer instance."""
@@ -89,9 +218,72 @@ class MPlayerWidget(QtGui.QWidget):
     __display_widgets = None
     """Widgets that display the video."""
 
+    __frame_reader = False
+    """Is MPlayer's video output read and painted by us on Linux?"""
+
+    __decoder_scaling = False
+    """Does MPlayer scale the video to the display size while decoding?"""
+
+    __metadata_cache = None
+    """Persistent cache of movies' metadata (None if it's disabled)."""
+
+    __pending_seek = None
+    """
+    Position to seek to (or -1 to just unpause) when the active movie's
+    MPlayer instance starts.
+    """
+
+    __main_pos = None
+    """Last known position of the main movie."""
+
+    __shadow_positions = None
+    """Positions to which warm alternative movies have been pre-positioned."""
+
+    __restored_settings = None
+    """
+    Settings of restarted players' previous instances which are applied when
+    the players start: player -> (volume, muted, OSD displaying).
+    """
+
+    __switch_time = None
+    """Time when we started switching to the active movie."""
+
 
     __redraw_timer = None
-    """Timer for movie image redrawing."""
+    """
+    Timer for movie image redrawing. It ticks with the movie's frame rate and
+    only when the movie is playing, visible and its player doesn't notify us
+    about new frames itself.
+    """
+
+    __frame_signature = None
+    """Signature of the last drawn movie image."""
+
+    __paint_time = 0
+    """Time spent for movie painting since __paint_stats_time."""
+
+    __paint_stats_time = None
+    """Time when we started to collect movie painting statistics."""
+
+    __update_timer = None
+    """
+    Timer for updating current position of the active movie.
+
+    This is the only place where we poll MPlayer instances, so players of
+    inactive movies don't receive any requests.
+    """
+
+    __prespawn_timer = None
+    """Timer for starting the most likely next alternative movie."""
+
+    __shadow_timer = None
+    """Timer for pre-positioning of warm alternative movies."""
+
+    __rescale_timer = None
+    """Timer for debouncing of video rescaling on widget resizing."""
+
+    __rescale_size = None
+    """Widget size at the last tick of the rescale timer."""
 
 
     def __init__(self, parent = None):
@@ -102,9 +294,26 @@ class MPlayerWidget(QtGui.QWidget):
         self.setPalette(palette)
         self.setAutoFillBackground(True)
 
+        self.__movie_paths = []
         self.__players = []
-        if not pycl.main.is_osx():
-            self.__display_widgets = []
+        self.__warm_players = []
+        self.__display_widgets = []
+
+        self.__update_timer = QtCore.QTimer(self)
+        self.__update_timer.timeout.connect(self._update)
+
+        self.__prespawn_timer = QtCore.QTimer(self)
+        self.__prespawn_timer.setSingleShot(True)
+        self.__prespawn_timer.timeout.connect(self._prespawn)
+
+        self.__shadow_positions = {}
+        self.__restored_settings = {}
+        self.__shadow_timer = QtCore.QTimer(self)
+        self.__shadow_timer.timeout.connect(self._shadow)
+
+        self.__rescale_timer = QtCore.QTimer(self)
+        self.__rescale_timer.setSingleShot(True)
+        self.__rescale_timer.timeout.connect(self._rescale)
 
 
     def __del__(self):
@@ -114,9 +323,30 @@ class MPlayerWidget(QtGui.QWidget):
     def close(self):
         """Closes all opened movies."""
 
+        if self.__update_timer is not None:
+            self.__update_timer.stop()
+
+        if self.__prespawn_timer is not None:
+            self.__prespawn_timer.stop()
+
+        if self.__shadow_timer is not None:
+            self.__shadow_timer.stop()
+
+        if self.__rescale_timer is not None:
+            self.__rescale_timer.stop()
+
         if self.__players is not None:
             for player in self.__players[:]:
-                self.__close_movie(player)
+                if player is not None:
+                    self.__close_movie(player)
+
+            self.__movie_paths = []
+            self.__players = []
+            self.__display_widgets = []
+
+        self.__pending_seek = None
+        self.__main_pos = None
+        self.__switch_time = None
 
         if self.__redraw_timer is not None:
             self.__redraw_timer.stop()
@@ -139,7 +369,7 @@ class MPlayerWidget(QtGui.QWidget):
             state["movie_path"] = self.__movie_path
 
             if self.__state == PLAYER_STATE_OPENED:
-                player = self.__player()
+                player = self.__video_player()
 
                 if player.running():
                     try:
@@ -188,13 +418,52 @@ class MPlayerWidget(QtGui.QWidget):
         self.__switch_to(self.__cur_alt_id)
 
 
-    def open(self, mplayer_path, movie_path, alternatives, last_pos = 0):
-        """Opens a movie and optional alternative movies for playing."""
+    def open(self, mplayer_path, movie_path, alternatives, last_pos = 0,
+        shared_decoder = False, status_line = False, backend = BACKEND_MPLAYER,
+        frame_reader = False, decoder_scaling = False, metadata_cache = None):
+        """Opens a movie and optional alternative movies for playing.
+
+        Only the main movie is started at once. Alternative movies are started
+        on first switching to them (or in background when the main movie is
+        started), and at most MAX_WARM_ALTERNATIVES of them are kept running.
+
+        If shared_decoder is True, alternative movies are played without
+        video, and if their length matches the main movie's length, only their
+        audio is played along with the main movie's video. Alternative movies
+        with other lengths are restarted as usual movies.
+
+        If status_line is True, MPlayer instances are run in status line mode
+        (see MPlayer), so the current position is obtained without polling.
+
+        backend specifies the player backend (BACKEND_*). mplayer_path is a
+        path to the backend's binary.
+
+        If frame_reader is True, on Linux MPlayer writes decoded frames to a
+        yuv4mpeg pipe and the widget paints them itself (as on Mac OS X)
+        instead of letting MPlayer to draw into a display widget.
+
+        If decoder_scaling is True and we paint the movie image ourselves,
+        MPlayer scales the video to the display size while decoding instead of
+        passing full resolution frames to us. When the widget is resized, the
+        active movie's MPlayer is restarted with the new size if it differs
+        significantly from the current one.
+
+        metadata_cache is an optional MetadataCache which allows to start
+        movies that have been opened before without waiting for the player
+        to report their properties.
+        """
 
         self.close()
 
         try:
+            self.__backend = backend
+            self.__frame_reader = frame_reader
+            self.__decoder_scaling = decoder_scaling
+            self.__metadata_cache = metadata_cache
+            self.__mplayer_path = mplayer_path
             self.__movie_path = movie_path
+            self.__shared_decoder = shared_decoder
+            self.__status_line = status_line
             self.__state = PLAYER_STATE_OPENING
 
             # Rewind a few seconds back
@@ -203,42 +472,22 @@ class MPlayerWidget(QtGui.QWidget):
             self.__cur_id = 0
             self.__cur_alt_id = int(bool(len(alternatives)))
 
-            for movie_id, movie_path in enumerate([ movie_path ] + alternatives):
-                player = MPlayer(mplayer_path)
+            try:
+                player, display_widget = self.__start_player(movie_path, last_pos, False, True)
+            except Exception as e:
+                raise Error(self.tr("Unable to play '{0}':"), movie_path).append(e)
 
-                player.failed.connect(self._mplayer_failed)
-                player.started.connect(self._mplayer_started)
-                player.pos_changed.connect(self._pos_changed)
-                player.terminated.connect(self._mplayer_terminated, QtCore.Qt.QueuedConnection)
+            self.__movie_paths = [ movie_path ] + alternatives
+            self.__players = [ player ] + [ None ] * len(alternatives)
+            self.__display_widgets = [ display_widget ] + [ None ] * len(alternatives)
 
-                if pycl.main.is_osx():
-                    display_widget = None
-                else:
-                    display_widget = QtGui.QWidget(self)
-                    display_widget.setVisible(False)
-
-                try:
-                    player.run(movie_path, last_pos * (movie_id == 0),
-                        bool(movie_id), display_widget)
-                except Exception as e:
-                    if display_widget is not None:
-                        display_widget.setParent(None)
-
-                    if movie_id:
-                        pycl.gui.messages.warning(self,
-                            self.tr("Unable to play the movie."),
-                            Error(self.tr("Unable to play '{0}':"), movie_path).append(EE(e)), block = False)
-                    else:
-                        raise Error(self.tr("Unable to play '{0}':"), movie_path).append(e)
-                else:
-                    if display_widget is not None:
-                        self.__display_widgets.append(display_widget)
-                    self.__players.append(player)
+            self.__update_timer.start(100)
+            self.__shadow_timer.start(SHADOW_INTERVAL * 1000)
 
-            if pycl.main.is_osx():
+            if self.__paints_movie_image():
+                self.__frame_signature = None
                 self.__redraw_timer = QtCore.QTimer(self)
-                self.__redraw_timer.timeout.connect(self.repaint)
-                self.__redraw_timer.start(1000 / 24)
+                self.__redraw_timer.timeout.connect(self._redraw)
         except:
             self.close()
             raise
@@ -254,30 +503,37 @@ class MPlayerWidget(QtGui.QWidget):
     def osd_toggle(self):
         """Toggles the OSD displaying."""
 
-        self.__player().osd_toggle()
+        self.__video_player().osd_toggle()
 
 
     @_movie_control
     def pause(self):
         """Pauses the movie playing."""
 
-        self.__player().pause()
+        for player in self.__active_players():
+            player.pause()
 
 
-    if pycl.main.is_osx():
-        def paintEvent(self, event):
-            """Qt's paintEvent handler."""
+    def paintEvent(self, event):
+        """Qt's paintEvent handler."""
 
-            if self.opened() and self.__player().running():
-                x, y, width, height = self.__get_display_dimensions(
-                    self.__player().get_movie().get_aspect_ratio())
+        if self.opened() and self.__paints_movie_image() and self.__video_player().running():
+            start_time = time.time()
 
-                painter = QtGui.QPainter(self)
-                painter.drawImage(QtCore.QRectF(x, y, width, height),
-                    self.__player().get_movie_image().scaled(
-                        width, height, QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation))
-            else:
-                super(MPlayerWidget, self).paintEvent(event)
+            player = self.__video_player()
+            x, y, width, height = self.__get_display_dimensions(
+                player.get_movie().get_aspect_ratio())
+
+            # Scaling the image right into the target rectangle without
+            # intermediate copies.
+            painter = QtGui.QPainter(self)
+            painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+            painter.drawImage(QtCore.QRectF(x, y, width, height), player.get_movie_image())
+            painter.end()
+
+            self.__update_paint_stats(time.time() - start_time)
+        else:
+            super(MPlayerWidget, self).paintEvent(event)
 
 
     @_player_control
@@ -291,21 +547,30 @@ class MPlayerWidget(QtGui.QWidget):
         self.__switch_to(self.__cur_alt_id)
 
 
-    if not pycl.main.is_osx():
-        def resizeEvent(self, event):
-            """QWidget's resize event handler."""
+    def resizeEvent(self, event):
+        """QWidget's resize event handler."""
 
-            for player in self.__players:
-                if player.running():
-                    self.__scale_display_widget(self.__display_widget(player),
-                        player.get_movie().get_aspect_ratio())
+        if self.__paints_movie_image():
+            # The timer isn't restarted on every resize event, so during
+            # window dragging it ticks and checks whether the size has settled.
+            if self.__decoder_scaling and self.opened() and not self.__rescale_timer.isActive():
+                self.__rescale_timer.start(DECODER_SCALING_DELAY * 1000)
+            return
+
+        for player in self.__players:
+            if player is not None and player.running() and player.has_video():
+                self.__scale_display_widget(self.__display_widget(player),
+                    player.get_movie().get_aspect_ratio())
 
 
     @_movie_control
     def seek(self, seconds):
         """Seeks for specified number of seconds."""
 
-        self.__player().seek(seconds)
+        # An audio-only alternative movie will be synchronized with the main
+        # movie by the next _update() call.
+        for player in self.__active_players():
+            player.seek(seconds)
 
 
     @_player_control
@@ -328,10 +593,22 @@ class MPlayerWidget(QtGui.QWidget):
         self.__player().volume(value)
 
 
+    def _frame_ready(self):
+        """Called when a player has a new movie image."""
+
+        if self.opened() and self.sender() is self.__video_player() and self.__movie_visible():
+            self.update()
+
+
     def _mplayer_failed(self, error):
         """Called when MPlayer failed to open a movie."""
 
+        # The sender is None if the player has been destroyed after its
+        # eviction and None is in the list as a placeholder of unstarted
+        # players.
         player = self.sender()
+        if player is None or player not in self.__players:
+            return
 
         if self.__is_main_movie(player):
             self.close()
@@ -340,34 +617,70 @@ class MPlayerWidget(QtGui.QWidget):
         else:
             if self.__player() is player:
                 self.__switch_to(0)
-            self.__close_movie(player)
+            self.__remove_movie(self.__players.index(player))
 
 
     def _mplayer_started(self):
         """Called when MPlayer successfully started."""
 
+        # The player may be already destroyed after its eviction
         player = self.sender()
+        if player is None:
+            return
+
+        if self.__shared_decoder:
+            if self.__is_main_movie(player):
+                for alternative in self.__players[1:]:
+                    if alternative is not None:
+                        self.__check_shared_decoder(alternative)
+            elif not self.__check_shared_decoder(player):
+                return
+
+        settings = self.__restored_settings.pop(player, None)
+        if settings is not None:
+            self.__restore_settings(player, *settings)
 
-        if not pycl.main.is_osx():
+        if not self.__paints_movie_image() and player.has_video():
             display_widget = self.__display_widget(player)
             self.__scale_display_widget(display_widget,
                 player.get_movie().get_aspect_ratio())
 
-            if self.__player() is player:
+            if self.__video_player() is player:
                 display_widget.setVisible(True)
 
+        if player not in self.__active_players():
+            self.__suspend(player)
+        elif self.__is_main_movie(player) and player is not self.__player():
+            # The main movie's MPlayer has been restarted while an audio-only
+            # alternative movie is playing.
+            player.mute(True)
+        elif player is self.__player() and self.__pending_seek is not None:
+            try:
+                if self.__pending_seek < 0:
+                    player.pause()
+                else:
+                    player.seek(float(self.__pending_seek) / 1000, True)
+            except Exception as e:
+                LOG.debug(u"Unable to continue playing of the target movie. %s", EE(e))
+            finally:
+                self.__pending_seek = None
+
         if self.__is_main_movie(player):
             self.__state = PLAYER_STATE_OPENED
+            self.__prespawn_timer.start(PRESPAWN_DELAY * 1000)
 
 
     def _mplayer_terminated(self):
         """Called on MPlayer termination."""
 
+        # The sender is None if the player has been destroyed after its
+        # eviction and None is in the list as a placeholder of unstarted
+        # players.
         player = self.sender()
-        if player not in self.__players:
+        if player is None or player not in self.__players:
             return
 
-        if not pycl.main.is_osx():
+        if not self.__paints_movie_image():
             self.__display_widget(player).setVisible(False)
 
         if self.__is_main_movie(player):
@@ -375,14 +688,194 @@ class MPlayerWidget(QtGui.QWidget):
             self.finished.emit()
 
 
-    def _pos_changed(self, pos):
+    def _prespawn(self):
+        """
+        Starts the most likely next alternative movie in background when the
+        main movie is started.
+        """
+
+        if (
+            self.__state == PLAYER_STATE_OPENED and self.__cur_alt_id and
+            self.__players[self.__cur_alt_id] is None
+        ):
+            LOG.debug(u"Starting the alternative movie %s in background.", self.__cur_alt_id)
+            self.__start_alternative(self.__cur_alt_id)
+
+
+    def _redraw(self):
+        """Called by timer to redraw the movie image if it has changed."""
+
+        if not self.opened():
+            return
+
+        player = self.__video_player()
+        signature = None
+
+        try:
+            if player.running():
+                signature = player.get_frame_signature()
+        except Exception as e:
+            LOG.debug(u"Unable to get the movie image signature. %s", EE(e))
+
+        # Redraw unconditionally if signature is not available
+        if signature is None or signature != self.__frame_signature:
+            self.__frame_signature = signature
+            self.update()
+
+
+    def _rescale(self):
         """
-        Emitted with time in milliseconds when current time position in playing
-        movie changes.
+        Called by timer when the widget resizing finishes to make MPlayer
+        output the video of the new display size.
         """
 
-        if self.sender() is self.__player() and self.__is_main_movie():
-            self.pos_changed.emit(pos)
+        if not self.opened():
+            return
+
+        # Waiting until the widget isn't resized during the whole delay
+        if self.size() != self.__rescale_size:
+            self.__rescale_size = self.size()
+            self.__rescale_timer.start(DECODER_SCALING_DELAY * 1000)
+            return
+
+        self.__rescale_size = None
+
+        player = self.__video_player()
+
+        try:
+            if not player.running() or not player.has_video():
+                return
+
+            image_size = player.get_image_size()
+            if image_size is None:
+                return
+
+            x, y, width, height = self.__get_display_dimensions(
+                player.get_movie().get_aspect_ratio())
+        except Exception as e:
+            LOG.debug(u"Unable to get the movie image size. %s", EE(e))
+            return
+
+        if (
+            abs(width - image_size[0]) <= image_size[0] * DECODER_SCALING_TOLERANCE and
+            abs(height - image_size[1]) <= image_size[1] * DECODER_SCALING_TOLERANCE
+        ):
+            return
+
+        LOG.debug(u"Rescaling the video from %sx%s to %sx%s.", image_size[0], image_size[1], width, height)
+        self.__restart_player(player)
+
+
+    def _shadow(self):
+        """
+        Pre-positions one of warm alternative movies near the main movie's
+        position, so switching to it won't require a long seek.
+        """
+
+        if not self.opened() or self.__cur_id or self.__main_pos is None:
+            return
+
+        for player in reversed(self.__warm_players):
+            if not player.running():
+                continue
+
+            shadow_pos = self.__shadow_positions.get(player)
+            if shadow_pos is not None and abs(shadow_pos - self.__main_pos) < SHADOW_MIN_DISTANCE:
+                continue
+
+            LOG.debug(u"Pre-positioning alternative movie '%s' to %s.",
+                player.get_movie(), self.__main_pos)
+
+            try:
+                player.resume()
+                player.seek(float(self.__main_pos) / 1000, True, keep_paused = True)
+            except Exception as e:
+                LOG.debug(u"Unable to pre-position alternative movie. %s", EE(e))
+            else:
+                self.__shadow_positions[player] = self.__main_pos
+
+            QtCore.QTimer.singleShot(SHADOW_SUSPEND_DELAY * 1000,
+                lambda: self.__suspend_inactive(player))
+
+            break
+
+
+    def _update(self):
+        """Called by timer to update current position of the active movie."""
+
+        if not self.opened():
+            return
+
+        player = self.__video_player()
+
+        try:
+            if player.running():
+                pos = player.cur_pos()
+
+                if self.__switch_time is not None and self.__player().running():
+                    LOG.debug(u"Switched to the movie %s in %.3f seconds.",
+                        self.__cur_id, time.time() - self.__switch_time)
+                    self.__switch_time = None
+
+                if self.__is_main_movie(player):
+                    self.__main_pos = pos
+                    self.pos_changed.emit(pos)
+
+                if self.__player() is not player:
+                    self.__sync_audio_player(pos)
+        except Exception as e:
+            if player.running():
+                LOG.exception(u"MPlayer current status update failed. %s", e)
+
+        self.__schedule_redraw()
+
+
+    def __active_players(self):
+        """
+        Returns a list of players that are playing the active movie: the
+        video player and the audio-only player if it's in use.
+        """
+
+        if self.__video_player() is self.__player():
+            return [ self.__player() ]
+        else:
+            return [ self.__video_player(), self.__player() ]
+
+
+    def __check_shared_decoder(self, player):
+        """
+        Checks whether an alternative movie can be played in shared-decoder
+        mode and restarts it as a usual movie if not.
+
+        Returns False if the player has been restarted.
+        """
+
+        main_player = self.__players[0]
+
+        if (
+            player.has_video() or not player.running() or
+            player is main_player or not main_player.running()
+        ):
+            return True
+
+        main_length = main_player.get_movie().get_length()
+        length = player.get_movie().get_length()
+
+        if abs(main_length - length) <= SHARED_DECODER_LENGTH_TOLERANCE:
+            LOG.debug(u"Playing '%s' in shared-decoder mode.", player.get_movie())
+            return True
+
+        LOG.debug(u"'%s' has length %s which differs from the main movie's length %s. "
+            "Restarting it as a usual movie.", player.get_movie(), length, main_length)
+
+        if self.__player() is player:
+            self.__switch_to(0)
+
+        movie_id = self.__players.index(player)
+        self.__close_movie(player)
+        self.__start_alternative(movie_id, video = True)
+
+        return False
 
 
     def __close_movie(self, player):
@@ -391,11 +884,16 @@ class MPlayerWidget(QtGui.QWidget):
         movie_id = self.__players.index(player)
 
         player.terminate()
-        del self.__players[movie_id]
+        self.__players[movie_id] = None
+        self.__shadow_positions.pop(player, None)
+        self.__restored_settings.pop(player, None)
+
+        if player in self.__warm_players:
+            self.__warm_players.remove(player)
 
-        if not pycl.main.is_osx():
+        if self.__display_widgets[movie_id] is not None:
             self.__display_widgets[movie_id].setParent(None)
-            del self.__display_widgets[movie_id]
+            self.__display_widgets[movie_id] = None
 
 
     def __get_display_dimensions(self, aspect_ratio):
@@ -426,14 +924,13 @@ class MPlayerWidget(QtGui.QWidget):
             return player is self.__players[0]
 
 
-    if not pycl.main.is_osx():
-        def __display_widget(self, player = None):
-            """Returns a display widget corresponding to the player."""
+    def __display_widget(self, player = None):
+        """Returns a display widget corresponding to the player."""
 
-            if player is None:
-                player = self.__player()
+        if player is None:
+            player = self.__video_player()
 
-            return self.__display_widgets[self.__players.index(player)]
+        return self.__display_widgets[self.__players.index(player)]
 
 
     def __player(self):
@@ -442,13 +939,251 @@ class MPlayerWidget(QtGui.QWidget):
         return self.__players[self.__cur_id]
 
 
-    if not pycl.main.is_osx():
-        def __scale_display_widget(self, widget, aspect_ratio):
-            """Scales the display widget according to the movies aspect ratio."""
+    def __player_spawned(self, player, future):
+        """Called when spawning of a player's process finishes."""
+
+        # Spawning errors are reported by the player's failed signal
+        if player not in self.__players:
+            return
+
+        try:
+            future.result()
+        except Exception:
+            return
+
+        if player is self.__player() and self.__switch_time is not None:
+            LOG.debug(u"The target movie's player process has been spawned in %.3f seconds.",
+                time.time() - self.__switch_time)
+
+
+    def __remove_movie(self, movie_id):
+        """Removes an alternative movie from the list of available movies."""
+
+        if self.__players[movie_id] is not None:
+            self.__close_movie(self.__players[movie_id])
+
+        del self.__movie_paths[movie_id]
+        del self.__players[movie_id]
+        del self.__display_widgets[movie_id]
+
+        if self.__cur_id > movie_id:
+            self.__cur_id -= 1
 
-            x, y, display_width, display_height = self.__get_display_dimensions(aspect_ratio)
-            widget.resize(display_width, display_height)
-            widget.move(x, y)
+        if self.__cur_alt_id > movie_id:
+            self.__cur_alt_id -= 1
+        self.__cur_alt_id = max(min(1, len(self.__players) - 1),
+            min(self.__cur_alt_id, len(self.__players) - 1))
+
+
+    def __restart_player(self, player):
+        """Restarts a movie's MPlayer instance at its current position."""
+
+        movie_id = self.__players.index(player)
+        movie_path = self.__movie_paths[movie_id]
+
+        try:
+            cur_pos = player.cur_pos()
+            paused = player.paused()
+        except Exception as e:
+            LOG.debug(u"Unable to get movie's current position. %s", EE(e))
+            return
+
+        # The new instance starts with the default settings
+        try:
+            volume = player.get_volume()
+        except Exception as e:
+            LOG.debug(u"Unable to get movie's volume. %s", EE(e))
+            volume = None
+
+        settings = ( volume, player.muted(), player.osd_displaying() )
+
+        # Terminating the old instance first to not run two decoders at once
+        self.__close_movie(player)
+
+        try:
+            new_player, display_widget = self.__start_player(movie_path, cur_pos // 1000, paused, True)
+        except Exception as e:
+            error = Error(self.tr("Unable to play '{0}':"), movie_path).append(e)
+            LOG.error(u"%s", error)
+
+            if movie_id:
+                # Removing the alternative movie as if its player has failed
+                self.__players[movie_id] = player
+                if self.__cur_id == movie_id:
+                    self.__switch_to(0)
+                self.__remove_movie(movie_id)
+            else:
+                self.close()
+                self.__state = PLAYER_STATE_FAILED
+                self.failed.emit(EE(error))
+
+            return
+
+        self.__players[movie_id] = new_player
+        self.__display_widgets[movie_id] = display_widget
+        self.__restored_settings[new_player] = settings
+
+        if movie_id:
+            self.__touch(new_player)
+
+
+    def __restore_settings(self, player, volume, muted, osd_displaying):
+        """Applies settings of a restarted player's previous instance."""
+
+        try:
+            if volume is not None:
+                player.volume(volume, True)
+
+            if muted != player.muted():
+                player.mute(muted)
+
+            if osd_displaying != player.osd_displaying():
+                player.osd_toggle()
+        except Exception as e:
+            LOG.debug(u"Unable to restore settings of the restarted movie. %s", EE(e))
+
+
+    def __movie_visible(self):
+        """Returns True if the movie image is visible on the screen."""
+
+        return self.isVisible() and not self.window().isMinimized()
+
+
+    def __paints_movie_image(self):
+        """
+        Returns True if we paint the movie image ourselves instead of letting
+        MPlayer to draw it into a display widget.
+        """
+
+        return pycl.main.is_osx() or self.__frame_reader
+
+
+    def __scale_display_widget(self, widget, aspect_ratio):
+        """Scales the display widget according to the movies aspect ratio."""
+
+        x, y, display_width, display_height = self.__get_display_dimensions(aspect_ratio)
+        widget.resize(display_width, display_height)
+        widget.move(x, y)
+
+
+    def __schedule_redraw(self):
+        """
+        Starts the redraw timer with the video player's movie frame rate or
+        stops it if redrawing is not needed now.
+        """
+
+        if self.__redraw_timer is None:
+            return
+
+        player = self.__video_player()
+        interval = None
+
+        try:
+            if (
+                player.running() and player.has_video() and not player.emits_frame_ready() and
+                not player.paused() and self.__movie_visible()
+            ):
+                fps = min(player.get_movie().get_fps() or DEFAULT_FPS, MAX_REDRAW_FPS)
+                interval = int(1000 / fps)
+        except Exception as e:
+            LOG.debug(u"Unable to get the movie's state. %s", EE(e))
+
+        if interval is None:
+            if self.__redraw_timer.isActive():
+                self.__redraw_timer.stop()
+
+                # Drawing the last frame
+                self.update()
+        elif not self.__redraw_timer.isActive() or self.__redraw_timer.interval() != interval:
+            LOG.debug(u"Redrawing the movie image every %s ms.", interval)
+            self.__redraw_timer.start(interval)
+
+
+    def __start_alternative(self, movie_id, video = None):
+        """Starts MPlayer instance for an alternative movie.
+
+        Returns the player or None if the movie can't be played.
+        """
+
+        if video is None:
+            video = not self.__shared_decoder
+
+        movie_path = self.__movie_paths[movie_id]
+
+        try:
+            player, display_widget = self.__start_player(movie_path, 0, True, video)
+        except Exception as e:
+            pycl.gui.messages.warning(self,
+                self.tr("Unable to play the movie."),
+                Error(self.tr("Unable to play '{0}':"), movie_path).append(EE(e)), block = False)
+            self.__remove_movie(movie_id)
+            return None
+
+        self.__players[movie_id] = player
+        self.__display_widgets[movie_id] = display_widget
+
+        self.__touch(player)
+
+        return player
+
+
+    def __start_player(self, movie_path, start_from, paused, video):
+        """Starts a MPlayer instance for a movie.
+
+        Returns the player and its display widget.
+        """
+
+        player_class = Mpv if self.__backend == BACKEND_MPV else MPlayer
+        player = player_class(self.__mplayer_path,
+            status_line = self.__status_line, frame_reader = self.__frame_reader,
+            metadata_cache = self.__metadata_cache)
+
+        if (
+            video and self.__decoder_scaling and self.__paints_movie_image() and
+            self.width() > 0 and self.height() > 0
+        ):
+            video_size = ( self.width(), self.height() )
+        else:
+            video_size = None
+
+        player.failed.connect(self._mplayer_failed)
+        player.frame_ready.connect(self._frame_ready)
+        player.started.connect(self._mplayer_started)
+        player.terminated.connect(self._mplayer_terminated, QtCore.Qt.QueuedConnection)
+
+        if self.__paints_movie_image():
+            display_widget = None
+        else:
+            display_widget = QtGui.QWidget(self)
+            display_widget.setVisible(False)
+
+        try:
+            future = player.run(movie_path, start_from, paused, display_widget, video = video, video_size = video_size)
+        except:
+            if display_widget is not None:
+                display_widget.setParent(None)
+            raise
+
+        future.add_done_callback(lambda future: self.__player_spawned(player, future))
+
+        return player, display_widget
+
+
+    def __suspend(self, player):
+        """Suspends an inactive player to make it consume no resources."""
+
+        try:
+            if player.running():
+                player.suspend()
+        except Exception as e:
+            LOG.error(u"Unable to suspend the MPlayer process. %s", EE(e))
+
+
+    def __suspend_inactive(self, player):
+        """Suspends a player if it's still not in use."""
+
+        if player in self.__players and player not in self.__active_players():
+            self.__suspend(player)
 
 
     def __switch_to(self, movie_id):
@@ -458,34 +1193,158 @@ class MPlayerWidget(QtGui.QWidget):
             return
 
         LOG.debug(u"Switching to the movie %s from %s.", movie_id, self.__cur_id)
+        switch_time = time.time()
 
-        try:
-            if self.__player().running():
-                if not self.__player().paused():
-                    self.__player().pause()
-        except Exception as e:
-            LOG.debug(u"Unable to pause current movie. %s", EE(e))
+        if self.__players[movie_id] is None and self.__start_alternative(movie_id) is None:
+            return
+
+        prev_players = self.__active_players()
+        prev_video_player = self.__video_player()
 
-        if not pycl.main.is_osx():
-            self.__display_widget().setVisible(False)
+        for player in prev_players:
+            try:
+                if player.running():
+                    if not player.paused():
+                        player.pause()
+            except Exception as e:
+                LOG.debug(u"Unable to pause current movie. %s", EE(e))
 
         seek_to = -1
-        if self.__is_main_movie():
+        if self.__is_main_movie(prev_video_player):
             try:
-                seek_to = self.__player().cur_pos()
+                seek_to = prev_video_player.cur_pos()
             except Exception as e:
                 LOG.debug(u"Unable to get movie's current position. %s", EE(e))
 
         self.__cur_id = movie_id
-        if self.__player().running():
+        self.__pending_seek = None
+        players = self.__active_players()
+
+        if movie_id:
+            self.__touch(self.__player())
+
+        if not self.__paints_movie_image() and self.__video_player() is not prev_video_player:
+            self.__display_widget(prev_video_player).setVisible(False)
+
+        for player in prev_players:
+            if player not in players:
+                self.__suspend(player)
+
+        for player in players:
+            if not player.running():
+                if player is self.__player():
+                    self.__pending_seek = seek_to
+                continue
+
+            self.__shadow_positions.pop(player, None)
+
             try:
-                if seek_to < 0:
-                    self.__player().pause()
+                player.resume()
+            except Exception as e:
+                LOG.error(u"Unable to resume the target movie. %s", EE(e))
+
+            try:
+                # The speed might be changed by synchronization of the audio-only movie
+                if player.get_speed() != 1.0:
+                    player.speed(1.0)
+
+                if self.__is_main_movie(player):
+                    player.mute(player is not self.__player())
+
+                if seek_to < 0 or player is not self.__player() and player is prev_video_player:
+                    # Unpausing the player which has been paused above
+                    if player.paused():
+                        player.pause()
                 else:
-                    self.__player().seek(float(seek_to) / 1000, True)
+                    player.seek(float(seek_to) / 1000, True)
             except Exception as e:
                 LOG.debug(u"Unable to continue playing of the target movie. %s", EE(e))
 
-        if not pycl.main.is_osx():
-            self.__display_widget().setVisible(self.__player().running())
+        self.__last_sync_time = time.time()
+        self.__switch_time = switch_time
+
+        if not self.__paints_movie_image():
+            self.__display_widget().setVisible(self.__video_player().running())
+
+
+    def __sync_audio_player(self, pos):
+        """
+        Synchronizes the audio-only alternative movie with the main movie
+        position.
+
+        The drift is corrected by slight speeding up or slowing down of the
+        audio-only movie instead of seeking, because every seek interrupts the
+        sound.
+        """
+
+        if time.time() - self.__last_sync_time < SHARED_DECODER_SYNC_INTERVAL:
+            return
+
+        self.__last_sync_time = time.time()
+
+        player = self.__player()
+        if not player.running():
+            return
+
+        drift = player.cur_pos() - pos
+        speed = 1.0
+
+        if abs(drift) > SHARED_DECODER_MAX_DRIFT:
+            LOG.debug(u"Audio-only movie drifted by %s ms. Seeking it to the main movie's position.", drift)
+            player.seek(float(pos) / 1000, True)
+        elif abs(drift) > SHARED_DECODER_SYNC_TOLERANCE:
+            speed -= SHARED_DECODER_SPEED_CORRECTION if drift > 0 else -SHARED_DECODER_SPEED_CORRECTION
 
+        if player.get_speed() != speed:
+            LOG.debug(u"Audio-only movie drifted by %s ms. Changing its speed to %s.", drift, speed)
+            player.speed(speed)
+
+
+    def __touch(self, player):
+        """
+        Marks an alternative movie's player as most recently used and closes
+        the least recently used ones if there are too many running players.
+        """
+
+        if player in self.__warm_players:
+            self.__warm_players.remove(player)
+        self.__warm_players.insert(0, player)
+
+        active_players = self.__active_players()
+
+        for player in self.__warm_players[MAX_WARM_ALTERNATIVES:]:
+            if player not in active_players:
+                LOG.debug(u"Closing the least recently used alternative movie '%s'.",
+                    self.__movie_paths[self.__players.index(player)])
+                self.__close_movie(player)
+
+
+    def __update_paint_stats(self, paint_time):
+        """Updates movie painting statistics."""
+
+        cur_time = time.time()
+
+        if self.__paint_stats_time is None:
+            self.__paint_stats_time = cur_time
+            self.__paint_time = 0
+
+        self.__paint_time += paint_time
+
+        if cur_time - self.__paint_stats_time >= PAINT_STATS_INTERVAL:
+            LOG.debug(u"Movie painting takes %.1f ms per second.",
+                self.__paint_time * 1000 / (cur_time - self.__paint_stats_time))
+            self.__paint_stats_time = None
+
+
+    def __video_player(self):
+        """
+        Returns MPlayer instance that displays video of the currently active
+        movie.
+        """
+
+        player = self.__player()
+
+        if player.has_video():
+            return player
+        else:
+            return self.__players[0]
@@ -0,0 +1,267 @@
+"""Provides a reader of MPlayer's yuv4mpeg video output."""
+
+import logging
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pycl.core import EE, Error
+
+LOG = logging.getLogger("mplayer.y4m")
+
+
+RING_SIZE = 3
+"""Number of preallocated RGB frame buffers."""
+
+
+class Y4mReader:
+    """
+    Reads a yuv4mpeg stream (from a FIFO or a file) in a separate thread
+    converting its frames to RGB.
+
+    Converted frames are stored in a ring of preallocated buffers, so the
+    latest frame can be displayed without any copying.
+    """
+
+    __path = None
+    """Path to the stream."""
+
+    __frame_callback = None
+    """Function which is called from the reading thread on every new frame."""
+
+    __thread = None
+    """Reading thread."""
+
+    __lock = None
+    """Lock for the current frame changing."""
+
+    __stopped = False
+    """Should the reading thread stop?"""
+
+    __opened = False
+    """Has the reading thread opened the stream?"""
+
+
+    __width = None
+    """Frame width."""
+
+    __height = None
+    """Frame height."""
+
+    __fps = None
+    """Frame rate."""
+
+
+    __frames = None
+    """Ring of RGB frame buffers."""
+
+    __cur_frame = None
+    """Index of the last completely converted frame."""
+
+    __sequence = 0
+    """Number of converted frames."""
+
+
+    def __init__(self, path, frame_callback = None):
+        if numpy is None:
+            raise Error("NumPy is required for reading MPlayer's yuv4mpeg output.")
+
+        self.__path = path
+        self.__frame_callback = frame_callback
+        self.__lock = threading.Lock()
+
+
+    def get_dimensions(self):
+        """Returns (width, height) of the frames or None if it's not known yet."""
+
+        with self.__lock:
+            if self.__width is None:
+                return None
+
+            return self.__width, self.__height
+
+
+    def get_fps(self):
+        """Returns the stream frame rate or None if it's not known yet."""
+
+        return self.__fps
+
+
+    def get_frame(self):
+        """
+        Returns a tuple of the frame sequence number and the last RGB frame
+        (a numpy array of height x width x 3 bytes) or (0, None) if there is
+        no frame yet.
+
+        The frame buffer is reused after RING_SIZE - 1 next frames.
+        """
+
+        with self.__lock:
+            if self.__cur_frame is None:
+                return 0, None
+
+            return self.__sequence, self.__frames[self.__cur_frame]
+
+
+    def opened(self):
+        """Returns True if the stream has been opened."""
+
+        return self.__opened
+
+
+    def start(self):
+        """Starts the reading thread."""
+
+        self.__thread = threading.Thread(name = "yuv4mpeg reader", target = self.__read)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+
+    def stop(self):
+        """Stops the reading thread (it stops after the current frame)."""
+
+        self.__stopped = True
+
+
+    def __convert(self, y_plane, u_plane, v_plane, y, u, v, u_quads, v_quads, tmp, rgb):
+        """Converts a YUV 4:2:0 frame to RGB using preallocated buffers."""
+
+        # Subtracting in floating point (uint8 arithmetic would wrap Y < 16
+        # around to white)
+        numpy.subtract(y_plane, 16, out = y, dtype = numpy.float32)
+        y *= 1.164
+
+        # Upsampling the chroma planes without allocations (they are
+        # converted to floating point by the assignment, so they are
+        # centered without wrapping)
+        u_quads[:] = u_plane[:, None, :, None]
+        u -= 128
+
+        v_quads[:] = v_plane[:, None, :, None]
+        v -= 128
+
+        numpy.multiply(v, 1.596, out = tmp)
+        tmp += y
+        numpy.clip(tmp, 0, 255, out = tmp)
+        rgb[:, :, 0] = tmp
+
+        # V isn't needed after this point, so it's scaled in place
+        v *= 0.813
+        numpy.multiply(u, -0.392, out = tmp)
+        tmp -= v
+        tmp += y
+        numpy.clip(tmp, 0, 255, out = tmp)
+        rgb[:, :, 1] = tmp
+
+        numpy.multiply(u, 2.017, out = tmp)
+        tmp += y
+        numpy.clip(tmp, 0, 255, out = tmp)
+        rgb[:, :, 2] = tmp
+
+
+    def __read(self):
+        """The reading thread's main function."""
+
+        try:
+            with open(self.__path, "rb") as stream:
+                self.__opened = True
+                self.__read_stream(stream)
+        except Exception as e:
+            if not self.__stopped:
+                LOG.error(u"Error while reading yuv4mpeg stream '%s': %s.", self.__path, EE(e))
+
+        LOG.debug(u"yuv4mpeg stream '%s' reading finished.", self.__path)
+
+
+    def __read_header(self, stream):
+        """Reads the stream header."""
+
+        header = stream.readline().split()
+        if not header or header[0] != "YUV4MPEG2":
+            raise Error("Invalid yuv4mpeg stream header.")
+
+        width = height = None
+
+        for param in header[1:]:
+            key, value = param[0], param[1:]
+
+            if key == "W":
+                width = int(value)
+            elif key == "H":
+                height = int(value)
+            elif key == "F":
+                numerator, denominator = value.split(":")
+                if int(denominator):
+                    self.__fps = float(numerator) / int(denominator)
+            elif key == "C" and not value.startswith("420"):
+                raise Error("Unsupported yuv4mpeg colorspace: {0}.", value)
+
+        if not width or not height:
+            raise Error("Invalid yuv4mpeg frame size: {0}x{1}.", width, height)
+
+        return width, height
+
+
+    def __read_stream(self, stream):
+        """Reads frames from the stream."""
+
+        width, height = self.__read_header(stream)
+        LOG.debug(u"yuv4mpeg stream '%s': %sx%s, %s fps.", self.__path, width, height, self.__fps)
+
+        # Preallocating all buffers -->
+        chroma_width = (width + 1) // 2
+        chroma_height = (height + 1) // 2
+
+        y_size = width * height
+        uv_size = chroma_width * chroma_height
+
+        yuv = numpy.empty(y_size + 2 * uv_size, numpy.uint8)
+        y_plane = yuv[:y_size].reshape(height, width)
+        u_plane = yuv[y_size:y_size + uv_size].reshape(chroma_height, chroma_width)
+        v_plane = yuv[y_size + uv_size:].reshape(chroma_height, chroma_width)
+
+        y = numpy.empty((height, width), numpy.float32)
+        tmp = numpy.empty((height, width), numpy.float32)
+
+        # Upsampled chroma planes may be one pixel bigger than the frame
+        u_full = numpy.empty((2 * chroma_height, 2 * chroma_width), numpy.float32)
+        v_full = numpy.empty((2 * chroma_height, 2 * chroma_width), numpy.float32)
+        u = u_full[:height, :width]
+        v = v_full[:height, :width]
+        u_quads = u_full.reshape(chroma_height, 2, chroma_width, 2)
+        v_quads = v_full.reshape(chroma_height, 2, chroma_width, 2)
+
+        frames = [ numpy.zeros((height, width, 3), numpy.uint8) for i in xrange(RING_SIZE) ]
+        # Preallocating all buffers <--
+
+        with self.__lock:
+            self.__width = width
+            self.__height = height
+            self.__frames = frames
+
+        next_frame = 0
+
+        while not self.__stopped:
+            frame_header = stream.readline()
+            if not frame_header:
+                break
+
+            if not frame_header.startswith("FRAME"):
+                raise Error("Invalid yuv4mpeg frame header.")
+
+            if stream.readinto(yuv) != yuv.size:
+                break
+
+            self.__convert(y_plane, u_plane, v_plane, y, u, v, u_quads, v_quads, tmp, frames[next_frame])
+
+            with self.__lock:
+                self.__cur_frame = next_frame
+                self.__sequence += 1
+
+            next_frame = (next_frame + 1) % RING_SIZE
+
+            if self.__frame_callback is not None:
+                self.__frame_callback()
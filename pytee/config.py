@@ -1,30 +1,101 @@
 """Provides a class for reading and writing the application's configuration."""
 
 import errno
+import hashlib
 import logging
 import os
 import sqlite3
+import threading
 import time
 
 import pycl.main
 
 from pycl import constants
-from pycl.core import Error
+from pycl.core import EE, Error
 
 import pytee.constants
+from pytee.journal import Journal
+from pytee.schema import migrate
 
 LOG = logging.getLogger("pytee.config")
 
 
+CONTENT_ID_CHUNK_SIZE = 64 * 1024
+"""Size of the file's head and tail which are used for content identity calculation."""
+
+SCHEMA_MIGRATIONS = (
+    """
+        CREATE TABLE IF NOT EXISTS last_pos (
+            file_path TEXT PRIMARY KEY,
+            file_name TEXT,
+            position INTEGER,
+            last_update INTEGER
+        );
+    """,
+    """
+        ALTER TABLE last_pos ADD COLUMN content_id TEXT;
+        CREATE INDEX last_pos_file_name ON last_pos (file_name);
+        CREATE INDEX last_pos_content_id ON last_pos (content_id);
+    """,
+)
+"""Database schema migrations (see pytee.schema.migrate())."""
+
+
+def content_identity(path):
+    """
+    Calculates a fast partial hash of the file content: its size, head and
+    tail, so a moved or renamed copy of the file has the same identity.
+    """
+
+    with open(path, "rb") as movie_file:
+        size = os.fstat(movie_file.fileno()).st_size
+
+        content_hash = hashlib.sha1(str(size))
+        content_hash.update(movie_file.read(CONTENT_ID_CHUNK_SIZE))
+
+        if size > CONTENT_ID_CHUNK_SIZE:
+            movie_file.seek(max(CONTENT_ID_CHUNK_SIZE, size - CONTENT_ID_CHUNK_SIZE))
+            content_hash.update(movie_file.read(CONTENT_ID_CHUNK_SIZE))
+
+    return content_hash.hexdigest()
+
+
 class Config:
     """Configuration file object."""
 
     __db = None
     """Database for storing the configuration data."""
 
+    __journal = None
+    """Journal for storing the configuration data (used instead of the database)."""
+
+    __config_dir = None
+    """Directory with the application's configuration and cache files."""
+
+    __backend = "mplayer"
+    """Player backend (mplayer|mpv)."""
+
     __mplayer_path = None
     """Path to MPlayer's binary."""
 
+    __mpv_path = "mpv"
+    """Path to mpv's binary."""
+
+    __shared_decoder = False
+    """Play alternative movies in shared-decoder mode."""
+
+    __status_line = False
+    """Get MPlayer's status from its status line instead of polling."""
+
+    __frame_reader = False
+    """Read MPlayer's video output via a yuv4mpeg pipe (Linux only)."""
+
+    __decoder_scaling = False
+    """Make MPlayer scale the video to the display size while decoding."""
+
+    __thumbnails = False
+    """Make movie thumbnails for seek previews in background."""
+
 
     __config_saving_interval = constants.MINUTE_SECONDS
     """Interval with which we should save the configuration data."""
@@ -32,10 +103,60 @@ class Config:
     __last_pos_lifetime = 4 * constants.WEEK_SECONDS
     """Time after which we forget a movie's last position."""
 
+    __min_pos_change = 5000
+    """Minimum change of a movie's position in milliseconds that is worth saving."""
+
+    __expiry_batch_size = 100
+    """Maximum number of expired positions which are deleted at once."""
 
-    def __init__(self, data_dir, debug_mode):
-        config_dir = os.path.expanduser("~/." + pytee.constants.APP_UNIX_NAME)
+    __vacuum_threshold = 0.25
+    """Ratio of free database pages that makes us to compact the database."""
+
+
+    __lock = None
+    """Lock for the write-behind cache."""
+
+    __positions = None
+    """
+    Write-behind cache of movies' last positions: movie path -> position or
+    None if the movie has been watched.
+    """
+
+    __pending = None
+    """
+    Changes of movies' last positions which aren't written to the database
+    yet: movie path -> (position, update time, content identity) or None if
+    the movie has been watched.
+    """
+
+    __content_ids = None
+    """Cache of movies' content identities: movie path -> (size, mtime, identity)."""
+
+    __writer = None
+    """Thread that writes pending changes to the database."""
+
+    __stop_writer = None
+    """Event that stops the writer thread."""
+
+
+    def __init__(self, data_dir, debug_mode, shared_decoder = False, status_line = False, backend = "mplayer",
+        frame_reader = False, decoder_scaling = False, thumbnails = False, storage = "sqlite"):
+        if backend not in ("mplayer", "mpv"):
+            raise Error("Invalid player backend: '{0}'.", backend)
+
+        if storage not in ("sqlite", "journal"):
+            raise Error("Invalid configuration storage: '{0}'.", storage)
+
+        self.__backend = backend
+        self.__shared_decoder = shared_decoder
+        self.__status_line = status_line
+        self.__frame_reader = frame_reader
+        self.__decoder_scaling = decoder_scaling
+        self.__thumbnails = thumbnails
+
+        config_dir = self.__config_dir = os.path.expanduser("~/." + pytee.constants.APP_UNIX_NAME)
         db_path = os.path.join(config_dir, "config.sqlite")
+        journal_path = os.path.join(config_dir, "config.journal")
 
         if pycl.main.is_osx():
             if debug_mode:
@@ -46,6 +167,8 @@ class Config:
         else:
             self.__mplayer_path = "mplayer"
 
+        start_time = time.time()
+
         try:
             try:
                 os.makedirs(config_dir)
@@ -53,33 +176,56 @@ class Config:
                 if e.errno != errno.EEXIST:
                     raise
 
-            self.__db = sqlite3.connect(db_path)
-
-            self.__db.execute("""
-                CREATE TABLE IF NOT EXISTS last_pos (
-                    file_path TEXT PRIMARY KEY,
-                    file_name TEXT,
-                    position INTEGER,
-                    last_update INTEGER
-                )
-            """)
+            if storage == "journal":
+                self.__journal = Journal(journal_path, self.__last_pos_lifetime)
+            else:
+                self.__db = sqlite3.connect(db_path)
 
-            self.__db.execute(
-                "DELETE FROM last_pos WHERE last_update <= ?",
-                ( int(time.time()) - self.__last_pos_lifetime, ))
+                # Readers don't block the writer thread and vice versa
+                self.__db.execute("PRAGMA journal_mode = WAL")
 
-            self.__db.execute("VACUUM")
-            self.__db.commit()
+                migrate(self.__db, SCHEMA_MIGRATIONS)
         except Exception as e:
-            raise Error("Unable to open database '{0}'.", db_path)
+            raise Error("Unable to open database '{0}'.",
+                journal_path if storage == "journal" else db_path).append(e)
+
+        LOG.debug(u"Configuration storage opened in %.3f seconds.", time.time() - start_time)
+
+        self.__lock = threading.Lock()
+        self.__positions = {}
+        self.__pending = {}
+        self.__content_ids = {}
+
+        self.__stop_writer = threading.Event()
+        self.__writer = threading.Thread(name = "Config writer",
+            target = self.__write_behind, args = (db_path,))
+        self.__writer.daemon = True
+        self.__writer.start()
 
 
     def __del__(self):
+        self.close()
+
+
+    def close(self):
+        """Writes all pending changes to the database and closes it."""
+
+        if self.__writer is not None:
+            self.__stop_writer.set()
+            self.__writer.join()
+            self.__writer = None
+
         if self.__db is not None:
             try:
                 self.__db.close()
             except Exception as e:
                 LOG.error(u"%s", Error("Unable to close the database:").append(e))
+            finally:
+                self.__db = None
+
+        if self.__journal is not None:
+            self.__journal.close()
+            self.__journal = None
 
 
     def get_config_saving_interval(self):
@@ -88,31 +234,107 @@ class Config:
         return self.__config_saving_interval
 
 
+    def get_decoder_scaling_mode(self):
+        """
+        Returns True if MPlayer should scale the video to the display size
+        while decoding.
+        """
+
+        return self.__decoder_scaling
+
+
+    def get_frame_reader_mode(self):
+        """
+        Returns True if MPlayer's video output should be read via a yuv4mpeg
+        pipe and painted by us.
+        """
+
+        return self.__frame_reader
+
+
+    def get_library_path(self):
+        """Returns path to the media library index database."""
+
+        return os.path.join(self.__config_dir, "library.sqlite")
+
+
+    def get_metadata_cache_path(self):
+        """Returns path to the file with cached movies' metadata."""
+
+        return os.path.join(self.__config_dir, "metadata.json")
+
+
     def get_movie_last_pos(self, movie_path):
         """Returns a movie's last position."""
 
-        movie = self.__db.execute("""
-            SELECT
-                position
-            FROM
-                last_pos
-            WHERE
-                file_path = ?""", (movie_path,)).fetchone()
+        with self.__lock:
+            cached = movie_path in self.__positions
+            position = self.__positions.get(movie_path)
 
-        if movie is None:
-            movie = self.__db.execute("""
-                SELECT
-                    position
-                FROM
-                    last_pos
-                WHERE
-                    file_name = ?""",
-                (os.path.basename(movie_path),)).fetchone()
+        # Expired positions are deleted in background, so they may be still
+        # in the database.
+        expiry_time = int(time.time()) - self.__last_pos_lifetime
 
-        if movie is None:
-            movie = (0,)
+        if not cached:
+            if self.__journal is not None:
+                position = self.__journal.get(movie_path)
+            else:
+                movie = self.__db.execute("""
+                    SELECT
+                        position
+                    FROM
+                        last_pos
+                    WHERE
+                        file_path = ? AND last_update > ?""", (movie_path, expiry_time)).fetchone()
+
+                position = None if movie is None else movie[0]
+
+            with self.__lock:
+                position = self.__positions.setdefault(movie_path, position)
+
+        if position is not None:
+            return position
+
+        # Looking for the same movie at another path -->
+        content_id = self.__get_content_id(movie_path)
+        file_name = os.path.basename(movie_path)
+
+        with self.__lock:
+            for path, position in self.__positions.iteritems():
+                if position is None:
+                    continue
+
+                if content_id is not None and self.__content_ids.get(path, (None,) * 3)[2] == content_id:
+                    return position
+
+                if os.path.basename(path) == file_name:
+                    return position
+
+            positions = self.__positions.copy()
 
-        return movie[0]
+        lookups = [ ( "file_name", file_name ) ]
+        if content_id is not None:
+            lookups.insert(0, ( "content_id", content_id ))
+
+        for column, value in lookups:
+            if self.__journal is not None:
+                movies = self.__journal.find(column, value)
+            else:
+                movies = self.__db.execute("""
+                    SELECT
+                        file_path, position
+                    FROM
+                        last_pos
+                    WHERE
+                        {0} = ? AND last_update > ?""".format(column), (value, expiry_time))
+
+            for path, position in movies:
+                # Skipping movies which are watched, but not written yet
+                if positions.get(path, position) is not None:
+                    return position
+        # Looking for the same movie at another path <--
+
+        return 0
 
 
     def get_mplayer_path(self):
@@ -121,26 +343,238 @@ class Config:
         return self.__mplayer_path
 
 
+    def get_mpv_path(self):
+        """Returns path to mpv's binary."""
+
+        return self.__mpv_path
+
+
+    def get_player_backend(self):
+        """Returns the player backend (mplayer|mpv)."""
+
+        return self.__backend
+
+
+    def get_player_path(self):
+        """Returns path to the selected player backend's binary."""
+
+        return self.__mpv_path if self.__backend == "mpv" else self.__mplayer_path
+
+
+    def get_shared_decoder_mode(self):
+        """
+        Returns True if alternative movies should be played in shared-decoder
+        mode.
+        """
+
+        return self.__shared_decoder
+
+
+    def get_status_line_mode(self):
+        """
+        Returns True if MPlayer's status should be obtained from its status
+        line instead of polling.
+        """
+
+        return self.__status_line
+
+
+    def get_thumbnail_cache_dir(self):
+        """Returns path to the directory with cached movie thumbnails."""
+
+        return os.path.join(self.__config_dir, "thumbnails")
+
+
+    def get_thumbnails_mode(self):
+        """Returns True if movie thumbnails should be made in background."""
+
+        return self.__thumbnails
+
+
     def mark_movie_as_watched(self, movie_path):
         """Marks a movie as watched (forgets its last position)."""
 
         LOG.debug(u"Marking movie '%s' as watched.", movie_path)
 
-        self.__db.execute("""
-            DELETE FROM last_pos WHERE file_path = ?""", (movie_path,))
-        self.__db.commit()
+        with self.__lock:
+            self.__positions[movie_path] = None
+            self.__pending[movie_path] = None
 
 
     def save_movie_last_position(self, movie_path, position):
-        """Saves last position for a movie."""
+        """Saves last position for a movie.
+
+        The position is written to the database in background. Changes less
+        than __min_pos_change are ignored.
+        """
+
+        with self.__lock:
+            cur_position = self.__positions.get(movie_path)
+
+            if cur_position is not None and abs(position - cur_position) < self.__min_pos_change:
+                return
 
-        LOG.debug(u"Saving last position (%s) for movie '%s'.", position, movie_path)
+            LOG.debug(u"Saving last position (%s) for movie '%s'.", position, movie_path)
+            self.__positions[movie_path] = position
+
+        content_id = self.__get_content_id(movie_path)
+
+        with self.__lock:
+            self.__pending[movie_path] = ( position, int(time.time()), content_id )
+
+
+    def __compact(self, db):
+        """Compacts the database if it has too many free pages."""
+
+        page_count = db.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = db.execute("PRAGMA freelist_count").fetchone()[0]
+
+        if not page_count or float(free_pages) / page_count < self.__vacuum_threshold:
+            return
+
+        LOG.debug(u"Compacting the database (%s of %s pages are free)...", free_pages, page_count)
+
+        start_time = time.time()
+        db.execute("VACUUM")
+        LOG.debug(u"The database compacted in %.3f seconds.", time.time() - start_time)
+
+
+    def __expire(self, db):
+        """
+        Deletes a batch of expired movies' positions and compacts the database
+        if needed.
+        """
+
+        try:
+            deleted = db.execute("""
+                DELETE FROM last_pos WHERE rowid IN (
+                    SELECT rowid FROM last_pos WHERE last_update <= ? LIMIT ?
+                )
+            """, ( int(time.time()) - self.__last_pos_lifetime, self.__expiry_batch_size )).rowcount
+            db.commit()
+
+            if deleted:
+                LOG.debug(u"%s expired movie positions deleted.", deleted)
+                self.__compact(db)
+        except Exception as e:
+            LOG.error(u"%s", Error("Unable to delete expired movie positions:").append(e))
+
+            try:
+                db.rollback()
+            except Exception as e:
+                LOG.error(u"Unable to rollback the transaction: %s.", EE(e))
 
-        self.__db.execute("""
-            INSERT OR REPLACE INTO last_pos
-                (file_path, file_name, position, last_update)
-            VALUES
-                (?, ?, ?, ?)
-        """, (movie_path, os.path.basename(movie_path), position, int(time.time())))
-        self.__db.commit()
 
+    def __flush(self, write):
+        """Writes pending changes to the storage using the write function."""
+
+        with self.__lock:
+            pending = self.__pending
+            self.__pending = {}
+
+        if not pending:
+            return
+
+        LOG.debug(u"Writing %s last position changes to the storage...", len(pending))
+
+        try:
+            write(pending)
+        except Exception as e:
+            LOG.error(u"%s", Error("Unable to save configuration data:").append(e))
+
+            # Retrying on the next flush if there are no newer changes
+            with self.__lock:
+                for movie_path, change in pending.iteritems():
+                    self.__pending.setdefault(movie_path, change)
+
+
+    def __get_content_id(self, movie_path):
+        """
+        Returns the movie's content identity (calculated once for each file
+        version) or None if it can't be calculated.
+        """
+
+        try:
+            stat = os.stat(movie_path)
+
+            with self.__lock:
+                size, mtime, content_id = self.__content_ids.get(movie_path, (None,) * 3)
+
+            if size != stat.st_size or mtime != stat.st_mtime:
+                content_id = content_identity(movie_path)
+
+                with self.__lock:
+                    self.__content_ids[movie_path] = ( stat.st_size, stat.st_mtime, content_id )
+        except Exception as e:
+            LOG.debug(u"Unable to calculate content identity of '%s': %s.", movie_path, EE(e))
+            content_id = None
+
+        return content_id
+
+
+    def __write_behind(self, db_path):
+        """The writer thread's main function."""
+
+        if self.__journal is not None:
+            while True:
+                # Event.wait() returns None on Python 2.6
+                self.__stop_writer.wait(self.__config_saving_interval)
+                stopping = self.__stop_writer.is_set()
+                self.__flush(self.__journal.append)
+
+                try:
+                    self.__journal.compact()
+                except Exception as e:
+                    LOG.error(u"%s", Error("Unable to compact the journal:").append(e))
+
+                if stopping:
+                    return
+
+        try:
+            db = sqlite3.connect(db_path)
+        except Exception as e:
+            LOG.error(u"%s", Error("Unable to open database '{0}':", db_path).append(e))
+            return
+
+        try:
+            db.execute("PRAGMA synchronous = NORMAL")
+
+            while True:
+                self.__expire(db)
+
+                self.__stop_writer.wait(self.__config_saving_interval)
+                stopping = self.__stop_writer.is_set()
+                self.__flush(lambda pending: self.__write_to_db(db, pending))
+
+                if stopping:
+                    break
+        finally:
+            db.close()
+
+
+    def __write_to_db(self, db, pending):
+        """Writes pending changes to the database."""
+
+        try:
+            for movie_path, change in pending.iteritems():
+                if change is None:
+                    db.execute("""
+                        DELETE FROM last_pos WHERE file_path = ?""", (movie_path,))
+                else:
+                    position, last_update, content_id = change
+
+                    db.execute("""
+                        INSERT OR REPLACE INTO last_pos
+                            (file_path, file_name, position, last_update, content_id)
+                        VALUES
+                            (?, ?, ?, ?, ?)
+                    """, (movie_path, os.path.basename(movie_path), position, last_update, content_id))
+
+            db.commit()
+        except:
+            try:
+                db.rollback()
+            except Exception as e:
+                LOG.error(u"Unable to rollback the transaction: %s.", EE(e))
+
+            raise
@@ -0,0 +1,232 @@
+"""Provides an append-only journal storage of movies' last positions."""
+
+import errno
+import json
+import logging
+import os
+import threading
+import time
+
+from pycl.core import EE, Error
+
+LOG = logging.getLogger("pytee.journal")
+
+
+COMPACTION_MIN_RECORDS = 1000
+"""Minimum number of records in the journal that makes us to compact it."""
+
+COMPACTION_RATIO = 2
+"""
+The journal is compacted when it has more than COMPACTION_RATIO records per
+live movie position.
+"""
+
+
+class Journal:
+    """
+    Stores movies' last positions in an append-only journal file.
+
+    Each line of the journal is a JSON record [path, position, update time,
+    content identity] (position is null for watched movies). The journal is
+    replayed into memory on opening, so all lookups are served from memory,
+    and is rewritten with only live records when it has too many outdated
+    ones. A torn last record (after a crash or a storage failure) is
+    skipped.
+    """
+
+    __path = None
+    """Path to the journal file."""
+
+    __lifetime = None
+    """Time after which we forget a movie's last position."""
+
+    __lock = None
+    """Lock for the journal state."""
+
+    __file = None
+    """The journal file opened for appending."""
+
+    __records = 0
+    """Number of records in the journal file."""
+
+    __torn = False
+    """Is the last record in the journal file torn?"""
+
+    __positions = None
+    """Live movies' positions: path -> (position, update time, content identity)."""
+
+
+    def __init__(self, path, lifetime):
+        self.__path = path
+        self.__lifetime = lifetime
+        self.__lock = threading.Lock()
+        self.__positions = {}
+
+        start_time = time.time()
+        self.__torn = self.__replay()
+        LOG.debug(u"Journal '%s' replayed in %.3f seconds (%s records, %s positions).",
+            path, time.time() - start_time, self.__records, len(self.__positions))
+
+        self.__file = open(path, "ab")
+
+
+    def __del__(self):
+        self.close()
+
+
+    def append(self, changes):
+        """
+        Appends changes (path -> (position, update time, content identity) or
+        None for watched movies) to the journal.
+        """
+
+        lines = []
+
+        with self.__lock:
+            for path, change in changes.iteritems():
+                if change is None:
+                    self.__positions.pop(path, None)
+                    lines.append(json.dumps([ path, None, int(time.time()), None ]))
+                else:
+                    self.__positions[path] = change
+                    lines.append(json.dumps([ path ] + list(change)))
+
+            # Terminating the torn record, so it won't corrupt the next one
+            data = "\n" if self.__torn else ""
+            data += "".join(line + "\n" for line in lines)
+
+            try:
+                self.__file.write(data)
+                self.__file.flush()
+                os.fsync(self.__file.fileno())
+            except:
+                self.__torn = True
+                raise
+
+            self.__torn = False
+            self.__records += len(lines)
+
+
+    def close(self):
+        """Closes the journal."""
+
+        with self.__lock:
+            if self.__file is not None:
+                try:
+                    self.__file.close()
+                except Exception as e:
+                    LOG.error(u"Unable to close the journal '%s': %s.", self.__path, EE(e))
+                finally:
+                    self.__file = None
+
+
+    def compact(self):
+        """Rewrites the journal with only live records if it has too many outdated ones."""
+
+        with self.__lock:
+            self.__expire()
+
+            if (
+                self.__records < COMPACTION_MIN_RECORDS or
+                self.__records <= COMPACTION_RATIO * len(self.__positions)
+            ):
+                return
+
+            LOG.debug(u"Compacting the journal '%s' (%s records, %s positions)...",
+                self.__path, self.__records, len(self.__positions))
+
+            temp_path = self.__path + ".tmp"
+
+            with open(temp_path, "wb") as journal:
+                for path, change in self.__positions.iteritems():
+                    journal.write(json.dumps([ path ] + list(change)) + "\n")
+
+                journal.flush()
+                os.fsync(journal.fileno())
+
+            self.__file.close()
+            os.rename(temp_path, self.__path)
+            self.__file = open(self.__path, "ab")
+            self.__records = len(self.__positions)
+            self.__torn = False
+
+
+    def find(self, key, value):
+        """
+        Returns a list of (path, position) of movies which have the specified
+        file name or content identity (key is "file_name" or "content_id").
+        """
+
+        expiry_time = int(time.time()) - self.__lifetime
+        found = []
+
+        with self.__lock:
+            for path, (position, last_update, content_id) in self.__positions.iteritems():
+                if last_update <= expiry_time:
+                    continue
+
+                if (
+                    key == "file_name" and os.path.basename(path) == value or
+                    key == "content_id" and content_id == value
+                ):
+                    found.append(( path, position ))
+
+        return found
+
+
+    def get(self, path):
+        """Returns the movie's last position or None if it's unknown."""
+
+        with self.__lock:
+            position, last_update, content_id = self.__positions.get(path, (None,) * 3)
+
+        if position is None or last_update <= int(time.time()) - self.__lifetime:
+            return None
+
+        return position
+
+
+    def __expire(self):
+        """Forgets expired positions."""
+
+        expiry_time = int(time.time()) - self.__lifetime
+
+        for path, (position, last_update, content_id) in self.__positions.items():
+            if last_update <= expiry_time:
+                del self.__positions[path]
+
+
+    def __replay(self):
+        """Replays the journal into memory.
+
+        Returns True if the last record is torn.
+        """
+
+        try:
+            journal = open(self.__path, "rb")
+        except EnvironmentError as e:
+            if e.errno == errno.ENOENT:
+                return False
+
+            raise Error("Unable to open journal '{0}':", self.__path).append(e)
+
+        line = ""
+
+        with journal:
+            for line_id, line in enumerate(journal):
+                try:
+                    path, position, last_update, content_id = json.loads(line)
+                except ValueError:
+                    LOG.warning(u"Skipping invalid record #%s of journal '%s'.", line_id + 1, self.__path)
+                    continue
+
+                if position is None:
+                    self.__positions.pop(path, None)
+                else:
+                    self.__positions[path] = ( position, last_update, content_id )
+
+                self.__records += 1
+
+        self.__expire()
+
+        return bool(line) and not line.endswith("\n")
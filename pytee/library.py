@@ -0,0 +1,337 @@
+"""Provides a persistent index of the media library."""
+
+import collections
+import logging
+import os
+import Queue
+import sqlite3
+import threading
+import time
+
+import pysd.pysd
+
+from pycl.core import EE, Error
+
+from pytee.related_files import list_files
+from pytee.schema import migrate
+
+LOG = logging.getLogger("pytee.library")
+
+
+MAX_WORKERS = 4
+"""Number of threads which read directories while indexing."""
+
+SCHEMA_MIGRATIONS = (
+    """
+        CREATE TABLE directories (
+            path TEXT PRIMARY KEY,
+            parent TEXT,
+            mtime REAL
+        );
+        CREATE INDEX directories_parent ON directories (parent);
+
+        CREATE TABLE episodes (
+            file_path TEXT,
+            directory TEXT,
+            kind TEXT,
+            name TEXT,
+            season TEXT,
+            episode TEXT,
+            extra_info TEXT
+        );
+        CREATE INDEX episodes_file_path ON episodes (file_path);
+        CREATE INDEX episodes_episode ON episodes (directory, season, episode, name);
+    """,
+)
+"""Database schema migrations (see pytee.schema.migrate())."""
+
+
+class Library:
+    """
+    Index of media and subtitle files grouped by episode.
+
+    Every file which name pysd is able to parse has a row per each of its
+    show names in the episodes table, so files of the same episode (the
+    same names, season and episode in one directory) are found by a single
+    indexed query. The index is refreshed incrementally: only directories
+    which modification time has changed are read again.
+    """
+
+    __db = None
+    """The index database."""
+
+    __media_extensions = None
+    """Extensions of media files."""
+
+    __subtitle_extensions = None
+    """Extensions of subtitle files."""
+
+
+    def __init__(self, db_path):
+        self.__media_extensions = set(( ext[1:] for ext in pysd.pysd.MEDIA_EXTENSIONS ))
+        self.__subtitle_extensions = set(( ext[1:] for ext in pysd.pysd.SUBTITLE_EXTENSIONS ))
+
+        try:
+            self.__db = sqlite3.connect(db_path)
+
+            # The index may be refreshed while it's queried by another process
+            self.__db.execute("PRAGMA journal_mode = WAL")
+
+            migrate(self.__db, SCHEMA_MIGRATIONS)
+        except Exception as e:
+            self.close()
+            raise Error("Unable to open database '{0}'.", db_path).append(e)
+
+
+    def __del__(self):
+        self.close()
+
+
+    def close(self):
+        """Closes the index database."""
+
+        if self.__db is not None:
+            try:
+                self.__db.close()
+            except Exception as e:
+                LOG.error(u"%s", Error("Unable to close the library database:").append(e))
+            finally:
+                self.__db = None
+
+
+    def find_related_files(self, movie_path):
+        """
+        Returns a tuple of a list of alternative movies and a list of (path,
+        language) of subtitle files for the movie or None if the movie isn't
+        indexed or its directory has changed since the last indexing.
+        """
+
+        movie_path = os.path.abspath(movie_path)
+        mtime = os.stat(os.path.dirname(movie_path)).st_mtime
+
+        files = self.__db.execute("""
+            SELECT DISTINCT
+                related.file_path, related.kind, related.extra_info
+            FROM
+                episodes AS movie
+                JOIN directories ON
+                    directories.path = movie.directory
+                JOIN episodes AS related ON
+                    related.directory = movie.directory AND
+                    related.season IS movie.season AND
+                    related.episode IS movie.episode AND
+                    related.name = movie.name
+            WHERE
+                movie.file_path = ? AND directories.mtime = ?""", (movie_path, mtime)).fetchall()
+
+        if movie_path not in (path for path, kind, extra_info in files):
+            return None
+
+        alternatives = []
+        subtitles = []
+
+        for path, kind, extra_info in files:
+            if path == movie_path:
+                continue
+
+            if kind == "subtitles":
+                subtitles.append(( path, extra_info ))
+            else:
+                alternatives.append(path)
+
+        return alternatives, subtitles
+
+
+    def find_next_episode(self, movie_path):
+        """
+        Returns path to the next episode of the movie from the same directory
+        or None if it's unknown. An episode with the same extra info (usually
+        a translation or a release group) as the movie's one is preferred.
+        """
+
+        next_episode = self.__db.execute("""
+            SELECT
+                next.file_path
+            FROM
+                episodes AS movie
+                JOIN episodes AS next ON
+                    next.directory = movie.directory AND
+                    next.name = movie.name AND
+                    next.kind = 'media' AND (
+                        CAST(next.season AS INTEGER) > CAST(movie.season AS INTEGER) OR
+                        CAST(next.season AS INTEGER) = CAST(movie.season AS INTEGER) AND
+                        CAST(next.episode AS INTEGER) > CAST(movie.episode AS INTEGER)
+                    )
+            WHERE
+                movie.file_path = ?
+            ORDER BY
+                CAST(next.season AS INTEGER), CAST(next.episode AS INTEGER),
+                next.extra_info IS movie.extra_info DESC, next.file_path
+            LIMIT 1""", (os.path.abspath(movie_path),)).fetchone()
+
+        return None if next_episode is None else next_episode[0]
+
+
+    def index(self, root_path, recursive = True):
+        """
+        Indexes the directory tree (only changed directories are read). If
+        recursive is False, only the directory itself is indexed.
+
+        Returns a tuple of the number of indexed directories and the number
+        of read directories.
+        """
+
+        root_path = os.path.abspath(root_path)
+        start_time = time.time()
+
+        mtimes = {}
+        children = collections.defaultdict(list)
+
+        for path, parent, mtime in self.__db.execute("SELECT path, parent, mtime FROM directories"):
+            mtimes[path] = mtime
+            children[parent].append(path)
+
+        tasks = Queue.Queue()
+        results = Queue.Queue()
+        workers = []
+
+        for worker_id in xrange(MAX_WORKERS):
+            worker = threading.Thread(name = "Library indexer",
+                target = self.__work, args = (tasks, results))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        directories = read_directories = 0
+
+        try:
+            tasks.put(( root_path, mtimes.get(root_path) ))
+            pending = 1
+
+            while pending:
+                dir_path, mtime, subdirs, episodes = results.get()
+                pending -= 1
+
+                if mtime is None:
+                    # The directory has been deleted or can't be read
+                    self.__forget(dir_path)
+                    continue
+
+                directories += 1
+
+                if subdirs is None:
+                    subdirs = children[dir_path]
+                else:
+                    read_directories += 1
+                    self.__update(dir_path, mtime, subdirs, episodes, children[dir_path])
+
+                if not recursive:
+                    continue
+
+                for subdir in subdirs:
+                    tasks.put(( subdir, mtimes.get(subdir) ))
+                    pending += 1
+
+            self.__db.commit()
+        except:
+            self.__db.rollback()
+            raise
+        finally:
+            for worker in workers:
+                tasks.put(None)
+
+            for worker in workers:
+                worker.join()
+
+        LOG.info(u"Library '%s' has been indexed in %.1f seconds (%s directories, %s of them read).",
+            root_path, time.time() - start_time, directories, read_directories)
+
+        return directories, read_directories
+
+
+    def __forget(self, dir_path):
+        """Removes the directory and all its subdirectories from the index."""
+
+        for table, column in (( "directories", "path" ), ( "episodes", "directory" )):
+            self.__db.execute("""
+                DELETE FROM
+                    {0}
+                WHERE
+                    {1} = ? OR {1} >= ? AND {1} < ?""".format(table, column),
+                (dir_path, dir_path + os.sep, dir_path + chr(ord(os.sep) + 1)))
+
+
+    def __read_directory(self, tools, dir_path):
+        """Returns a tuple of subdirectory paths and episode rows of the directory."""
+
+        extensions = self.__media_extensions | self.__subtitle_extensions
+        subdirs = []
+        episodes = []
+
+        for file_name, extension in list_files(dir_path, extensions, subdirs):
+            try:
+                names, season, episode, delimiter, extra_info = tools.get_info_from_filename(file_name)
+            except pysd.pysd.Not_found:
+                continue
+
+            kind = "subtitles" if extension in self.__subtitle_extensions else "media"
+            path = os.path.join(dir_path, file_name)
+
+            for name in set(names):
+                episodes.append(( path, dir_path, kind, name, season, episode, extra_info ))
+
+        return [ os.path.join(dir_path, subdir) for subdir in subdirs ], episodes
+
+
+    def __update(self, dir_path, mtime, subdirs, episodes, indexed_subdirs):
+        """Replaces the directory's index entries with the new ones."""
+
+        for subdir in set(indexed_subdirs) - set(subdirs):
+            self.__forget(subdir)
+
+        # New subdirectories are registered as not indexed ones, so they are
+        # found by recursive indexing even if this directory is indexed
+        # non-recursively and doesn't change after that.
+        self.__db.executemany("""
+            INSERT OR IGNORE INTO
+                directories (path, parent, mtime)
+            VALUES
+                (?, ?, NULL)""", [ ( subdir, dir_path ) for subdir in set(subdirs) - set(indexed_subdirs) ])
+
+        self.__db.execute("DELETE FROM episodes WHERE directory = ?", (dir_path,))
+        self.__db.executemany("""
+            INSERT INTO
+                episodes (file_path, directory, kind, name, season, episode, extra_info)
+            VALUES
+                (?, ?, ?, ?, ?, ?, ?)""", episodes)
+
+        self.__db.execute("""
+            INSERT OR REPLACE INTO
+                directories (path, parent, mtime)
+            VALUES
+                (?, ?, ?)""", (dir_path, os.path.dirname(dir_path), mtime))
+
+
+    def __work(self, tasks, results):
+        """The indexing threads' main function."""
+
+        tools = pysd.pysd.Tv_show_tools()
+
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            dir_path, indexed_mtime = task
+            subdirs = episodes = None
+
+            try:
+                mtime = os.stat(dir_path).st_mtime
+
+                if mtime != indexed_mtime:
+                    subdirs, episodes = self.__read_directory(tools, dir_path)
+            except Exception as e:
+                LOG.error(u"Unable to index directory '%s': %s.", dir_path, EE(e))
+                mtime = None
+
+            results.put(( dir_path, mtime, subdirs, episodes ))
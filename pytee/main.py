@@ -34,6 +34,7 @@ from pycl.core import EE, Error, LogicalError
 import pycl.gui.messages
 
 from pytee.config import Config
+from pytee.library import Library
 from pytee.main_window import MainWindow
 
 LOG = logging.getLogger("pytee.main")
@@ -70,33 +71,82 @@ def main():
         app.setWindowIcon(app_icon)
         # Setting up the application icon <--
 
+        backend = "mplayer"
+        config_storage = "sqlite"
         debug_mode = False
+        decoder_scaling = False
+        frame_reader = False
+        index_dir = None
+        shared_decoder = False
+        status_line = False
+        thumbnails = False
 
         # Parsing command line options -->
         try:
             argv = [ pycl.misc.to_unicode(arg) for arg in sys.argv ]
 
             cmd_options, cmd_args = getopt.gnu_getopt(argv[1:],
-                "dh", [ "debug-mode", "help" ] )
+                "b:c:dfhi:prst", [ "backend=", "config-storage=", "debug-mode", "decoder-scaling",
+                "frame-reader", "help", "index=", "push-updates", "shared-decoder", "thumbnails" ] )
 
             for option, value in cmd_options:
-                if option in ("-d", "--debug-mode"):
+                if option in ("-b", "--backend"):
+                    if value not in ("mplayer", "mpv"):
+                        raise Error(app.tr("Invalid player backend '{0}'."), value)
+                    backend = value
+                elif option in ("-c", "--config-storage"):
+                    if value not in ("sqlite", "journal"):
+                        raise Error(app.tr("Invalid configuration storage '{0}'."), value)
+                    config_storage = value
+                elif option in ("-d", "--debug-mode"):
                     debug_mode = True
+                elif option in ("-f", "--frame-reader"):
+                    frame_reader = True
+                elif option in ("-i", "--index"):
+                    index_dir = value
+                elif option in ("-p", "--push-updates"):
+                    status_line = True
+                elif option in ("-r", "--decoder-scaling"):
+                    decoder_scaling = True
+                elif option in ("-s", "--shared-decoder"):
+                    shared_decoder = True
+                elif option in ("-t", "--thumbnails"):
+                    thumbnails = True
                 elif option in ("-h", "--help"):
                     print app.tr(
-                        """{0} [OPTIONS] MOVIE_PATH\n\n"""
+                        """{0} [OPTIONS] MOVIE_PATH\n"""
+                         """{0} --index DIR\n\n"""
                          """Options:\n"""
-                         """ -d, --debug-mode  enable debug mode\n"""
-                         """ -h, --help        show this help"""
+                         """ -b, --backend NAME    player backend: mplayer (default) or mpv\n"""
+                         """ -c, --config-storage NAME\n"""
+                         """                       storage of movies' positions: sqlite (default)\n"""
+                         """                       or journal (an append-only file)\n"""
+                         """ -d, --debug-mode      enable debug mode\n"""
+                         """ -f, --frame-reader    read MPlayer's video output via a yuv4mpeg pipe\n"""
+                         """                       and draw it ourselves (Linux only, needs NumPy)\n"""
+                         """ -i, --index DIR       index the media library in DIR (episodes, their\n"""
+                         """                       alternatives and subtitles) and exit\n"""
+                         """ -p, --push-updates    get playing position from MPlayer's status line\n"""
+                         """                       instead of polling\n"""
+                         """ -r, --decoder-scaling scale the video to the window size while decoding\n"""
+                         """                       (with --frame-reader or on Mac OS X)\n"""
+                         """ -s, --shared-decoder  play alternative movies with the same length as\n"""
+                         """                       audio tracks for the main movie's video\n"""
+                         """ -t, --thumbnails      make movie thumbnails for seek previews in\n"""
+                         """                       background\n"""
+                         """ -h, --help            show this help"""
                     ).format(argv[0])
                     sys.exit(0)
                 else:
                     raise LogicalError()
 
-            if len(cmd_args) != 1:
+            if index_dir is not None:
+                if cmd_args:
+                    raise Error(app.tr("A movie path can't be passed along with --index."))
+            elif len(cmd_args) != 1:
                 raise Error(app.tr("You should pass a path to a movie as command line arguments."))
-
-            movie_path = cmd_args[0]
+            else:
+                movie_path = cmd_args[0]
         except Exception as e:
             raise Error(app.tr("Command line option parsing error:")).append(e)
         # Parsing command line options <--
@@ -104,7 +154,23 @@ def main():
         pycl.log.setup(debug_mode, filter = LogFilter())
 
         # Starting the application -->
-        main_window = MainWindow(Config(DATA_DIR, debug_mode))
+        config = Config(DATA_DIR, debug_mode, shared_decoder, status_line, backend,
+            frame_reader, decoder_scaling, thumbnails, config_storage)
+
+        if index_dir is not None:
+            try:
+                library = Library(config.get_library_path())
+                try:
+                    directories, read_directories = library.index(index_dir)
+                finally:
+                    library.close()
+            finally:
+                config.close()
+
+            print app.tr("{0} directories indexed ({1} of them changed).").format(directories, read_directories)
+            sys.exit(0)
+
+        main_window = MainWindow(config)
         pycl.signals.connect(main_window.close)
         if pycl.signals.received():
             sys.exit(1)
@@ -121,6 +187,9 @@ def main():
     except Exception as e:
         pycl.gui.messages.error(None, app.tr("{0} crashed").format(constants.APP_NAME), e)
         sys.exit(1)
+    finally:
+        # Writing all pending configuration changes
+        config.close()
 
     LOG.info(u"Exiting...")
     sys.exit(0)
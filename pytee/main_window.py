@@ -3,18 +3,22 @@
 import os
 import logging
 
-import pysd.pysd
-
 from PySide import QtCore, QtGui
 
 import pycl.gui.messages
 from pycl.core import EE, Error
 
 import mplayer.widget
+from mplayer.metadata import MetadataCache
+from mplayer.thumbnails import ThumbnailGenerator
 from mplayer.widget import MPlayerWidget
 from subtitles.widget import SubtitlesWidget
 
 import pytee.constants as constants
+from pytee.library import Library
+from pytee.prefetch import EpisodePrefetcher
+from pytee.related_files import RelatedFilesFinder
+from pytee.watcher import DirectoryWatcher
 
 LOG = logging.getLogger("pytee.main_window")
 
@@ -36,12 +40,39 @@ class MainWindow(QtGui.QWidget):
     """Timer for saving the config."""
 
 
+    __library = None
+    """The media library index (None if it's unavailable)."""
+
+    __metadata_cache = None
+    """Persistent cache of movies' metadata."""
+
+    __movie_path = None
+    """Path to the opened movie."""
+
+    __opening_movie = None
+    """(path, last position) of the movie which related files are being searched for."""
+
     __player = None
     """The player widget."""
 
+    __prefetcher = None
+    """Prefetcher of the opened movie's next episode."""
+
+    __related_files = None
+    """Finder of files related to the opening movie."""
+
     __subtitles = None
     """The subtitles displaying widget."""
 
+    __thumbnails = None
+    """Generator of the movie thumbnails for seek previews."""
+
+    __watcher = None
+    """Watcher of the opened movie's directory (None if it's unavailable)."""
+
+    __changed_files = None
+    """Changed files from the movie's directory which haven't been handled yet."""
+
 
     def __init__(self, config, parent = None):
         super(MainWindow, self).__init__(parent)
@@ -58,6 +89,13 @@ class MainWindow(QtGui.QWidget):
             self.__save_config_timer.timeout.connect(self._save_config)
             self.__save_config_timer.start(self.__config.get_config_saving_interval() * 1000)
 
+            self.__metadata_cache = MetadataCache(self.__config.get_metadata_cache_path())
+
+            try:
+                self.__library = Library(self.__config.get_library_path())
+            except Exception as e:
+                LOG.error(u"%s", EE(e))
+
             self.__player = MPlayerWidget()
             main_layout.addWidget(self.__player, 1)
 
@@ -68,6 +106,23 @@ class MainWindow(QtGui.QWidget):
             self.__player.pos_changed.connect(self.__subtitles.set_pos)
             self.__player.finished.connect(self.close)
 
+            self.__related_files = RelatedFilesFinder(self)
+            self.__related_files.found.connect(self._related_files_found)
+
+            self.__changed_files = set()
+            self.__prefetcher = EpisodePrefetcher(self.__config.get_library_path(), self.__metadata_cache)
+
+            try:
+                self.__watcher = DirectoryWatcher(self)
+            except Exception as e:
+                LOG.warning(u"Movie directory watching is disabled: %s", EE(e))
+            else:
+                self.__watcher.changed.connect(self._movie_dir_changed)
+
+            if self.__config.get_thumbnails_mode():
+                self.__thumbnails = ThumbnailGenerator(self.__config.get_mplayer_path(),
+                    self.__config.get_thumbnail_cache_dir(), self)
+
             self.setup_hotkeys()
             self.resize(800, 600)
 
@@ -183,41 +238,37 @@ class MainWindow(QtGui.QWidget):
             if not os.path.isfile(movie_path):
                 raise Error(self.tr("The movie path '{0}' points to non-file object."), movie_path)
 
-            alternatives = []
-            subtitles = []
-
-            try:
-                alternatives, subtitles = self.__find_related_media_files(movie_path)
-            except Exception as e:
-                LOG.error(u"%s", Error(self.tr("Unable to get the movie's info:")).append(e))
+            related_files = None
 
+            if self.__library is not None:
                 try:
-                    movie_dir = os.path.dirname(movie_path)
-                    file_name_prefix = os.path.splitext(os.path.basename(movie_path))[0]
-                    subtitle_extensions = [ ext[1:] for ext in pysd.pysd.SUBTITLE_EXTENSIONS ]
-
-                    for file_name in os.listdir(movie_dir):
-                        if (
-                            file_name.lower().startswith(file_name_prefix.lower()) and
-                            os.path.splitext(file_name)[1].lower() in subtitle_extensions
-                        ):
-                            subtitles.append(( os.path.join(movie_dir, file_name), "unknown" ))
+                    related_files = self.__library.find_related_files(movie_path)
                 except Exception as e:
-                    LOG.error(u"Unable to find the movie's subtitles. "
-                        "Error while reading the movie directory '%s': %s.", movie_dir, EE(e))
+                    LOG.error(u"%s", Error("Unable to query the media library:").append(e))
 
-            LOG.debug(u"Found alternative movies: %s.", alternatives)
-            LOG.debug(u"Found subtitles: %s.", subtitles)
+            self.__opening_movie = ( movie_path, last_pos )
 
-            self.__subtitles.open(subtitles)
-            self.__player.open(self.__config.get_mplayer_path(),
-                movie_path, alternatives, last_pos)
-            self.setWindowTitle(u"{0} - {1}".format(constants.APP_NAME, movie_path))
+            if related_files is None:
+                # The movie isn't indexed or the index is outdated
+                self.__related_files.find(movie_path)
+            else:
+                self._related_files_found(movie_path, *related_files)
         except Exception as e:
             self.close()
             pycl.gui.messages.warning(self, self.tr("Unable to play the movie"), e)
 
 
+    def _movie_dir_changed(self, paths):
+        """Called when files in the opened movie's directory are changed."""
+
+        if self.__movie_path is None:
+            return
+
+        # Finding out which of the files are the movie's subtitles
+        self.__changed_files.update(paths)
+        self.__related_files.find(self.__movie_path)
+
+
     def _open_failed(self, error):
         """Called when the player failed to open a movie."""
 
@@ -225,6 +276,55 @@ class MainWindow(QtGui.QWidget):
         self.close()
 
 
+    def _related_files_found(self, movie_path, alternatives, subtitles):
+        """Called when the opening or opened movie's related files are found."""
+
+        if self.__opening_movie is None or self.__opening_movie[0] != movie_path:
+            if movie_path == self.__movie_path:
+                LOG.debug(u"Refreshing subtitles: %s.", subtitles)
+                self.__subtitles.refresh(subtitles, self.__changed_files)
+                self.__changed_files = set()
+            else:
+                LOG.debug(u"Ignoring related files of '%s'.", movie_path)
+
+            return
+
+        movie_path, last_pos = self.__opening_movie
+        self.__opening_movie = None
+
+        try:
+            LOG.debug(u"Found alternative movies: %s.", alternatives)
+            LOG.debug(u"Found subtitles: %s.", subtitles)
+
+            self.__subtitles.open(subtitles)
+            self.__player.open(self.__config.get_player_path(),
+                movie_path, alternatives, last_pos,
+                shared_decoder = self.__config.get_shared_decoder_mode(),
+                status_line = self.__config.get_status_line_mode(),
+                backend = self.__config.get_player_backend(),
+                frame_reader = self.__config.get_frame_reader_mode(),
+                decoder_scaling = self.__config.get_decoder_scaling_mode(),
+                metadata_cache = self.__metadata_cache)
+            self.setWindowTitle(u"{0} - {1}".format(constants.APP_NAME, movie_path))
+
+            if self.__thumbnails is not None:
+                self.__thumbnails.generate(movie_path)
+        except Exception as e:
+            self.close()
+            pycl.gui.messages.warning(self, self.tr("Unable to play the movie"), e)
+            return
+
+        self.__movie_path = movie_path
+        self.__changed_files = set()
+        self.__prefetcher.prefetch(movie_path)
+
+        if self.__watcher is not None:
+            try:
+                self.__watcher.watch(os.path.dirname(movie_path))
+            except Exception as e:
+                LOG.error(u"%s", EE(e))
+
+
     def _save_config(self):
         """Saves all configuration data."""
 
@@ -248,6 +348,14 @@ class MainWindow(QtGui.QWidget):
         """Frees all allocated resources and stops all running processes."""
 
         self.setWindowTitle(constants.APP_NAME)
+        self.__opening_movie = None
+        self.__movie_path = None
+
+        if self.__watcher is not None:
+            self.__watcher.stop()
+
+        if self.__prefetcher is not None:
+            self.__prefetcher.stop()
 
         if self.__save_config_timer is not None:
             self.__save_config_timer.stop()
@@ -258,44 +366,10 @@ class MainWindow(QtGui.QWidget):
         if self.__player is not None:
             self.__player.close()
 
+        if self.__thumbnails is not None:
+            self.__thumbnails.stop()
 
-    def __find_related_media_files(self, movie_path):
-        """
-        Finds files related to the movie: the same episode with another
-        translation and subtitle files.
-        """
-
-        tools = pysd.pysd.Tv_show_tools()
-        movie_path = os.path.abspath(movie_path)
-        movie_file_name = os.path.basename(movie_path)
-        movie_dir_path = os.path.dirname(movie_path)
-        movie_names, movie_season, movie_episode, movie_delimiter, movie_extra_info = \
-            tools.get_info_from_filename(movie_file_name)
-        movie_names = set(movie_names)
-
-        media_extensions = set(( ext[1:] for ext in pysd.pysd.MEDIA_EXTENSIONS ))
-        subtitle_extensions = set(( ext[1:] for ext in pysd.pysd.SUBTITLE_EXTENSIONS ))
-        extensions = media_extensions | subtitle_extensions
-
-        alternatives = []
-        subtitles = []
-
-        for file_name in os.listdir(movie_dir_path):
-            path = os.path.join(movie_dir_path, file_name)
-            extension = os.path.splitext(file_name)[1].lower()
-
-            if file_name != movie_file_name and extension in extensions and os.path.isfile(path):
-                try:
-                    names, season, episode, delimiter, extra_info = tools.get_info_from_filename(file_name)
-                    names = set(names)
-                except pysd.pysd.Not_found:
-                    continue
-
-                if movie_names.intersection(names) and movie_season == season and movie_episode == episode:
-                    if extension in subtitle_extensions:
-                        subtitles.append((path, extra_info))
-                    else:
-                        alternatives.append(path)
-
-        return alternatives, subtitles
+        if self.__library is not None:
+            self.__library.close()
+            self.__library = None
 
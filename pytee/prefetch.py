@@ -0,0 +1,184 @@
+"""Provides background prefetching of the next episode."""
+
+import ctypes
+import logging
+import os
+import threading
+import time
+
+from pycl import constants
+from pycl.core import EE, Error
+
+import subtitles.reader as subtitle_reader
+
+from pytee.library import Library
+
+try:
+    libc = ctypes.CDLL("libc.so.6", use_errno = True)
+    # Checking that the libc supports posix_fadvise()
+    libc.posix_fadvise64
+except (OSError, AttributeError):
+    libc = None
+
+LOG = logging.getLogger("pytee.prefetch")
+
+
+PREFETCH_DELAY = 30
+"""
+Time in seconds after the movie opening after which we start prefetching (to
+not compete with the movie start for I/O).
+"""
+
+PREFETCH_SECONDS = 3 * constants.MINUTE_SECONDS
+"""Length of the next episode's beginning which is prefetched."""
+
+DEFAULT_PREFETCH_SIZE = 64 * constants.MEGABYTE
+"""Size of the prefetched beginning when the movie bitrate is unknown."""
+
+IDLE_NICENESS = 19
+"""Niceness of the prefetching thread."""
+
+POSIX_FADV_WILLNEED = 3
+"""posix_fadvise() constants."""
+
+
+def advise_will_need(path, size):
+    """
+    Tells the kernel that the first size bytes of the file will be needed
+    soon, so it reads them into the page cache in background.
+    """
+
+    if libc is None:
+        raise Error("posix_fadvise() is not supported on this platform.")
+
+    fd = os.open(path, os.O_RDONLY)
+
+    try:
+        # posix_fadvise() returns an error number instead of setting errno
+        error = libc.posix_fadvise64(fd, ctypes.c_int64(0), ctypes.c_int64(size), POSIX_FADV_WILLNEED)
+        if error:
+            raise Error("posix_fadvise() failed: {0}.", os.strerror(error))
+    finally:
+        os.close(fd)
+
+
+class EpisodePrefetcher:
+    """
+    Finds the next episode of the opened movie and warms everything that is
+    needed for opening it in background with idle priority.
+
+    pytee exits when a movie finishes, so the next episode is opened by
+    another process, and only persistent caches are warmed: the library
+    index (the next episode's alternatives and subtitles are resolved by it)
+    and the kernel's page cache (the subtitle files are read and parsed, and
+    the movie's beginning is read ahead via posix_fadvise()).
+    """
+
+    __library_path = None
+    """Path to the media library index database."""
+
+    __metadata_cache = None
+    """Persistent cache of movies' metadata."""
+
+    __generation = 0
+    """Number of the current prefetching job (used for cancelling of old jobs)."""
+
+
+    def __init__(self, library_path, metadata_cache):
+        self.__library_path = library_path
+        self.__metadata_cache = metadata_cache
+
+
+    def prefetch(self, movie_path):
+        """Starts prefetching of the movie's next episode cancelling the previous job."""
+
+        self.__generation += 1
+
+        prefetcher = threading.Thread(name = "Episode prefetcher",
+            target = self.__prefetch, args = (self.__generation, os.path.abspath(movie_path)))
+        prefetcher.daemon = True
+        prefetcher.start()
+
+
+    def stop(self):
+        """Cancels the current job."""
+
+        self.__generation += 1
+
+
+    def __cancelled(self, generation):
+        """Returns True if the job has been cancelled."""
+
+        return generation != self.__generation
+
+
+    def __get_prefetch_size(self, movie_path, next_path):
+        """Returns size of the next episode's beginning which should be prefetched."""
+
+        # Episodes of one show usually have close bitrates
+        for path in (next_path, movie_path):
+            metadata = self.__metadata_cache.get(path)
+
+            if metadata is not None and metadata["length"]:
+                bitrate = float(os.path.getsize(path)) / metadata["length"]
+                return int(bitrate * PREFETCH_SECONDS * 1000)
+
+        return DEFAULT_PREFETCH_SIZE
+
+
+    def __prefetch(self, generation, movie_path):
+        """The prefetching thread's main function."""
+
+        try:
+            time.sleep(PREFETCH_DELAY)
+            if self.__cancelled(generation):
+                return
+
+            # On Linux it changes the priority of the current thread only (and
+            # the threads it starts), but on other platforms it changes the
+            # priority of the whole process (libc is loaded only on Linux).
+            if libc is not None:
+                os.nice(IDLE_NICENESS)
+
+            start_time = time.time()
+            library = Library(self.__library_path)
+
+            try:
+                # Nothing is read if the directory hasn't been changed since
+                # the last indexing. Subdirectories aren't indexed, because
+                # the movie may be in a huge tree like ~/Downloads.
+                library.index(os.path.dirname(movie_path), recursive = False)
+
+                next_path = library.find_next_episode(movie_path)
+                if next_path is None:
+                    LOG.debug(u"There is no next episode for '%s'.", movie_path)
+                    return
+
+                alternatives, subtitles = library.find_related_files(next_path) or ( [], [] )
+            finally:
+                library.close()
+
+            LOG.debug(u"Prefetching the next episode '%s' (alternatives: %s, subtitles: %s)...",
+                next_path, alternatives, subtitles)
+
+            for path, language in subtitles:
+                if self.__cancelled(generation):
+                    return
+
+                try:
+                    subtitle_reader.read(path, language)
+                except Exception as e:
+                    LOG.debug(u"Unable to prefetch subtitles '%s': %s", path, EE(e))
+
+            if self.__cancelled(generation):
+                return
+
+            if libc is None:
+                LOG.debug(u"posix_fadvise() is not supported, so the movie file isn't prefetched.")
+            else:
+                advise_will_need(next_path, self.__get_prefetch_size(movie_path, next_path))
+
+            LOG.debug(u"The next episode '%s' has been prefetched in %.1f seconds.",
+                next_path, time.time() - start_time)
+        except Exception as e:
+            LOG.error(u"%s", Error("Unable to prefetch the next episode of '{0}':", movie_path).append(e))
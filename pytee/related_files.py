@@ -0,0 +1,322 @@
+"""Provides asynchronous discovery of files related to a movie."""
+
+import collections
+import logging
+import os
+import Queue
+import threading
+
+try:
+    # Gets file types from readdir(), so we don't have to stat() every file
+    from scandir import scandir
+except ImportError:
+    scandir = None
+
+import pysd.pysd
+
+from PySide import QtCore
+
+from pycl.core import EE, Error
+
+LOG = logging.getLogger("pytee.related_files")
+
+
+FILE_INFO_CACHE_SIZE = 10000
+"""Maximum number of file names whose parsed info is cached."""
+
+DIRECTORY_CACHE_SIZE = 100
+"""Maximum number of directories whose listings are cached."""
+
+
+def list_files(dir_path, extensions, subdirs = None):
+    """
+    Returns a list of (name, extension) of regular files in the directory
+    which have one of the extensions (lowercase, with a leading dot).
+
+    If subdirs is a list, names of the directory's subdirectories (except
+    symbolic links) are appended to it.
+
+    Files are filtered by extension before any stat() call, and if the
+    scandir module is available, the file type is taken from the directory
+    entry itself, so on most file systems nothing is stat()ed at all (it
+    matters on network file systems where every stat() is a round trip).
+    """
+
+    files = []
+
+    if scandir is None:
+        for file_name in os.listdir(dir_path):
+            path = os.path.join(dir_path, file_name)
+            extension = os.path.splitext(file_name)[1].lower()
+
+            if extension in extensions and os.path.isfile(path):
+                files.append(( file_name, extension ))
+            elif subdirs is not None and os.path.isdir(path) and not os.path.islink(path):
+                subdirs.append(file_name)
+    else:
+        for entry in scandir(dir_path):
+            extension = os.path.splitext(entry.name)[1].lower()
+
+            if extension in extensions and entry.is_file():
+                files.append(( entry.name, extension ))
+            elif subdirs is not None and entry.is_dir(follow_symlinks = False):
+                subdirs.append(entry.name)
+
+    return files
+
+
+class _LruCache:
+    """
+    A cache which forgets the least recently used items (it's used instead of
+    collections.OrderedDict which needs Python 2.7).
+    """
+
+    __size = None
+    """Maximum number of the cached items."""
+
+    __items = None
+    """The cached items: key -> (number of the last access, value)."""
+
+    __accesses = None
+    """Queue of (access number, key) of the items' accesses in their order."""
+
+    __access_number = 0
+    """Number of the last access."""
+
+
+    def __init__(self, size):
+        self.__size = size
+        self.__items = {}
+        self.__accesses = collections.deque()
+
+
+    def __getitem__(self, key):
+        value = self.__items[key][1]
+        self.__touch(key, value)
+        return value
+
+
+    def __setitem__(self, key, value):
+        self.__touch(key, value)
+
+        while len(self.__items) > self.__size:
+            access_number, key = self.__accesses.popleft()
+            if self.__items[key][0] == access_number:
+                del self.__items[key]
+
+        # Dropping the outdated accesses, so the queue doesn't grow infinitely
+        if len(self.__accesses) > 2 * self.__size:
+            self.__accesses = collections.deque(sorted(
+                ( access_number, key ) for key, ( access_number, value ) in self.__items.iteritems() ))
+
+
+    def __touch(self, key, value):
+        """Marks the item as the most recently used one."""
+
+        self.__access_number += 1
+        self.__items[key] = ( self.__access_number, value )
+        self.__accesses.append(( self.__access_number, key ))
+
+
+
+class RelatedFilesFinder(QtCore.QObject):
+    """
+    Finds files related to a movie (the same episode with another
+    translation and subtitle files) in a worker thread.
+
+    Info parsed from file names is cached in an LRU cache keyed by file name
+    and listings of directories are cached until the directory modification
+    time changes, so opening another episode from the same directory doesn't
+    read and parse the directory again.
+
+    The caches live only in the process memory and are lost on exit. pytee
+    usually plays one movie per process, so they mostly help when the
+    opened movie's directory changes and its related files are searched
+    again. Across launches, related files come from the persistent Library
+    index, which MainWindow queries before this finder. The finder is used
+    only when the movie isn't indexed or its directory has changed.
+    """
+
+    found = QtCore.Signal(str, object, object)
+    """
+    Emitted from the worker thread with a movie path, a list of alternative
+    movies and a list of (path, language) of subtitle files.
+    """
+
+
+    __queue = None
+    """Queue of movies which related files should be found."""
+
+    __worker = None
+    """The worker thread."""
+
+    __tools = None
+    """pysd's TV show tools (used only by the worker thread)."""
+
+    __file_infos = None
+    """
+    LRU cache of info parsed from file names: file name -> (names, season,
+    episode, extra info) or None if the file name can't be parsed.
+    """
+
+    __directories = None
+    """
+    LRU cache of directory listings: path -> (modification time, media file
+    names, subtitle file names).
+    """
+
+
+    def __init__(self, parent = None):
+        super(RelatedFilesFinder, self).__init__(parent)
+
+        self.__queue = Queue.Queue()
+        self.__file_infos = _LruCache(FILE_INFO_CACHE_SIZE)
+        self.__directories = _LruCache(DIRECTORY_CACHE_SIZE)
+
+
+    def find(self, movie_path):
+        """Starts searching for the movie's related files."""
+
+        if self.__worker is None:
+            self.__worker = threading.Thread(name = "Related files finder", target = self.__work)
+            self.__worker.daemon = True
+            self.__worker.start()
+
+        self.__queue.put(os.path.abspath(movie_path))
+
+
+    def __find(self, movie_path):
+        """
+        Finds files related to the movie: the same episode with another
+        translation and subtitle files.
+        """
+
+        movie_file_name = os.path.basename(movie_path)
+        movie_dir_path = os.path.dirname(movie_path)
+
+        movie_info = self.__get_file_info(movie_file_name)
+        if movie_info is None:
+            raise Error("Unable to parse the movie's file name.")
+
+        movie_names, movie_season, movie_episode, movie_extra_info = movie_info
+        media_files, subtitle_files = self.__get_directory(movie_dir_path)
+
+        alternatives = []
+        subtitles = []
+
+        for file_names, is_subtitles in (( media_files, False ), ( subtitle_files, True )):
+            for file_name in file_names:
+                if file_name == movie_file_name:
+                    continue
+
+                info = self.__get_file_info(file_name)
+                if info is None:
+                    continue
+
+                names, season, episode, extra_info = info
+
+                if movie_names.intersection(names) and movie_season == season and movie_episode == episode:
+                    path = os.path.join(movie_dir_path, file_name)
+
+                    if is_subtitles:
+                        subtitles.append((path, extra_info))
+                    else:
+                        alternatives.append(path)
+
+        return alternatives, subtitles
+
+
+    def __find_subtitles(self, movie_path):
+        """Finds subtitle files which names start with the movie's file name."""
+
+        movie_dir_path = os.path.dirname(movie_path)
+        file_name_prefix = os.path.splitext(os.path.basename(movie_path))[0].lower()
+
+        return [
+            ( os.path.join(movie_dir_path, file_name), "unknown" )
+            for file_name in self.__get_directory(movie_dir_path)[1]
+            if file_name.lower().startswith(file_name_prefix)
+        ]
+
+
+    def __get_directory(self, dir_path):
+        """Returns a tuple of media and subtitle file names from the directory."""
+
+        mtime = os.stat(dir_path).st_mtime
+
+        try:
+            listing = self.__directories[dir_path]
+        except KeyError:
+            listing = None
+
+        if listing is None or listing[0] != mtime:
+            media_extensions = set(( ext[1:] for ext in pysd.pysd.MEDIA_EXTENSIONS ))
+            subtitle_extensions = set(( ext[1:] for ext in pysd.pysd.SUBTITLE_EXTENSIONS ))
+
+            media_files = []
+            subtitle_files = []
+
+            for file_name, extension in list_files(dir_path, media_extensions | subtitle_extensions):
+                if extension in subtitle_extensions:
+                    subtitle_files.append(file_name)
+                else:
+                    media_files.append(file_name)
+
+            listing = ( mtime, media_files, subtitle_files )
+            LOG.debug(u"Directory '%s' has been read: %s media files, %s subtitle files.",
+                dir_path, len(media_files), len(subtitle_files))
+
+            self.__directories[dir_path] = listing
+
+        return listing[1:]
+
+
+    def __get_file_info(self, file_name):
+        """
+        Returns (names, season, episode, extra info) parsed from the file name
+        or None if it can't be parsed.
+        """
+
+        try:
+            info = self.__file_infos[file_name]
+        except KeyError:
+            if self.__tools is None:
+                self.__tools = pysd.pysd.Tv_show_tools()
+
+            try:
+                names, season, episode, delimiter, extra_info = self.__tools.get_info_from_filename(file_name)
+            except pysd.pysd.Not_found:
+                info = None
+            else:
+                info = ( frozenset(names), season, episode, extra_info )
+
+            self.__file_infos[file_name] = info
+
+        return info
+
+
+    def __work(self):
+        """The worker thread's main function."""
+
+        while True:
+            movie_path = self.__queue.get()
+
+            # The movie has already been replaced by another one
+            if not self.__queue.empty():
+                continue
+
+            alternatives = []
+            subtitles = []
+
+            try:
+                alternatives, subtitles = self.__find(movie_path)
+            except Exception as e:
+                LOG.error(u"%s", Error("Unable to get the movie's info:").append(e))
+
+                try:
+                    subtitles = self.__find_subtitles(movie_path)
+                except Exception as e:
+                    LOG.error(u"Unable to find the movie's subtitles. "
+                        "Error while reading the movie directory '%s': %s.", os.path.dirname(movie_path), EE(e))
+
+            self.found.emit(movie_path, alternatives, subtitles)
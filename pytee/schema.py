@@ -0,0 +1,22 @@
+"""Provides upgrading of SQLite database schemas."""
+
+import logging
+
+LOG = logging.getLogger("pytee.schema")
+
+
+def migrate(db, migrations):
+    """Upgrades the database schema to the current version.
+
+    migrations is a sequence of SQL scripts: migration N upgrades the schema
+    (stored in user_version) from version N to version N + 1.
+    """
+
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+
+    for version in xrange(version, len(migrations)):
+        LOG.info(u"Upgrading the database schema to version %s...", version + 1)
+
+        # Running the migration and the version change in one transaction
+        db.executescript("BEGIN; {0} PRAGMA user_version = {1}; COMMIT;".format(
+            migrations[version], version + 1))
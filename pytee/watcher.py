@@ -0,0 +1,193 @@
+"""Provides watching of a directory for file changes via inotify (Linux only)."""
+
+import ctypes
+import errno
+import logging
+import os
+import struct
+
+from PySide import QtCore
+
+import pycl.misc
+
+from pycl.core import EE, Error
+
+try:
+    libc = ctypes.CDLL("libc.so.6", use_errno = True)
+    # Checking that the libc supports inotify
+    libc.inotify_init1
+except (OSError, AttributeError):
+    libc = None
+
+LOG = logging.getLogger("pytee.watcher")
+
+
+DEBOUNCE_INTERVAL = 500
+"""
+Time in milliseconds during which there should be no file changes to report
+them (editors and downloaders write files in bursts).
+"""
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+"""inotify constants."""
+
+_EVENT_HEADER = struct.Struct("iIII")
+"""inotify_event structure without the file name."""
+
+
+class DirectoryWatcher(QtCore.QObject):
+    """
+    Watches a directory for new, changed and removed files.
+
+    Only completely written files are reported: files which are closed after
+    writing and files which are moved (or atomically saved) into the
+    directory. Files which are deleted or moved out of the directory are
+    reported too. Changes are collected until there are no new ones during
+    DEBOUNCE_INTERVAL and then are reported at once.
+    """
+
+    changed = QtCore.Signal(object)
+    """Emitted with a list of paths to new, changed and removed files."""
+
+
+    __fd = None
+    """inotify file descriptor."""
+
+    __notifier = None
+    """Notifies about inotify events availability."""
+
+    __debounce_timer = None
+    """Timer which reports the collected changes."""
+
+    __dir_path = None
+    """Path to the watching directory."""
+
+    __watch = None
+    """inotify watch descriptor of the watching directory."""
+
+    __changes = None
+    """Paths to the changed files which haven't been reported yet."""
+
+
+    def __init__(self, parent = None):
+        super(DirectoryWatcher, self).__init__(parent)
+
+        self.__changes = set()
+
+        if libc is None:
+            raise Error("inotify is not supported on this platform.")
+
+        self.__fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.__fd < 0:
+            raise Error("Unable to initialize inotify: {0}.", os.strerror(ctypes.get_errno()))
+
+        self.__notifier = QtCore.QSocketNotifier(self.__fd, QtCore.QSocketNotifier.Read, self)
+        self.__notifier.activated.connect(self._events_ready)
+
+        self.__debounce_timer = QtCore.QTimer(self)
+        self.__debounce_timer.setSingleShot(True)
+        self.__debounce_timer.timeout.connect(self._report_changes)
+
+
+    def __del__(self):
+        self.close()
+
+
+    def close(self):
+        """Stops watching and frees all allocated resources."""
+
+        self.stop()
+
+        if self.__notifier is not None:
+            self.__notifier.setEnabled(False)
+            self.__notifier.deleteLater()
+            self.__notifier = None
+
+        if self.__fd is not None:
+            try:
+                pycl.misc.syscall_wrapper(os.close, self.__fd)
+            except Exception as e:
+                LOG.error(u"Unable to close inotify file descriptor: %s.", EE(e))
+            finally:
+                self.__fd = None
+
+
+    def stop(self):
+        """Stops watching the directory."""
+
+        if self.__watch is not None:
+            if libc.inotify_rm_watch(self.__fd, self.__watch) < 0:
+                LOG.debug(u"Unable to remove inotify watch of '%s': %s.",
+                    self.__dir_path, os.strerror(ctypes.get_errno()))
+
+            self.__watch = None
+
+        self.__dir_path = None
+        self.__changes.clear()
+
+        if self.__debounce_timer is not None:
+            self.__debounce_timer.stop()
+
+
+    def watch(self, dir_path):
+        """Starts watching the directory (instead of the previous one)."""
+
+        self.stop()
+
+        path = dir_path.encode("utf-8") if isinstance(dir_path, unicode) else dir_path
+        watch = libc.inotify_add_watch(self.__fd, path, IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM)
+        if watch < 0:
+            raise Error("Unable to watch directory '{0}': {1}.", dir_path, os.strerror(ctypes.get_errno()))
+
+        self.__dir_path = dir_path
+        self.__watch = watch
+        LOG.debug(u"Watching directory '%s' for changes.", dir_path)
+
+
+    def _events_ready(self):
+        """Called when inotify events are available for reading."""
+
+        while True:
+            try:
+                data = pycl.misc.syscall_wrapper(os.read, self.__fd, 64 * 1024)
+            except EnvironmentError as e:
+                if e.errno != errno.EAGAIN:
+                    LOG.error(u"Unable to read inotify events: %s.", EE(e))
+                break
+
+            if not data:
+                break
+
+            offset = 0
+
+            while offset < len(data):
+                watch, mask, cookie, name_size = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + name_size].rstrip("\0")
+                offset += name_size
+
+                if mask & IN_Q_OVERFLOW:
+                    LOG.warning(u"inotify event queue of '%s' has overflowed.", self.__dir_path)
+                elif watch == self.__watch and name:
+                    self.__changes.add(os.path.join(self.__dir_path, pycl.misc.to_unicode(name)))
+
+        if self.__changes:
+            # Restarting the timer on every change
+            self.__debounce_timer.start(DEBOUNCE_INTERVAL)
+
+
+    def _report_changes(self):
+        """Reports the collected changes."""
+
+        changes = sorted(self.__changes)
+        self.__changes.clear()
+
+        if changes:
+            LOG.debug(u"Files changed: %s.", changes)
+            self.changed.emit(changes)
@@ -1,6 +1,7 @@
 """Provides a Qt widgets for displaying movie's subtitles."""
 
 import logging
+import threading
 
 from PySide import QtCore, QtGui
 
@@ -17,12 +18,23 @@ LOG = logging.getLogger("subtitles.widget")
 class SubtitlesWidget(QtGui.QWidget):
     """A Qt widget for displaying a set of movie's subtitles."""
 
+    _read_signal = QtCore.Signal(int, object, object)
+    """
+    Emitted from a reading thread with the number of the opened subtitle set,
+    a list of (path, language, subtitle data or None) of read files and a
+    list of (path, error) of files which haven't been read.
+    """
+
+
     __cur_pos = 0
     """Current position in the playing movie."""
 
     __subtitles = None
     """Subtitles to display."""
 
+    __paths = None
+    """Paths to the subtitle files which should be displayed."""
+
     __cur_text = None
     """QLabel with text of a current subtitle."""
 
@@ -32,6 +44,9 @@ class SubtitlesWidget(QtGui.QWidget):
     __subtitle_widgets = None
     """Widgets that displays subtitles."""
 
+    __generation = 0
+    """Number of the opened subtitle set (used for ignoring outdated reading results)."""
+
 
     def __init__(self, parent = None):
         QtGui.QWidget.__init__(self, parent)
@@ -42,6 +57,7 @@ class SubtitlesWidget(QtGui.QWidget):
         self.setLayout(main_layout)
 
         self.__subtitles = []
+        self.__paths = set()
 
         # Text of a current subtitle -->
         self.__cur_text = QtGui.QLabel()
@@ -60,17 +76,18 @@ class SubtitlesWidget(QtGui.QWidget):
 
         self.__subtitle_widgets = []
 
+        self._read_signal.connect(self._subtitles_read)
+
 
     def close(self):
         """Closes previously opened subtitles."""
 
+        self.__generation += 1
         self.__cur_pos = 0
         self.__subtitles = []
+        self.__paths = set()
         self.__cur_text.setText("")
-
-        for widget in self.__subtitle_widgets:
-            self.__subtitle_layout.removeWidget(widget)
-        self.__subtitle_widgets = []
+        self.__remove_widgets()
 
         self.setVisible(False)
 
@@ -82,52 +99,59 @@ class SubtitlesWidget(QtGui.QWidget):
         """
 
         self.close()
+        self.__paths = set(path for path, language in subtitles)
 
         # Reading the subtitle files -->
         errors = []
+        opened = []
 
-        for subtitle in sorted(subtitles, cmp = self.__subtitle_cmp):
+        for path, language in subtitles:
             try:
-                subtitle_data = subtitle_reader.read(*subtitle)
+                subtitle_data = subtitle_reader.read(path, language)
             except Exception as e:
                 errors.append(EE(e))
             else:
-                self.__subtitles.append({
-                    "cur_id":    -1,
-                    "find_from": -1,
-                    "data":      subtitle_data
-                })
+                opened.append(( path, language, subtitle_data ))
 
         if errors:
             pycl.gui.messages.warning(self,
                 self.tr("Unable to open subtitles"), "\n".join(errors), block = False )
         # Reading the subtitle files <--
 
-        # Choosing the proper alignment -->
-        if len(self.__subtitles) == 3:
-            alignment = (
-                QtCore.Qt.AlignRight,
-                QtCore.Qt.AlignCenter,
-                QtCore.Qt.AlignLeft
-            )
-        elif len(self.__subtitles) == 2:
-            alignment = (
-                QtCore.Qt.AlignRight,
-                QtCore.Qt.AlignLeft
-            )
-        else:
-            alignment = ( QtCore.Qt.AlignCenter for i in xrange(0, len(self.__subtitles)) )
-        # Choosing the proper alignment <--
+        self.__show(opened)
 
-        # Creating the widgets -->
-        for subtitle, text_alignment in zip(self.__subtitles, alignment):
-            widget = SubtitleWidget(subtitle["data"], text_alignment)
-            self.__subtitle_widgets.append(widget)
-            self.__subtitle_layout.addWidget(widget)
-        # Creating the widgets <--
 
-        self.__update(self.__cur_pos)
-        self.setVisible(bool(self.__subtitles))
+    def refresh(self, subtitles, changed_paths):
+        """
+        Adds new subtitles, removes the gone ones and re-reads the changed
+        ones in background without interrupting displaying of the current
+        subtitles. If a changed file can't be read, its old version stays
+        displayed and the user is warned.
+
+        subtitles -- a list of tuples (subtitle_path, subtitle_language)
+        changed_paths -- paths to the subtitle files that have been changed
+        """
+
+        self.__paths = set(path for path, language in subtitles)
+
+        if any(subtitle["path"] not in self.__paths for subtitle in self.__subtitles):
+            LOG.debug(u"Removing subtitles which files have gone...")
+            self.__show([
+                ( subtitle["path"], subtitle["language"], subtitle["data"] )
+                for subtitle in self.__subtitles if subtitle["path"] in self.__paths ])
+
+        opened = set(subtitle["path"] for subtitle in self.__subtitles)
+        subtitles = [
+            ( path, language ) for path, language in subtitles
+            if path not in opened or path in changed_paths ]
+
+        if not subtitles:
+            return
+
+        reader = threading.Thread(name = "Subtitles reader",
+            target = self.__read, args = (self.__generation, subtitles))
+        reader.daemon = True
+        reader.start()
 
 
     def set_pos(self, cur_pos):
@@ -138,6 +162,38 @@ class SubtitlesWidget(QtGui.QWidget):
             self.__cur_pos = cur_pos
 
 
+    def _subtitles_read(self, generation, subtitles, errors):
+        """Called when subtitles have been read in background."""
+
+        if generation != self.__generation:
+            LOG.debug(u"Ignoring outdated subtitles.")
+            return
+
+        # The subtitles may have been removed while reading
+        errors = [ error for path, error in errors if path in self.__paths ]
+        if errors:
+            pycl.gui.messages.warning(self,
+                self.tr("Unable to open subtitles"), "\n".join(errors), block = False )
+
+        read = dict(
+            ( path, ( language, data ) ) for path, language, data in subtitles
+            if data is not None and path in self.__paths)
+        if not read:
+            return
+
+        opened = []
+
+        for subtitle in self.__subtitles:
+            language, data = read.pop(subtitle["path"], ( subtitle["language"], subtitle["data"] ))
+            opened.append(( subtitle["path"], language, data ))
+
+        for path, ( language, data ) in read.iteritems():
+            opened.append(( path, language, data ))
+
+        LOG.debug(u"Swapping in the re-read subtitles...")
+        self.__show(opened)
+
+
     def __lookup(self, subtitles, pos, find_from = -1):
         """Finds a subtitle for the specified position.
 
@@ -162,6 +218,77 @@ class SubtitlesWidget(QtGui.QWidget):
         return (-1, min(max(0, cur_id), len(subtitles) - 1))
 
 
+    def __read(self, generation, subtitles):
+        """The subtitle reading thread's main function."""
+
+        read = []
+        errors = []
+
+        for path, language in subtitles:
+            try:
+                data = subtitle_reader.read(path, language)
+            except Exception as e:
+                # The file may be still being written, so the old version of
+                # the subtitles stays displayed.
+                errors.append(( path, EE(e) ))
+                data = None
+
+            read.append(( path, language, data ))
+
+        self._read_signal.emit(generation, read, errors)
+
+
+    def __remove_widgets(self):
+        """Removes all subtitle widgets."""
+
+        for widget in self.__subtitle_widgets:
+            self.__subtitle_layout.removeWidget(widget)
+            widget.setParent(None)
+        self.__subtitle_widgets = []
+
+
+    def __show(self, subtitles):
+        """Displays the subtitles (a list of (path, language, subtitle data))."""
+
+        subtitles = sorted(subtitles, cmp = lambda a, b: self.__subtitle_cmp(a[:2], b[:2]))
+
+        self.__subtitles = [{
+            "path":      path,
+            "language":  language,
+            "cur_id":    -1,
+            "find_from": -1,
+            "data":      subtitle_data
+        } for path, language, subtitle_data in subtitles ]
+
+        # Choosing the proper alignment -->
+        if len(self.__subtitles) == 3:
+            alignment = (
+                QtCore.Qt.AlignRight,
+                QtCore.Qt.AlignCenter,
+                QtCore.Qt.AlignLeft
+            )
+        elif len(self.__subtitles) == 2:
+            alignment = (
+                QtCore.Qt.AlignRight,
+                QtCore.Qt.AlignLeft
+            )
+        else:
+            alignment = ( QtCore.Qt.AlignCenter for i in xrange(0, len(self.__subtitles)) )
+        # Choosing the proper alignment <--
+
+        # Creating the widgets -->
+        self.__remove_widgets()
+
+        for subtitle, text_alignment in zip(self.__subtitles, alignment):
+            widget = SubtitleWidget(subtitle["data"], text_alignment)
+            self.__subtitle_widgets.append(widget)
+            self.__subtitle_layout.addWidget(widget)
+        # Creating the widgets <--
+
+        self.__update(self.__cur_pos)
+        self.setVisible(bool(self.__subtitles))
+
+
     def __subtitle_cmp(self, a, b):
         """Used to sort the subtitle list."""
 
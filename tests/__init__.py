@@ -0,0 +1 @@
+"""pytee tests."""
@@ -0,0 +1,192 @@
+"""Tests for the mpv backend which is run against a fake mpv IPC server."""
+
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+import unittest
+
+try:
+    from PySide import QtCore
+except ImportError:
+    QtCore = None
+else:
+    from mplayer.mpv import Mpv
+
+
+TIMEOUT = 10
+"""Time in seconds during which the player should react to the fake server."""
+
+_FAKE_MPV = """
+import json, socket, sys
+
+args = sys.argv[1:]
+socket_path = [ arg for arg in args if arg.startswith("--input-ipc-server=") ][0].split("=", 1)[1]
+
+with open(args[-1]) as scenario_file:
+    scenario = json.load(scenario_file)
+
+properties = scenario["properties"]
+properties["pause"] = "--pause" in args
+
+server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+server.bind(socket_path)
+server.listen(1)
+connection = server.accept()[0]
+
+def send(message):
+    connection.sendall(json.dumps(message) + "\\n")
+
+def changed(name):
+    if name in observed:
+        send({ "event": "property-change", "id": observed[name], "name": name, "data": properties[name] })
+
+if scenario.get("fail"):
+    send({ "event": "end-file", "reason": "error" })
+
+observed = {}
+
+for line in connection.makefile("rb"):
+    command = json.loads(line)["command"]
+    name = command[0]
+
+    if name == "observe_property":
+        observed[command[2]] = command[1]
+        send({ "error": "success" })
+        if command[2] in properties:
+            changed(command[2])
+    elif name == "set_property" and command[1] in properties:
+        properties[command[1]] = command[2]
+        send({ "error": "success" })
+        changed(command[1])
+    elif name == "seek":
+        send({ "error": "success" })
+
+        if command[1] >= properties["duration"]:
+            send({ "event": "end-file", "reason": "eof" })
+            break
+
+        properties["time-pos"] = command[1]
+        send({ "event": "seek" })
+        changed("time-pos")
+    else:
+        send({ "error": "property unavailable" })
+
+connection.close()
+"""
+"""A fake mpv which plays a scenario from a JSON file instead of a movie."""
+
+
+@unittest.skipIf(QtCore is None, "PySide is not installed.")
+class MpvTest(unittest.TestCase):
+    """Runs the mpv backend against a fake mpv IPC server."""
+
+    @classmethod
+    def setUpClass(cls):
+        if QtCore.QCoreApplication.instance() is None:
+            cls.__app = QtCore.QCoreApplication([])
+
+
+    def setUp(self):
+        self.__temp_dir = tempfile.mkdtemp()
+
+        self.__binary_path = os.path.join(self.__temp_dir, "mpv")
+        with open(self.__binary_path, "w") as binary:
+            binary.write("#!" + sys.executable + "\n" + _FAKE_MPV)
+        os.chmod(self.__binary_path, stat.S_IRWXU)
+
+        self.__events = []
+        self.__mpv = Mpv(self.__binary_path)
+        self.__mpv.failed.connect(lambda error: self.__events.append(( "failed", error )))
+        self.__mpv.started.connect(lambda: self.__events.append(( "started", )))
+        self.__mpv.terminated.connect(lambda: self.__events.append(( "terminated", )))
+
+
+    def tearDown(self):
+        self.__mpv.terminate()
+        shutil.rmtree(self.__temp_dir)
+
+
+    def test_failure(self):
+        self.__run({ "properties": { "duration": 60.0 }, "fail": True })
+        self.__wait(lambda: self.__events)
+
+        self.assertEqual(self.__events[0][0], "failed")
+        self.assertFalse(self.__mpv.running())
+
+
+    def test_playing(self):
+        self.__run({ "properties": { "duration": 1500.5, "time-pos": 0.0, "container-fps": 25.0, "mute": False } })
+
+        # Property replies
+        self.__wait(lambda: self.__events)
+        self.assertEqual(self.__events, [ ( "started", ) ])
+        self.assertEqual(self.__mpv.get_movie().get_length(), 1500500)
+        self.assertEqual(self.__mpv.get_movie().get_fps(), 25.0)
+        self.assertEqual(self.__mpv.cur_pos(), 0)
+        self.assertTrue(self.__mpv.paused())
+
+        # The paused state is known before mpv pushes it back
+        self.__mpv.pause()
+        self.assertFalse(self.__mpv.paused())
+
+        # Property change events
+        self.__mpv.seek(10, absolute = True)
+        self.__wait(lambda: self.__mpv.cur_pos() == 10000)
+        self.__wait(lambda: { "event": "seek" } in self.__mpv.get_output())
+
+        # mpv doesn't unpause on setting of a property
+        self.__mpv.pause()
+        self.assertTrue(self.__mpv.paused())
+        self.__mpv.mute(True)
+        self.__process_events()
+        self.assertTrue(self.__mpv.paused())
+
+        # Error replies
+        self.__mpv.volume(5)
+        self.__process_events()
+        self.assertTrue(self.__mpv.running())
+        self.assertFalse([ message for message in self.__mpv.get_output() if "error" in message ])
+
+        # Disconnection
+        self.__mpv.seek(2000, absolute = True, keep_paused = True)
+        self.__wait(lambda: not self.__mpv.running())
+        self.assertEqual(self.__events, [ ( "started", ), ( "terminated", ) ])
+
+
+    def __process_events(self, duration = 0.5):
+        """Processes Qt events during the specified time."""
+
+        deadline = time.time() + duration
+
+        while time.time() < deadline:
+            QtCore.QCoreApplication.processEvents()
+            time.sleep(0.01)
+
+
+    def __run(self, scenario):
+        """Runs the fake mpv with the scenario."""
+
+        scenario_path = os.path.join(self.__temp_dir, "movie.json")
+        with open(scenario_path, "w") as scenario_file:
+            json.dump(scenario, scenario_file)
+
+        self.__mpv.run(scenario_path, 0, True, None, video = False)
+
+
+    def __wait(self, condition):
+        """Processes Qt events until the condition becomes true."""
+
+        deadline = time.time() + TIMEOUT
+
+        while not condition():
+            self.assertLess(time.time(), deadline, "The player hasn't reacted in time.")
+            QtCore.QCoreApplication.processEvents()
+            time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+"""Tests for MPlayer process management."""
+
+import errno
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from PySide import QtCore
+except ImportError:
+    QtCore = None
+else:
+    import mplayer.process
+
+
+CHILDREN = 10
+"""Number of child processes which are spawned by the test."""
+
+TIMEOUT = 10
+"""Time in seconds during which MPlayer should be started or fail."""
+
+_CHILD_SCRIPT = """
+import signal, sys, time
+if sys.argv[1] == "ignore":
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+sys.stdout.write("ready\\n")
+sys.stdout.flush()
+time.sleep(60)
+"""
+"""A child process which optionally ignores SIGTERM."""
+
+_FAKE_MPLAYER = """
+import sys, time
+
+with open([ arg for arg in sys.argv if arg.endswith(".avi") ][0]) as scenario_file:
+    scenario = scenario_file.read()
+
+sys.stdout.write("ID_AUDIO_ID=1\\n")
+sys.stdout.flush()
+
+requests = []
+
+for line in iter(sys.stdin.readline, ""):
+    if "get_property" not in line or scenario == "hang":
+        continue
+
+    requests.append(line.split()[-1])
+
+    # Answers only when all start requests are received
+    if requests[-1] == "length":
+        for name in requests:
+            sys.stdout.write("ANS_length=61.5\\n" if name == "length" else "ANS_ERROR=PROPERTY_UNAVAILABLE\\n")
+        sys.stdout.flush()
+"""
+"""A fake MPlayer which answers property requests only after getting all of them."""
+
+
+def _get_zombies():
+    """Returns PIDs of the current process' zombie children (Linux only)."""
+
+    zombies = []
+
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+
+        try:
+            with open(os.path.join("/proc", pid, "stat")) as stat_file:
+                stat = stat_file.read()
+        except EnvironmentError:
+            continue
+
+        # The process name may contain spaces, so it's skipped
+        state, ppid = stat[stat.rindex(")") + 2:].split()[:2]
+        if state == "Z" and int(ppid) == os.getpid():
+            zombies.append(int(pid))
+
+    return zombies
+
+
+@unittest.skipIf(QtCore is None, "PySide is not installed.")
+class TerminateProcessTest(unittest.TestCase):
+    """Checks that terminated processes never stay zombies."""
+
+    @classmethod
+    def setUpClass(cls):
+        if QtCore.QCoreApplication.instance() is None:
+            cls.__app = QtCore.QCoreApplication([])
+
+
+    def test_no_zombies(self):
+        processes = []
+
+        for child_id in xrange(CHILDREN):
+            # Every second child has to be killed by SIGKILL
+            process = subprocess.Popen([ sys.executable, "-c", _CHILD_SCRIPT,
+                "ignore" if child_id % 2 else "exit" ], stdin = subprocess.PIPE, stdout = subprocess.PIPE)
+            self.assertEqual(process.stdout.readline(), "ready\n")
+            processes.append(process)
+
+        threads = threading.active_count()
+
+        for process in processes:
+            mplayer.process.terminate_process(process)
+
+        # The processes are reaped by the main loop
+        self.assertEqual(threading.active_count(), threads)
+        deadline = time.time() + mplayer.process.TERMINATION_TIMEOUT + 10
+
+        while any(process.returncode is None for process in processes):
+            self.assertLess(time.time(), deadline, "The processes haven't been reaped in time.")
+            QtCore.QCoreApplication.processEvents()
+            time.sleep(0.01)
+
+        for child_id, process in enumerate(processes):
+            self.assertEqual(process.returncode, -9 if child_id % 2 else -15)
+
+            # The process must be already reaped
+            with self.assertRaises(OSError) as context:
+                os.waitpid(process.pid, os.WNOHANG)
+            self.assertEqual(context.exception.errno, errno.ECHILD)
+
+        if os.path.isdir("/proc"):
+            self.assertEqual(_get_zombies(), [])
+
+
+@unittest.skipIf(QtCore is None, "PySide is not installed.")
+class MPlayerStartTest(unittest.TestCase):
+    """Checks that MPlayer start doesn't block waiting for property answers."""
+
+    @classmethod
+    def setUpClass(cls):
+        if QtCore.QCoreApplication.instance() is None:
+            cls.__app = QtCore.QCoreApplication([])
+
+
+    def setUp(self):
+        self.__temp_dir = tempfile.mkdtemp()
+
+        self.__binary_path = os.path.join(self.__temp_dir, "mplayer")
+        with open(self.__binary_path, "w") as binary:
+            binary.write("#!" + sys.executable + "\n" + _FAKE_MPLAYER)
+        os.chmod(self.__binary_path, stat.S_IRWXU)
+
+        self.__events = []
+        self.__mplayer = mplayer.process.MPlayer(self.__binary_path)
+        self.__mplayer.failed.connect(lambda error: self.__events.append("failed"))
+        self.__mplayer.started.connect(lambda: self.__events.append("started"))
+
+
+    def tearDown(self):
+        self.__mplayer.terminate()
+        shutil.rmtree(self.__temp_dir)
+
+
+    def test_started(self):
+        self.__run("play")
+        self.assertEqual(self.__events, [ "started" ])
+
+        movie = self.__mplayer.get_movie()
+        self.assertEqual(movie.get_length(), 61500)
+        self.assertEqual(movie.get_audio_tracks(), [ 1 ])
+
+
+    def test_timeout(self):
+        timeout = mplayer.process.PROPERTY_TIMEOUT
+        mplayer.process.PROPERTY_TIMEOUT = 0.5
+
+        try:
+            self.__run("hang")
+        finally:
+            mplayer.process.PROPERTY_TIMEOUT = timeout
+
+        self.assertEqual(self.__events, [ "failed" ])
+        self.assertFalse(self.__mplayer.running())
+
+
+    def __run(self, scenario):
+        """Runs the fake MPlayer with the scenario and waits for its start or failure."""
+
+        scenario_path = os.path.join(self.__temp_dir, "movie.avi")
+        with open(scenario_path, "w") as scenario_file:
+            scenario_file.write(scenario)
+
+        self.__mplayer.run(scenario_path, 0, True, None, video = False)
+        deadline = time.time() + TIMEOUT
+
+        while not self.__events:
+            self.assertLess(time.time(), deadline, "MPlayer hasn't been started in time.")
+            QtCore.QCoreApplication.processEvents()
+            time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
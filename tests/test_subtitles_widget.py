@@ -0,0 +1,149 @@
+"""Tests for the subtitles widget."""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+try:
+    from PySide import QtCore, QtGui
+except ImportError:
+    QtGui = None
+else:
+    import pycl.gui.messages
+    import subtitles.widget
+    from subtitles.widget import SubtitlesWidget, SubtitleWidget
+
+
+TIMEOUT = 10
+"""Time in seconds during which subtitles should be read."""
+
+
+def _has_display():
+    """Returns True if Qt widgets can be created."""
+
+    return sys.platform == "darwin" or bool(os.environ.get("DISPLAY"))
+
+
+class _Reader:
+    """A fake subtitle reader which blocks background reading until it's released."""
+
+    released = None
+    """Event that releases background reading."""
+
+    texts = None
+    """Subtitle text of the files: path -> text or None if the file can't be read."""
+
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.texts = {}
+
+
+    def read(self, path, language):
+        if threading.current_thread().name == "Subtitles reader":
+            self.released.wait(TIMEOUT)
+
+        text = self.texts[path]
+        if text is None:
+            raise Exception("Invalid subtitle file '{0}'.".format(path))
+
+        return [{ "start_time": 0, "end_time": 1000, "text": text }]
+
+
+@unittest.skipIf(QtGui is None or not _has_display(), "PySide or a display is not available.")
+class SubtitlesWidgetTest(unittest.TestCase):
+    """Checks refreshing of subtitles while they are displayed."""
+
+    @classmethod
+    def setUpClass(cls):
+        if QtCore.QCoreApplication.instance() is None:
+            cls.__app = QtGui.QApplication([])
+
+
+    def setUp(self):
+        self.__reader = _Reader()
+        self.__warnings = []
+
+        self.__subtitle_reader = subtitles.widget.subtitle_reader
+        self.__warning = pycl.gui.messages.warning
+
+        subtitles.widget.subtitle_reader = self.__reader
+        pycl.gui.messages.warning = (
+            lambda parent, title, message, block = True: self.__warnings.append(message))
+
+        self.__widget = SubtitlesWidget()
+
+
+    def tearDown(self):
+        self.__reader.released.set()
+        self.__wait_for_readers()
+
+        subtitles.widget.subtitle_reader = self.__subtitle_reader
+        pycl.gui.messages.warning = self.__warning
+
+
+    def test_gone(self):
+        self.__reader.texts = { "a.srt": "a", "b.srt": "b" }
+        self.__widget.open([ ( "a.srt", "en" ), ( "b.srt", "en" ) ])
+        self.assertEqual(self.__get_texts(), [ "a", "b" ])
+
+        self.__widget.refresh([ ( "a.srt", "en" ) ], set())
+        self.assertEqual(self.__get_texts(), [ "a" ])
+
+
+    def test_outdated(self):
+        self.__reader.texts = { "a.srt": "first" }
+        self.__widget.open([ ( "a.srt", "en" ) ])
+
+        # The file is being read in background while the subtitles are reopened
+        self.__widget.refresh([ ( "a.srt", "en" ) ], set([ "a.srt" ]))
+        self.__widget.close()
+        self.__reader.texts["a.srt"] = "second"
+        self.__widget.open([ ( "a.srt", "en" ) ])
+
+        self.__reader.texts["a.srt"] = "outdated"
+        self.__reader.released.set()
+        self.__wait_for_readers()
+
+        self.assertEqual(self.__get_texts(), [ "second" ])
+
+
+    def test_read_error(self):
+        self.__reader.texts = { "a.srt": "a" }
+        self.__widget.open([ ( "a.srt", "en" ) ])
+
+        self.__reader.texts["a.srt"] = None
+        self.__reader.released.set()
+        self.__widget.refresh([ ( "a.srt", "en" ) ], set([ "a.srt" ]))
+        self.__wait_for_readers()
+
+        self.assertEqual(self.__get_texts(), [ "a" ])
+        self.assertEqual(len(self.__warnings), 1)
+
+
+    def __get_texts(self):
+        """Returns texts of the displayed subtitle files."""
+
+        return sorted(
+            widget.toPlainText() for widget in self.__widget.findChildren(SubtitleWidget))
+
+
+    def __wait_for_readers(self):
+        """Waits for the reading threads and delivers their results."""
+
+        for reader in threading.enumerate():
+            if reader.name == "Subtitles reader":
+                reader.join(TIMEOUT)
+                self.assertFalse(reader.is_alive(), "The subtitles haven't been read in time.")
+
+        deadline = time.time() + 0.5
+
+        while time.time() < deadline:
+            QtCore.QCoreApplication.processEvents()
+            time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""Tests for the directory watcher."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+try:
+    from PySide import QtCore
+except ImportError:
+    QtCore = None
+else:
+    import pytee.watcher
+    from pytee.watcher import DirectoryWatcher
+
+
+TIMEOUT = 10
+"""Time in seconds during which changes should be reported."""
+
+
+@unittest.skipIf(QtCore is None or pytee.watcher.libc is None, "PySide or inotify is not available.")
+class DirectoryWatcherTest(unittest.TestCase):
+    """Checks which file changes are reported."""
+
+    @classmethod
+    def setUpClass(cls):
+        if QtCore.QCoreApplication.instance() is None:
+            cls.__app = QtCore.QCoreApplication([])
+
+
+    def setUp(self):
+        self.__dir_path = tempfile.mkdtemp()
+        self.__subtitles_path = os.path.join(self.__dir_path, "movie.srt")
+        open(self.__subtitles_path, "w").close()
+
+        self.__changes = []
+        self.__watcher = DirectoryWatcher()
+        self.__watcher.changed.connect(self.__changes.append)
+        self.__watcher.watch(self.__dir_path)
+
+
+    def tearDown(self):
+        self.__watcher.close()
+        shutil.rmtree(self.__dir_path)
+
+
+    def test_deleted(self):
+        os.unlink(self.__subtitles_path)
+        self.assertEqual(self.__wait_for_changes(), [ self.__subtitles_path ])
+
+
+    def test_moved_out(self):
+        os.rename(self.__subtitles_path, os.path.join(tempfile.gettempdir(), "pytee-test-movie.srt"))
+
+        try:
+            self.assertEqual(self.__wait_for_changes(), [ self.__subtitles_path ])
+        finally:
+            os.unlink(os.path.join(tempfile.gettempdir(), "pytee-test-movie.srt"))
+
+
+    def test_written(self):
+        with open(self.__subtitles_path, "w") as subtitles_file:
+            subtitles_file.write("1\n00:00:01,000 --> 00:00:02,000\nText\n")
+
+        self.assertEqual(self.__wait_for_changes(), [ self.__subtitles_path ])
+
+
+    def __wait_for_changes(self):
+        """Waits for the changes report and returns the changed paths."""
+
+        deadline = time.time() + TIMEOUT
+
+        while not self.__changes:
+            self.assertLess(time.time(), deadline, "The changes haven't been reported in time.")
+            QtCore.QCoreApplication.processEvents()
+            time.sleep(0.01)
+
+        self.assertEqual(len(self.__changes), 1)
+        return self.__changes[0]
+
+
+if __name__ == "__main__":
+    unittest.main()
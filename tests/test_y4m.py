@@ -0,0 +1,101 @@
+"""Tests for the yuv4mpeg reader."""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mplayer.y4m import Y4mReader
+
+
+WIDTH = 4
+HEIGHT = 2
+"""Dimensions of the test frame."""
+
+Y_PLANE = ( 0, 10, 16, 128, 235, 255, 15, 100 )
+U_PLANE = ( 128, 0 )
+V_PLANE = ( 128, 255 )
+"""The test frame (includes black below the nominal range: Y < 16)."""
+
+
+def _expected_rgb():
+    """Returns the test frame converted to RGB by the reference formula."""
+
+    rgb = []
+
+    for row in xrange(HEIGHT):
+        for column in xrange(WIDTH):
+            y = 1.164 * (Y_PLANE[row * WIDTH + column] - 16)
+            u = U_PLANE[column // 2] - 128
+            v = V_PLANE[column // 2] - 128
+
+            rgb.append([
+                int(min(max(component, 0), 255))
+                for component in ( y + 1.596 * v, y - 0.392 * u - 0.813 * v, y + 2.017 * u )
+            ])
+
+    return rgb
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed.")
+class Y4mReaderTest(unittest.TestCase):
+    """Feeds a synthetic yuv4mpeg stream to the reader via a FIFO."""
+
+    def setUp(self):
+        self.__temp_dir = tempfile.mkdtemp()
+        self.__fifo_path = os.path.join(self.__temp_dir, "video.y4m")
+        os.mkfifo(self.__fifo_path)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.__temp_dir)
+
+
+    def test_conversion(self):
+        frame_ready = threading.Event()
+
+        reader = Y4mReader(self.__fifo_path, frame_ready.set)
+        reader.start()
+
+        producer = threading.Thread(target = self.__produce)
+        producer.start()
+
+        try:
+            self.assertTrue(frame_ready.wait(10), "The frame hasn't been read.")
+
+            sequence, frame = reader.get_frame()
+            self.assertEqual(sequence, 1)
+            self.assertEqual(reader.get_dimensions(), ( WIDTH, HEIGHT ))
+            self.assertEqual(reader.get_fps(), 25)
+
+            expected = numpy.array(_expected_rgb(), numpy.int32).reshape(HEIGHT, WIDTH, 3)
+            difference = numpy.abs(frame.astype(numpy.int32) - expected)
+
+            # Rounding of the single precision arithmetic may differ by one
+            self.assertTrue((difference <= 1).all(), "Invalid RGB frame:\n{0}\nExpected:\n{1}".format(frame, expected))
+
+            # Black below the nominal range stays black
+            self.assertEqual(frame[0, 0].tolist(), [ 0, 0, 0 ])
+            self.assertEqual(frame[0, 1].tolist(), [ 0, 0, 0 ])
+        finally:
+            reader.stop()
+            producer.join()
+
+
+    def __produce(self):
+        """Writes the test stream to the FIFO."""
+
+        with open(self.__fifo_path, "wb") as fifo:
+            fifo.write("YUV4MPEG2 W{0} H{1} F25:1 Ip A1:1 C420jpeg\n".format(WIDTH, HEIGHT))
+            fifo.write("FRAME\n")
+            fifo.write(bytearray(Y_PLANE + U_PLANE + V_PLANE))
+
+
+if __name__ == "__main__":
+    unittest.main()